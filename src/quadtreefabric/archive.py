@@ -0,0 +1,259 @@
+"""Compressed context archives.
+
+An archive is a zip container holding one context:
+
+    manifest.json        sizes, codec, root hash, payload pool (images point at blobs)
+    layers/<d>.rle       run-length encoded nodes of layer ``d``
+    blobs/<sha256>       original image bytes, stored uncompressed
+
+Every layer is its own zip member compressed with zlib (deflate) or lzma, so
+a single layer can be decoded with :func:`read_layer` without touching the
+others.  Images are already compressed, so they are stored as-is.
+
+A workspace (see :func:`write_workspace`) bundles many contexts in the same
+kind of container.
+"""
+from __future__ import annotations
+
+import base64
+import hashlib
+import json
+import sys
+import zipfile
+from array import array
+from itertools import groupby
+from pathlib import Path
+from typing import Any, Dict, List, Tuple, Union
+
+from .model import Layer, Matrix, matrix_from_dict, matrix_to_dict, verify_root_hash
+from .schema import header_errors, layer_errors, payload_errors, raise_invalid, upgrade
+
+FORMAT = "quadtree-fabric/archive"
+SUFFIX = ".qtfz"
+MANIFEST = "manifest.json"
+
+CODECS = {
+    "zlib": zipfile.ZIP_DEFLATED,
+    "lzma": zipfile.ZIP_LZMA,
+}
+
+PathLike = Union[str, Path]
+
+
+# --- run-length encoding --------------------------------------------------
+def rle_encode(nodes: List[int]) -> bytes:
+    """Encode nodes as little-endian int64 ``(value, run)`` pairs."""
+    out = array("q")
+    for value, group in groupby(nodes):
+        out.append(value)
+        out.append(sum(1 for _ in group))
+    if sys.byteorder == "big":
+        out.byteswap()
+    return out.tobytes()
+
+
+def rle_decode(data: bytes) -> List[int]:
+    pairs = array("q")
+    pairs.frombytes(data)
+    if sys.byteorder == "big":
+        pairs.byteswap()
+    nodes: List[int] = []
+    for i in range(0, len(pairs), 2):
+        nodes.extend([pairs[i]] * pairs[i + 1])
+    return nodes
+
+
+# --- blobs ------------------------------------------------------------------
+def _pack_payloads(pool: Dict[str, Any]) -> Tuple[Dict[str, Any], Dict[str, bytes]]:
+    """Split image data out of the payload pool into content-addressed blobs."""
+    packed: Dict[str, Any] = {}
+    blobs: Dict[str, bytes] = {}
+    for key, payload in pool.items():
+        if payload.get("type") == "image" and "data" in payload:
+            raw = base64.b64decode(payload["data"])
+            name = f"blobs/{hashlib.sha256(raw).hexdigest()}"
+            blobs[name] = raw
+            payload = {k: v for k, v in payload.items() if k != "data"}
+            payload["blob"] = name
+        packed[key] = payload
+    return packed, blobs
+
+
+def _unpack_payloads(pool: Dict[str, Any], read_blob) -> Dict[str, Any]:
+    unpacked: Dict[str, Any] = {}
+    for key, payload in pool.items():
+        if payload.get("type") == "image" and "blob" in payload:
+            raw = read_blob(payload["blob"])
+            payload = {k: v for k, v in payload.items() if k != "blob"}
+            payload["data"] = base64.b64encode(raw).decode("utf-8")
+        unpacked[key] = payload
+    return unpacked
+
+
+# --- archives ---------------------------------------------------------------
+def is_archive(path: PathLike) -> bool:
+    if not zipfile.is_zipfile(path):
+        return False
+    with zipfile.ZipFile(path) as zf:
+        return MANIFEST in zf.namelist()
+
+
+def _write_context(zf: zipfile.ZipFile, prefix: str, matrix: Matrix, codec: str,
+                   written: set[str]) -> None:
+    """Write one context under ``prefix``; blobs already in ``written`` are shared."""
+    if codec not in CODECS:
+        raise ValueError(f"Unknown codec {codec!r}, expected one of {sorted(CODECS)}")
+    compression = CODECS[codec]
+    pool, blobs = _pack_payloads(matrix.payload_pool)
+
+    layers = []
+    for d, layer in enumerate(matrix.layers):
+        name = f"{prefix}layers/{d}.rle"
+        zf.writestr(name, rle_encode(layer.nodes), compress_type=compression)
+        layers.append({"size": layer.size, "chunk": name})
+    for name, raw in blobs.items():
+        if name not in written:
+            zf.writestr(name, raw, compress_type=zipfile.ZIP_STORED)
+            written.add(name)
+
+    manifest = {
+        "format": FORMAT,
+        "codec": codec,
+        "version": matrix.version,
+        "quadtree_size": matrix.quadtree_size,
+        "max_depth": matrix.max_depth,
+        "layers": layers,
+        "payload_pool": pool,
+        "root_hash": matrix.root_hash,
+    }
+    zf.writestr(prefix + MANIFEST, json.dumps(manifest, separators=(",", ":")),
+                compress_type=zipfile.ZIP_DEFLATED)
+
+
+def _manifest(zf: zipfile.ZipFile, prefix: str = "") -> Dict[str, Any]:
+    manifest = json.loads(zf.read(prefix + MANIFEST))
+    if manifest.get("format") != FORMAT:
+        raise ValueError("Not a quadtree-fabric archive")
+    return manifest
+
+
+def _read_context(zf: zipfile.ZipFile, prefix: str = "", strict: bool = False) -> Matrix:
+    manifest = _manifest(zf, prefix)
+    raise_invalid(header_errors(manifest))
+    layers = []
+    for d, info in enumerate(manifest["layers"]):
+        layer = Layer(size=info["size"], nodes=rle_decode(zf.read(info["chunk"])))
+        raise_invalid(layer_errors(d, layer.size, layer.nodes))
+        layers.append(layer)
+    raise_invalid(payload_errors(manifest.get("payload_pool", {}), manifest["max_depth"]))
+    matrix = Matrix(
+        quadtree_size=manifest["quadtree_size"],
+        max_depth=manifest["max_depth"],
+        version=manifest.get("version", 1),
+        layers=layers,
+        payload_pool=_unpack_payloads(manifest.get("payload_pool", {}), zf.read),
+    )
+    verify_root_hash(matrix, manifest.get("root_hash"), strict)
+    upgrade(matrix)
+    return matrix
+
+
+def write_archive(matrix: Matrix, path: PathLike, codec: str = "zlib") -> None:
+    """Write ``matrix`` as a compressed archive at ``path``."""
+    with zipfile.ZipFile(path, "w") as zf:
+        _write_context(zf, "", matrix, codec, set())
+
+
+def read_manifest(path: PathLike) -> Dict[str, Any]:
+    with zipfile.ZipFile(path) as zf:
+        return _manifest(zf)
+
+
+def read_layer(path: PathLike, depth: int, ctx_id: str | None = None) -> Layer:
+    """Decode a single layer without reading the rest of the archive.
+
+    ``ctx_id`` selects a context inside a workspace.
+    """
+    prefix = _context_prefix(ctx_id) if ctx_id is not None else ""
+    with zipfile.ZipFile(path) as zf:
+        info = _manifest(zf, prefix)["layers"][depth]
+        return Layer(size=info["size"], nodes=rle_decode(zf.read(info["chunk"])))
+
+
+def read_archive(path: PathLike, strict: bool = False) -> Matrix:
+    with zipfile.ZipFile(path) as zf:
+        return _read_context(zf, strict=strict)
+
+
+def read_matrix(path: PathLike, strict: bool = False) -> Matrix:
+    """Read a context from either a plain JSON file or a compressed archive.
+
+    ``strict`` rejects a stored root hash that does not match (see ``model.verify_root_hash``).
+    """
+    if is_archive(path):
+        return read_archive(path, strict)
+    return matrix_from_dict(json.loads(Path(path).read_text(encoding="utf-8")), strict)
+
+
+def write_matrix(matrix: Matrix, path: PathLike, compression: str | None = None) -> None:
+    """Write a context as plain JSON, or as an archive when ``compression`` is set.
+
+    Paths ending in ``SUFFIX`` default to zlib.
+    """
+    if compression is None and Path(path).suffix == SUFFIX:
+        compression = "zlib"
+    if compression:
+        write_archive(matrix, path, compression)
+    else:
+        Path(path).write_text(json.dumps(matrix_to_dict(matrix), indent=2), encoding="utf-8")
+
+
+# --- workspaces -------------------------------------------------------------
+# A workspace bundles many contexts in one container.  Each context lives
+# under ``contexts/<id>/`` with the archive layout above, and all contexts
+# share the top-level ``blobs/`` store, so an image used on several canvases
+# is stored once.
+WORKSPACE_FORMAT = "quadtree-fabric/workspace"
+WORKSPACE_SUFFIX = ".qtfw"
+WORKSPACE_INDEX = "workspace.json"
+
+
+def _context_prefix(ctx_id: str) -> str:
+    return f"contexts/{ctx_id}/"
+
+
+def is_workspace(path: PathLike) -> bool:
+    if not zipfile.is_zipfile(path):
+        return False
+    with zipfile.ZipFile(path) as zf:
+        return WORKSPACE_INDEX in zf.namelist()
+
+
+def write_workspace(contexts: Dict[str, Matrix], path: PathLike, codec: str = "zlib") -> None:
+    """Write several named contexts into one workspace, in dict order."""
+    written: set[str] = set()
+    with zipfile.ZipFile(path, "w") as zf:
+        for ctx_id, matrix in contexts.items():
+            if "/" in ctx_id:
+                raise ValueError(f"Context ID may not contain '/': {ctx_id!r}")
+            _write_context(zf, _context_prefix(ctx_id), matrix, codec, written)
+        index = {"format": WORKSPACE_FORMAT, "contexts": list(contexts)}
+        zf.writestr(WORKSPACE_INDEX, json.dumps(index), compress_type=zipfile.ZIP_DEFLATED)
+
+
+def read_workspace_index(path: PathLike) -> List[str]:
+    """Return the context IDs stored in a workspace, in order."""
+    with zipfile.ZipFile(path) as zf:
+        index = json.loads(zf.read(WORKSPACE_INDEX))
+    if index.get("format") != WORKSPACE_FORMAT:
+        raise ValueError("Not a quadtree-fabric workspace")
+    return index["contexts"]
+
+
+def read_workspace_context(path: PathLike, ctx_id: str) -> Matrix:
+    """Decode one context of a workspace.
+
+    Module-level so it can be shipped to a process pool.
+    """
+    with zipfile.ZipFile(path) as zf:
+        return _read_context(zf, _context_prefix(ctx_id))
@@ -0,0 +1,91 @@
+"""Command-line entry point.
+
+``quadtree-fabric`` with no subcommand starts the editor; the subcommands
+below work on context files without opening a window.
+"""
+from __future__ import annotations
+
+import sys
+from argparse import ArgumentParser
+from typing import List, Optional
+
+from . import archive, migrate
+from .diff import diff_matrices, merge_matrices
+
+
+def _cmd_diff(args) -> int:
+    changes = diff_matrices(archive.read_matrix(args.old), archive.read_matrix(args.new))
+    for change in changes:
+        print(change.describe())
+    return 1 if changes else 0
+
+
+def _cmd_merge(args) -> int:
+    result = merge_matrices(
+        archive.read_matrix(args.base),
+        archive.read_matrix(args.ours),
+        archive.read_matrix(args.theirs),
+    )
+    archive.write_matrix(result.matrix, args.output)
+    for change in result.applied:
+        print(change.describe())
+    for conflict in result.conflicts:
+        print(conflict.describe())
+    print(f"{len(result.applied)} change(s) merged, {len(result.conflicts)} conflict(s) (kept ours)")
+    return 1 if result.conflicts else 0
+
+
+def _cmd_migrate(args) -> int:
+    def show(res):
+        if res.status == migrate.INVALID:
+            print(f"invalid   {res.path}: {res.error}")
+        elif res.status != migrate.CURRENT or args.verbose:
+            print(f"{res.status:<9} {res.path} (v{res.from_version})")
+
+    report = migrate.run(args.paths, jobs=args.jobs, check_only=args.check, on_result=show)
+    print(report.summary())
+    return 1 if report.counts.get(migrate.INVALID) else 0
+
+
+def build_parser() -> ArgumentParser:
+    parser = ArgumentParser(prog="quadtree-fabric")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p = sub.add_parser("diff", help="List cell-level differences between two context files")
+    p.add_argument("old")
+    p.add_argument("new")
+    p.set_defaults(func=_cmd_diff)
+
+    p = sub.add_parser("merge", help="Three-way merge of context files")
+    p.add_argument("base")
+    p.add_argument("ours")
+    p.add_argument("theirs")
+    p.add_argument("-o", "--output", required=True)
+    p.set_defaults(func=_cmd_merge)
+
+    p = sub.add_parser("migrate", help="Validate and upgrade context files to the current schema")
+    p.add_argument("paths", nargs="+", help="Files or directories (searched recursively)")
+    p.add_argument("--check", action="store_true", help="Only validate; do not rewrite files")
+    p.add_argument("-j", "--jobs", type=int, default=None, help="Worker processes (default: CPU count)")
+    p.add_argument("-v", "--verbose", action="store_true", help="Also list files that are already current")
+    p.set_defaults(func=_cmd_migrate)
+
+    return parser
+
+
+COMMANDS = ("diff", "merge", "migrate")
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    argv = sys.argv[1:] if argv is None else argv
+    if not argv or argv[0] not in COMMANDS:
+        # No subcommand: start the editor (imported lazily, it needs a display)
+        from .nodes import main as gui_main
+        gui_main()
+        return 0
+    args = build_parser().parse_args(argv)
+    return args.func(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,149 @@
+"""Structural diff and three-way merge of contexts.
+
+Both walk the quadtree from the root and only descend into subtrees whose
+Merkle hashes differ, so the cost is proportional to the changed regions
+rather than to the size of the canvas.
+"""
+from __future__ import annotations
+
+import copy
+from dataclasses import dataclass, field
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from .model import Matrix, payload_digest
+
+COLOR = "color"
+PAYLOAD = "payload"
+
+
+@dataclass(slots=True)
+class Change:
+    """One cell-level difference: a node color or the payload attached to it."""
+    d: int
+    idx: int
+    field: str
+    old: Any
+    new: Any
+
+    @property
+    def key(self) -> str:
+        return f"{self.d}:{self.idx}"
+
+    @property
+    def kind(self) -> str:
+        """``A``dded, ``D``eleted or ``M``odified."""
+        if self.field == PAYLOAD:
+            if self.old is None:
+                return "A"
+            if self.new is None:
+                return "D"
+        return "M"
+
+    def describe(self) -> str:
+        if self.field == COLOR:
+            return f"M {self.key} color #{self.old:06x} -> #{self.new:06x}"
+        payload = self.new if self.new is not None else self.old
+        return f"{self.kind} {self.key} payload {payload.get('type', '?')}"
+
+
+@dataclass(slots=True)
+class Conflict:
+    """The same cell field was changed differently on both sides of a merge."""
+    d: int
+    idx: int
+    field: str
+    base: Any
+    ours: Any
+    theirs: Any
+
+    @property
+    def key(self) -> str:
+        return f"{self.d}:{self.idx}"
+
+    def describe(self) -> str:
+        return f"C {self.key} {self.field} changed on both sides"
+
+
+@dataclass(slots=True)
+class MergeResult:
+    matrix: Matrix
+    applied: List[Change] = field(default_factory=list)
+    conflicts: List[Conflict] = field(default_factory=list)
+
+    @property
+    def clean(self) -> bool:
+        return not self.conflicts
+
+
+def _check_compatible(*matrices: Matrix) -> None:
+    first = matrices[0]
+    for other in matrices[1:]:
+        if (other.max_depth != first.max_depth
+                or [l.size for l in other.layers] != [l.size for l in first.layers]):
+            raise ValueError("Contexts have different quadtree depth and cannot be compared")
+
+
+def _walk(a: Matrix, b: Matrix) -> Iterator[Change]:
+    last = len(a.layers) - 1
+    stack: List[Tuple[int, int]] = [(0, 0)]
+    while stack:
+        d, idx = stack.pop()
+        if a.node_hash(d, idx) == b.node_hash(d, idx):
+            continue
+
+        old_color, new_color = a.layers[d].nodes[idx], b.layers[d].nodes[idx]
+        if old_color != new_color:
+            yield Change(d, idx, COLOR, old_color, new_color)
+
+        key = f"{d}:{idx}"
+        old_payload, new_payload = a.payload_pool.get(key), b.payload_pool.get(key)
+        if payload_digest(old_payload) != payload_digest(new_payload):
+            yield Change(d, idx, PAYLOAD, old_payload or None, new_payload or None)
+
+        if d < last:
+            stack.extend((d + 1, c) for c in reversed(a.children(d, idx)))
+
+
+def diff_matrices(a: Matrix, b: Matrix) -> List[Change]:
+    """Return the changes that turn ``a`` into ``b``, in depth-first order."""
+    _check_compatible(a, b)
+    return list(_walk(a, b))
+
+
+def _same(field_name: str, x: Any, y: Any) -> bool:
+    if field_name == PAYLOAD:
+        return payload_digest(x) == payload_digest(y)
+    return x == y
+
+
+def _apply(matrix: Matrix, change: Change) -> None:
+    if change.field == COLOR:
+        matrix.set_node(change.d, change.idx, change.new)
+    else:
+        matrix.set_payload(change.d, change.idx, copy.deepcopy(change.new))
+
+
+def merge_matrices(base: Matrix, ours: Matrix, theirs: Matrix) -> MergeResult:
+    """Three-way merge of ``ours`` and ``theirs`` against their common ``base``.
+
+    Edits to different cells (or to the color and payload of the same cell)
+    merge automatically.  Where both sides changed the same field to
+    different values the merged matrix keeps ours and a ``Conflict`` is
+    reported.
+    """
+    _check_compatible(base, ours, theirs)
+    ours_changes: Dict[Tuple[int, int, str], Change] = {
+        (c.d, c.idx, c.field): c for c in _walk(base, ours)
+    }
+    result = MergeResult(matrix=copy.deepcopy(ours))
+
+    for change in _walk(base, theirs):
+        mine: Optional[Change] = ours_changes.get((change.d, change.idx, change.field))
+        if mine is None:
+            _apply(result.matrix, change)
+            result.applied.append(change)
+        elif not _same(change.field, mine.new, change.new):
+            result.conflicts.append(Conflict(
+                change.d, change.idx, change.field, change.old, mine.new, change.new
+            ))
+    return result
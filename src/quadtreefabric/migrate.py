@@ -0,0 +1,136 @@
+"""Bulk validation and schema upgrade of context files.
+
+Files are processed in a process pool; each worker validates one file,
+upgrades it to ``SCHEMA_VERSION`` and rewrites it in place in its original
+format (plain JSON or archive, same codec).
+"""
+from __future__ import annotations
+
+import json
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, Optional
+
+from . import archive
+from .model import matrix_from_dict
+from .schema import SCHEMA_VERSION
+
+CONTEXT_SUFFIXES = (".json", archive.SUFFIX)
+
+# Result statuses
+CURRENT = "current"      # already at SCHEMA_VERSION with a matching root hash
+UPGRADED = "upgraded"    # rewritten at SCHEMA_VERSION
+OUTDATED = "outdated"    # needs an upgrade (check-only run)
+INVALID = "invalid"      # failed validation or could not be read
+
+
+@dataclass(slots=True)
+class MigrationResult:
+    path: str
+    status: str
+    from_version: Optional[int] = None
+    size: int = 0
+    error: str = ""
+
+
+def iter_context_files(paths: Iterable[str]) -> Iterator[str]:
+    """Expand directories (recursively) into the context files they contain."""
+    for p in map(Path, paths):
+        if p.is_dir():
+            for f in sorted(p.rglob("*")):
+                if f.suffix in CONTEXT_SUFFIXES and f.is_file():
+                    yield str(f)
+        else:
+            yield str(p)
+
+
+def migrate_file(path: str, check_only: bool = False) -> MigrationResult:
+    """Validate one context file and upgrade it in place if it is outdated.
+
+    A check-only run also reports a file whose stored root hash does not
+    match its content as invalid; a migration rewrites it with the right one.
+    """
+    result = MigrationResult(path=path, status=INVALID)
+    try:
+        result.size = os.path.getsize(path)
+        if archive.is_archive(path):
+            header = archive.read_manifest(path)
+            codec = header.get("codec", "zlib")
+            matrix = archive.read_archive(path, strict=check_only)
+        else:
+            header = json.loads(Path(path).read_text(encoding="utf-8"))
+            codec = None
+            matrix = matrix_from_dict(header, strict=check_only)
+    except Exception as e:
+        result.error = str(e)
+        return result
+
+    result.from_version = header.get("version", 1)
+    if result.from_version == SCHEMA_VERSION and header.get("root_hash") == matrix.root_hash:
+        result.status = CURRENT
+        return result
+    if check_only:
+        result.status = OUTDATED
+        return result
+
+    # Write next to the original and swap, so an interrupted run never leaves a truncated file
+    tmp = f"{path}.migrate-tmp"
+    try:
+        archive.write_matrix(matrix, tmp, codec)
+        os.replace(tmp, path)
+    except Exception as e:
+        Path(tmp).unlink(missing_ok=True)
+        result.error = f"write failed: {e}"
+        return result
+    result.status = UPGRADED
+    return result
+
+
+def _migrate_check(path: str) -> MigrationResult:
+    return migrate_file(path, check_only=True)
+
+
+def migrate_paths(paths: List[str], jobs: Optional[int] = None,
+                  check_only: bool = False) -> Iterator[MigrationResult]:
+    """Migrate many files in parallel, yielding results in input order."""
+    fn = _migrate_check if check_only else migrate_file
+    jobs = jobs or os.cpu_count() or 1
+    if jobs == 1 or len(paths) < 2:
+        yield from map(fn, paths)
+        return
+    chunksize = max(1, min(64, len(paths) // (jobs * 4)))
+    with ProcessPoolExecutor(jobs, mp_context=multiprocessing.get_context("spawn")) as pool:
+        yield from pool.map(fn, paths, chunksize=chunksize)
+
+
+@dataclass(slots=True)
+class MigrationReport:
+    files: int = 0
+    bytes: int = 0
+    seconds: float = 0.0
+    counts: Dict[str, int] = field(default_factory=dict)
+
+    def summary(self) -> str:
+        secs = max(self.seconds, 1e-9)
+        parts = ", ".join(f"{n} {status}" for status, n in sorted(self.counts.items()))
+        return (f"{self.files} file(s) ({parts}) in {self.seconds:.2f}s: "
+                f"{self.files / secs:.1f} files/s, {self.bytes / secs / 1e6:.2f} MB/s")
+
+
+def run(paths: Iterable[str], jobs: Optional[int] = None, check_only: bool = False,
+        on_result=None) -> MigrationReport:
+    """Migrate every context file under ``paths`` and report throughput."""
+    files = list(iter_context_files(paths))
+    report = MigrationReport(files=len(files))
+    start = time.perf_counter()
+    for res in migrate_paths(files, jobs, check_only):
+        report.bytes += res.size
+        report.counts[res.status] = report.counts.get(res.status, 0) + 1
+        if on_result:
+            on_result(res)
+    report.seconds = time.perf_counter() - start
+    return report
@@ -0,0 +1,181 @@
+from __future__ import annotations
+
+import hashlib
+import json
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional
+
+from .schema import SCHEMA_VERSION, document_errors, raise_invalid, upgrade
+
+# Payload keys that record execution state rather than content.  They are left
+# out of node hashes so running a cell does not count as editing it.
+RUN_STATE_KEYS = frozenset({
+    "last_run", "last_ok", "exec_ms", "peak_rss_kb", "cpu_user_ms", "cpu_sys_ms",
+    "fingerprint", "last_output", "last_values", "exit_code", "timings",
+})
+
+_DIGEST_SIZE = 16
+_NO_PAYLOAD = bytes(_DIGEST_SIZE)
+
+
+def payload_digest(payload: Optional[Dict[str, Any]]) -> bytes:
+    """Hash the content of a payload, ignoring ``RUN_STATE_KEYS``."""
+    if not payload:
+        return _NO_PAYLOAD
+    content = {k: v for k, v in payload.items() if k not in RUN_STATE_KEYS}
+    raw = json.dumps(content, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.blake2b(raw.encode("utf-8"), digest_size=_DIGEST_SIZE).digest()
+
+
+def _node_digest(color: int, payload: bytes, children: List[bytes]) -> bytes:
+    h = hashlib.blake2b(digest_size=_DIGEST_SIZE)
+    h.update(color.to_bytes(8, "little", signed=True))
+    h.update(payload)
+    for child in children:
+        h.update(child)
+    return h.digest()
+
+
+@dataclass(slots=True)
+class Layer:
+    size: int
+    nodes: List[int] = field(default_factory=list)
+
+
+@dataclass(slots=True)
+class Matrix:
+    quadtree_size: int
+    max_depth: int
+    layers: List[Layer] = field(default_factory=list)
+    payload_pool: Dict[str, Any] = field(default_factory=dict)
+    version: int = SCHEMA_VERSION
+    # Merkle hashes per layer, built lazily and kept current by the mutators below
+    _merkle: Optional[List[List[bytes]]] = field(default=None, init=False, repr=False, compare=False)
+
+    # --- mutation -----------------------------------------------------------
+    # Edits should go through these so node hashes stay current.  Editing a
+    # payload dict in place needs a ``touch`` afterwards (run-state keys excepted).
+    def set_node(self, d: int, idx: int, color: int) -> None:
+        self.layers[d].nodes[idx] = color
+        self._rehash_path(d, idx)
+
+    def set_payload(self, d: int, idx: int, payload: Optional[Dict[str, Any]]) -> None:
+        key = f"{d}:{idx}"
+        if payload is None:
+            self.payload_pool.pop(key, None)
+        else:
+            self.payload_pool[key] = payload
+        self._rehash_path(d, idx)
+
+    def touch(self, d: int, idx: int) -> None:
+        """Recompute hashes after the payload at ``(d, idx)`` was edited in place."""
+        self._rehash_path(d, idx)
+
+    def invalidate(self) -> None:
+        """Drop all hashes, e.g. after bulk edits that bypassed the mutators."""
+        self._merkle = None
+
+    # --- hashes -------------------------------------------------------------
+    @property
+    def root_hash(self) -> str:
+        return self.node_hash(0, 0).hex()
+
+    def node_hash(self, d: int, idx: int) -> bytes:
+        """Hash of the subtree rooted at ``(d, idx)``: color, payload and children."""
+        if self._merkle is None:
+            self._build_merkle()
+        return self._merkle[d][idx]
+
+    def children(self, d: int, idx: int) -> List[int]:
+        """Indices in layer ``d + 1`` of the four children of ``(d, idx)``."""
+        size = self.layers[d].size
+        cx, cy = idx % size, idx // size
+        child_size = size * 2
+        base = cy * 2 * child_size + cx * 2
+        return [base, base + 1, base + child_size, base + child_size + 1]
+
+    def _compute(self, d: int, idx: int) -> bytes:
+        children = []
+        if d < len(self.layers) - 1:
+            below = self._merkle[d + 1]
+            children = [below[c] for c in self.children(d, idx)]
+        return _node_digest(
+            self.layers[d].nodes[idx],
+            payload_digest(self.payload_pool.get(f"{d}:{idx}")),
+            children,
+        )
+
+    def _build_merkle(self) -> None:
+        self._merkle = [[] for _ in self.layers]
+        # Empty subtrees share one hash per depth, so sparse canvases only pay
+        # for the nodes that hold something.
+        empty_below: Optional[bytes] = None
+        for d in range(len(self.layers) - 1, -1, -1):
+            layer = self.layers[d]
+            below = self._merkle[d + 1] if d < len(self.layers) - 1 else None
+            empty = _node_digest(0, _NO_PAYLOAD, [empty_below] * 4 if below is not None else [])
+            hashes = self._merkle[d] = [empty] * len(layer.nodes)
+            for idx, color in enumerate(layer.nodes):
+                if (color == 0 and f"{d}:{idx}" not in self.payload_pool
+                        and (below is None or all(below[c] == empty_below for c in self.children(d, idx)))):
+                    continue
+                hashes[idx] = self._compute(d, idx)
+            empty_below = empty
+
+    def _rehash_path(self, d: int, idx: int) -> None:
+        if self._merkle is None:
+            return
+        while True:
+            self._merkle[d][idx] = self._compute(d, idx)
+            if d == 0:
+                return
+            size = self.layers[d].size
+            cx, cy = idx % size, idx // size
+            d, idx = d - 1, (cy // 2) * (size // 2) + cx // 2
+
+
+def matrix_to_dict(matrix: Matrix) -> Dict[str, Any]:
+    """Return the plain JSON document for a matrix."""
+    return {
+        'version': matrix.version,
+        'quadtree_size': matrix.quadtree_size,
+        'max_depth': matrix.max_depth,
+        'layers': [{'size': layer.size, 'nodes': layer.nodes} for layer in matrix.layers],
+        'payload_pool': matrix.payload_pool,
+        'root_hash': matrix.root_hash,
+    }
+
+
+def matrix_from_dict(data: Dict[str, Any], strict: bool = False) -> Matrix:
+    """Build a matrix from a plain JSON document, upgrading it to the current schema.
+
+    See ``verify_root_hash`` for ``strict``.
+    """
+    raise_invalid(document_errors(data))
+
+    matrix = Matrix(
+        quadtree_size=data['quadtree_size'],
+        max_depth=data['max_depth'],
+        version=data.get('version', 1),
+        layers=[],
+        payload_pool=data.get('payload_pool', {})
+    )
+    for layer_data in data['layers']:
+        matrix.layers.append(Layer(size=layer_data['size'], nodes=layer_data['nodes']))
+    verify_root_hash(matrix, data.get('root_hash'), strict)
+    upgrade(matrix)
+    return matrix
+
+
+def verify_root_hash(matrix: Matrix, expected: Optional[str], strict: bool = False) -> None:
+    """Check a stored root hash against the loaded content.
+
+    The stored hash is only a cache of ``matrix.root_hash``, which is always
+    recomputed, so a mismatch (a hand-edited or merged file) just prints a
+    warning.  With ``strict`` it raises ValueError instead.
+    """
+    if expected is None or expected == matrix.root_hash:
+        return
+    if strict:
+        raise ValueError("Root hash mismatch: file content is corrupt or was edited externally")
+    print("[load] stored root hash does not match the content (edited externally?); recomputed it")
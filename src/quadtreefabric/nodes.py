@@ -1,10 +1,11 @@
 import base64
 import io
 import json
+import multiprocessing
 import os
 import sys
 import tkinter as tk
-from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor
 from pathlib import Path
 from tkinter import filedialog, simpledialog, colorchooser
 from typing import Any, Dict, List, Optional, Tuple, Union
@@ -14,13 +15,28 @@ import pygame
 #import pygame.freetype as ft
 pygame.font.init()
 from PIL import Image
-from dataclasses import dataclass, field
 
 
 from .runtime.registry import REGISTRY as REG
-from .runtime.constants import TIMEOUT, STATUS_Q
+from .runtime.constants import PYTHON_ISOLATION, TIMEOUT, STATUS_Q
+from .runtime.scheduler import ExecutionScheduler
+from .runtime.aio import ASYNC_LOOP
+from .runtime.workers import FORK_SERVER, PYTHON_WORKERS
+from .runtime.warm_pool import prewarm, shutdown_pools
+from .runtime.artifacts import ARTIFACTS
+from .runtime.scratch import SCRATCH
+from .runtime.java_server import JAVA_SERVER
+from .runtime.stream import OutputBuffer
+from .runtime.limits import ResourcePolicy
+from .runtime.rungraph import GraphNode, GraphRun, parse_declarations, parse_outputs
+from .runtime.incremental import fingerprint, result_fields, reuse, stored_result
+from .runtime.result_cache import RESULT_CACHE, cache_enabled
+from .runtime.execmeta import ExecMeta
 
 from .config import CONFIG, MAIN_WIDTH
+from .model import Layer, Matrix
+from . import archive
+from .diff import Change, MergeResult, diff_matrices, merge_matrices
 
 # Thread pool for non-blocking TK dialogs
 DIALOG_POOL = ThreadPoolExecutor(max_workers=1)
@@ -67,7 +83,11 @@ def _tk_save_png():
 def _tk_open_json():
     root = tk.Tk(); root.withdraw()
     path = filedialog.askopenfilename(
-        title="Import Matrix", filetypes=[("JSON files", "*.json")]
+        title="Import Matrix",
+        filetypes=[("Matrix files", f"*.json *{archive.SUFFIX} *{archive.WORKSPACE_SUFFIX}"),
+                   ("JSON files", "*.json"),
+                   ("Compressed matrix", f"*{archive.SUFFIX}"),
+                   ("Workspace", f"*{archive.WORKSPACE_SUFFIX}")]
     )
     root.destroy()
     return path
@@ -76,7 +96,9 @@ def _tk_save_json():
     root = tk.Tk(); root.withdraw()
     path = filedialog.asksaveasfilename(
         title="Export Matrix", defaultextension=".json",
-        filetypes=[("JSON files", "*.json")]
+        filetypes=[("JSON files", "*.json"),
+                   ("Compressed matrix", f"*{archive.SUFFIX}"),
+                   ("Workspace (all contexts)", f"*{archive.WORKSPACE_SUFFIX}")]
     )
     root.destroy()
     return path
@@ -125,21 +147,6 @@ def wrap_text(text: str, font: pygame.font.Font, max_px: int) -> list[str]:
     return lines
 
 
-@dataclass(slots=True)
-class Layer:
-    size: int
-    nodes: List[int] = field(default_factory=list)
-
-
-@dataclass(slots=True)
-class Matrix:
-    quadtree_size: int
-    max_depth: int
-    layers: List[Layer] = field(default_factory=list)
-    payload_pool: Dict[str, Any] = field(default_factory=dict)
-    version: int = 1
-
-
 class Button:
     def __init__(self, x, y, width, height, text, action=None, font=FONT_BASE, disabled=False):
         self.rect = pygame.Rect(x, y, width, height)
@@ -591,6 +598,10 @@ class QuadtreeMatrix:
         self.current_ctx = ""
         self.active_cell = None
         self.code_executor = REG
+        # Workspace contexts still being decoded in the background: id -> Future
+        self.pending: Dict[str, Future] = {}
+        # Root hash of each context as of its last load/save: id -> hex digest
+        self.saved_hashes: Dict[str, str] = {}
         
     def create_empty_matrix(self, size: int, max_depth: int) -> Matrix:
         """Create a new empty matrix with the given size and depth"""
@@ -615,72 +626,121 @@ class QuadtreeMatrix:
     def get_context_list(self) -> List[str]:
         """Get list of all context IDs"""
         return list(self.contexts.keys())
+
+    def is_modified(self, ctx_id: str) -> bool:
+        """True if the context changed since it was last loaded or saved (O(1) once hashed)"""
+        matrix = self.contexts.get(ctx_id)
+        return matrix is not None and self.saved_hashes.get(ctx_id) != matrix.root_hash
+
+    def _unique_ctx_id(self, ctx_id: str) -> str:
+        """Suffix ``ctx_id`` with a counter until it clashes with no loaded or pending context"""
+        base_id = ctx_id
+        counter = 1
+        while ctx_id in self.contexts or ctx_id in self.pending:
+            ctx_id = f"{base_id}_{counter}"
+            counter += 1
+        return ctx_id
+
+    def load_workspace(self, filepath: str) -> Optional[str]:
+        """Load every context of a workspace file and return the first context ID.
+
+        The first context is decoded in-process so it is usable immediately; the rest
+        are decoded in parallel in a process pool and land in ``contexts`` as
+        ``poll_pending`` picks them up.
+        """
+        try:
+            ids = archive.read_workspace_index(filepath)
+            if not ids:
+                return None
+
+            first_id = self._unique_ctx_id(ids[0])
+            self.contexts[first_id] = archive.read_workspace_context(filepath, ids[0])
+            self.saved_hashes[first_id] = self.contexts[first_id].root_hash
+
+            if len(ids) > 1:
+                workers = min(len(ids) - 1, os.cpu_count() or 1)
+                pool = ProcessPoolExecutor(workers, mp_context=multiprocessing.get_context("spawn"))
+                for src_id in ids[1:]:
+                    fut = pool.submit(archive.read_workspace_context, filepath, src_id)
+                    self.pending[self._unique_ctx_id(src_id)] = fut
+                pool.shutdown(wait=False)
+            return first_id
+
+        except Exception as e:
+            print(f"Error loading workspace: {e}")
+            return None
+
+    def poll_pending(self) -> List[str]:
+        """Move finished background loads into ``contexts``; return the IDs that arrived"""
+        arrived = []
+        for ctx_id, fut in list(self.pending.items()):
+            if not fut.done():
+                continue
+            del self.pending[ctx_id]
+            try:
+                self.contexts[ctx_id] = fut.result()
+                self.saved_hashes[ctx_id] = self.contexts[ctx_id].root_hash
+                arrived.append(ctx_id)
+            except Exception as e:
+                print(f"Error loading workspace context {ctx_id}: {e}")
+        return arrived
+
+    def diff_contexts(self, old_id: str, new_id: str) -> List[Change]:
+        """Cell-level changes from one context to another, descending only into differing subtrees"""
+        return diff_matrices(self.contexts[old_id], self.contexts[new_id])
+
+    def merge_contexts(self, base_id: str, ours_id: str, theirs_id: str,
+                       into: Optional[str] = None) -> MergeResult:
+        """Three-way merge two contexts against their common base into a new context.
+
+        The merged matrix is stored as ``into`` (default ``<ours>_merged``); conflicting
+        fields keep ours and are listed in the result.
+        """
+        result = merge_matrices(self.contexts[base_id], self.contexts[ours_id], self.contexts[theirs_id])
+        self.contexts[into or self._unique_ctx_id(f"{ours_id}_merged")] = result.matrix
+        return result
+
+    def save_workspace(self, filepath: str, ctx_ids: Optional[List[str]] = None,
+                       compression: str = "zlib") -> bool:
+        """Save several contexts (all by default) into one workspace file"""
+        ids = ctx_ids if ctx_ids is not None else self.get_context_list()
+        try:
+            archive.write_workspace({i: self.contexts[i] for i in ids}, filepath, compression)
+            for i in ids:
+                self.saved_hashes[i] = self.contexts[i].root_hash
+            return True
+        except Exception as e:
+            print(f"Error saving workspace: {e}")
+            return False
     
     def load_json(self, filepath: str) -> Optional[str]:
-        """Load matrix from JSON file and return the assigned context ID"""
+        """Load matrix from a JSON file or compressed archive and return the assigned context ID"""
         try:
-            data = json.loads(Path(filepath).read_text(encoding="utf-8"))
-            
-            # Basic validation
-            if not all(key in data for key in ['quadtree_size', 'max_depth', 'layers']):
-                raise ValueError("Invalid matrix format")
-            
-            # Convert to our data structures
-            matrix = Matrix(
-                quadtree_size=data['quadtree_size'],
-                max_depth=data['max_depth'],
-                version=data.get('version', 1),
-                layers=[],
-                payload_pool=data.get('payload_pool', {})
-            )
-            
-            # Process layers
-            for layer_data in data['layers']:
-                layer = Layer(
-                    size=layer_data['size'],
-                    nodes=layer_data['nodes']
-                )
-                matrix.layers.append(layer)
+            matrix = archive.read_matrix(filepath)
             
             # Create context ID from filename
-            ctx_id = Path(filepath).stem
-            if ctx_id in self.contexts:
-                base_id = ctx_id
-                counter = 1
-                while ctx_id in self.contexts:
-                    ctx_id = f"{base_id}_{counter}"
-                    counter += 1
-            
+            ctx_id = self._unique_ctx_id(Path(filepath).stem)
             self.contexts[ctx_id] = matrix
+            self.saved_hashes[ctx_id] = matrix.root_hash
             return ctx_id
             
         except Exception as e:
             print(f"Error loading JSON: {e}")
             return None
     
-    def save_json(self, ctx_id: str, filepath: str) -> bool:
-        """Save matrix to JSON file"""
+    def save_json(self, ctx_id: str, filepath: str, compression: Optional[str] = None) -> bool:
+        """Save matrix to JSON file, or to a compressed archive when ``compression`` is set.
+
+        ``compression`` is one of ``archive.CODECS`` ("zlib", "lzma"); paths ending in
+        ``archive.SUFFIX`` default to zlib.
+        """
         if ctx_id not in self.contexts:
             return False
         
         matrix = self.contexts[ctx_id]
-        data = {
-            'version': matrix.version,
-            'quadtree_size': matrix.quadtree_size,
-            'max_depth': matrix.max_depth,
-            'layers': [],
-            'payload_pool': matrix.payload_pool
-        }
-        
-        # Convert layers to serializable format
-        for layer in matrix.layers:
-            data['layers'].append({
-                'size': layer.size,
-                'nodes': layer.nodes
-            })
-        
         try:
-            Path(filepath).write_text(json.dumps(data, indent=2), encoding="utf-8")
+            archive.write_matrix(matrix, filepath, compression)
+            self.saved_hashes[ctx_id] = matrix.root_hash
             return True
         except Exception as e:
             print(f"Error saving JSON: {e}")
@@ -1047,9 +1107,11 @@ class OutputModal:
         )
         
         self.visible = False
-        self.output = ""
+        self.buffer = OutputBuffer()
         self.success = True
         self.scroll_y = 0
+        self.job = None         # id of the job being streamed, None when static
+        self.follow = True      # keep the last line in view while streaming
         
         # Create close button
         button_width = 100
@@ -1064,11 +1126,38 @@ class OutputModal:
             "Close"
         )
     
+    @property
+    def output(self):
+        return self.buffer.text
+
     def show(self, output, success=True):
         self.visible = True
-        self.output = output
+        self.buffer.clear()
+        self.buffer.append(output)
         self.success = success
         self.scroll_y = 0
+        self.job = None
+
+    def begin(self, job_id):
+        """Open the modal on a running job whose output arrives through append"""
+        self.show("", True)
+        self.job = job_id
+        self.follow = True
+
+    def append(self, text):
+        self.buffer.append(text)
+        if self.follow:
+            self.scroll_y = max(0, len(self.buffer) - self._visible_lines())
+
+    def finish(self, output, success):
+        """End streaming; show whatever part of the final output was not streamed"""
+        if len(output) > self.buffer.received:
+            self.append(output[self.buffer.received:])
+        self.success = success
+        self.job = None
+
+    def _visible_lines(self):
+        return (self.rect.height - 100) // FONT_MONO.get_height()
     
     def hide(self):
         self.visible = False
@@ -1091,7 +1180,10 @@ class OutputModal:
         title_color = (0, 128, 0) if self.success else (200, 0, 0)
         pygame.draw.rect(surface, title_color, title_rect, border_top_left_radius=4, border_top_right_radius=4)
         
-        title = "Execution Output" if self.success else "Execution Error"
+        if self.job is not None:
+            title = "Running…"
+        else:
+            title = "Execution Output" if self.success else "Execution Error"
         title_surf = FONT_HEADER.render(title, True, SURFACE)
         title_rect = title_surf.get_rect(center=(self.rect.centerx, self.rect.y + 20))
         surface.blit(title_surf, title_rect)
@@ -1109,13 +1201,12 @@ class OutputModal:
         # Draw output text
         font = FONT_MONO
         font_height = font.get_height()
-        lines = self.output.split('\n')
         
         # Calculate max visible lines
         max_visible_lines = output_rect.height // font_height
         
         # Draw visible lines
-        for i, line in enumerate(lines[self.scroll_y:self.scroll_y + max_visible_lines]):
+        for i, line in enumerate(self.buffer.lines(self.scroll_y, self.scroll_y + max_visible_lines)):
             line_color = TEXT
             line_surf = font.render(line, True, line_color)
             surface.blit(
@@ -1143,21 +1234,25 @@ class OutputModal:
         if event.type == pygame.MOUSEWHEEL:
             self.scroll_y = max(0, self.scroll_y - event.y)
             
-            lines = self.output.split('\n')
-            font_height = FONT_MONO.get_height()
-            output_height = self.rect.height - 100
-            max_visible_lines = output_height // font_height
-            
-            max_scroll = max(0, len(lines) - max_visible_lines)
+            max_scroll = max(0, len(self.buffer) - self._visible_lines())
             self.scroll_y = min(max_scroll, self.scroll_y)
+            self.follow = self.scroll_y >= max_scroll
 
         
 
         return False
 class ExplorerModal:
     ROW_HEIGHT = 20
-
-    def __init__(self, screen_width, screen_height, run_callback):
+    # Row orders offered by the Sort button: label -> sort key (costliest first)
+    SORTS = {
+        "cell": lambda r: (r["d"], r["idx"]),
+        "time": lambda r: -(r.get("exec_ms") or 0),
+        "memory": lambda r: -(r.get("peak_rss_kb") or 0),
+        "cpu": lambda r: -((r.get("cpu_user_ms") or 0) + (r.get("cpu_sys_ms") or 0)),
+    }
+
+    def __init__(self, screen_width, screen_height, run_callback, cancel_callback=None,
+                 result_callback=None):
         self.width = int(screen_width * 0.6)
         self.height = int(screen_height * 0.7)
         self.rect = pygame.Rect(
@@ -1173,10 +1268,16 @@ class ExplorerModal:
         self.selected: set[tuple[str, int, int]] = set()
         self.ctx_id = ""
         self.run_callback = run_callback
+        self.cancel_callback = cancel_callback
+        # payload -> stored result, for cells whose last run the canvas didn't save
+        self.result_callback = result_callback
         self.logs: List[str] = []
+        # (d, idx) -> "queued" / "running" for cells with a job in flight
+        self.job_status: Dict[Tuple[int, int], str] = {}
+        self.sort = "cell"
 
         margin = 10
-        btn_w = 120
+        btn_w = 110
         btn_h = 30
         bottom = self.rect.bottom - btn_h - margin
         self.run_all_btn = Button(
@@ -1191,9 +1292,25 @@ class ExplorerModal:
             self.rect.x + margin * 3 + btn_w * 2, bottom, btn_w, btn_h,
             "Run failed", self._run_failed
         )
+        self.cancel_btn = Button(
+            self.rect.x + margin * 4 + btn_w * 3, bottom, btn_w, btn_h,
+            "Cancel", self._cancel
+        )
+        self.run_changed_btn = Button(
+            self.rect.x + margin * 5 + btn_w * 4, bottom, btn_w, btn_h,
+            "Run changed", self._run_changed
+        )
+        self.sort_btn = Button(
+            self.rect.x + margin * 6 + btn_w * 5, bottom, btn_w, btn_h,
+            "Sort: cell", self._cycle_sort
+        )
+        self.buttons = [self.run_all_btn, self.run_sel_btn, self.run_fail_btn, self.cancel_btn,
+                        self.run_changed_btn, self.sort_btn]
 
     def show(self, ctx_id: str, matrix: Matrix):
         self.visible = True
+        if ctx_id != self.ctx_id:
+            self.job_status = {}
         self.ctx_id = ctx_id
         self.matrix = matrix
         self.build_rows()
@@ -1219,8 +1336,16 @@ class ExplorerModal:
                 "last_run": payload.get("last_run"),
                 "last_ok": payload.get("last_ok"),
                 "exec_ms": payload.get("exec_ms"),
+                "peak_rss_kb": payload.get("peak_rss_kb"),
+                "cpu_user_ms": payload.get("cpu_user_ms"),
+                "cpu_sys_ms": payload.get("cpu_sys_ms"),
             })
-        self.rows.sort(key=lambda r: (r["d"], r["idx"]))
+            if payload.get("last_run") is None and self.result_callback:
+                result = self.result_callback(payload)
+                if result is not None and "created" in result:
+                    self.rows[-1].update(last_run=result["created"], last_ok=result["ok"],
+                                         exec_ms=result["ms"], **(result.get("usage") or {}))
+        self.rows.sort(key=self.SORTS[self.sort])
         self.scroll = 0
         self._row_rects = []
 
@@ -1252,9 +1377,15 @@ class ExplorerModal:
             color = BUTTON_HOVER if key in self.selected else CODE_BG
             pygame.draw.rect(surface, color, rect)
             text = f"{row['d']}-{row['idx']} {row['language']} {row['lines']}l"
-            if row.get("last_run"):
+            status = self.job_status.get((row["d"], row["idx"]))
+            if status:
+                text += f" {status}…"
+            elif row.get("last_run"):
                 status = "OK" if row.get("last_ok") else "ERR"
                 text += f" {status} {int(row.get('exec_ms',0))}ms"
+                if row.get("peak_rss_kb"):
+                    cpu = (row.get("cpu_user_ms") or 0) + (row.get("cpu_sys_ms") or 0)
+                    text += f" cpu {int(cpu)}ms rss {row['peak_rss_kb'] // 1024}MB"
             text_surf = FONT_MONO.render(text, True, TEXT)
             surface.blit(text_surf, (rect.x + 5, rect.y + 2))
             self._row_rects.append((rect, key))
@@ -1268,9 +1399,9 @@ class ExplorerModal:
             text_surf = FONT_MONO.render(msg, True, TEXT)
             surface.blit(text_surf, (log_rect.x + 5, log_rect.y + 5 + i * 15))
 
-        self.run_all_btn.draw(surface)
-        self.run_sel_btn.draw(surface)
-        self.run_fail_btn.draw(surface)
+        self.cancel_btn.disabled = not self.job_status
+        for btn in self.buttons:
+            btn.draw(surface)
 
     def handle_event(self, event):
         if not self.visible:
@@ -1294,21 +1425,72 @@ class ExplorerModal:
             return True
 
         if event.type == pygame.MOUSEMOTION:
-            for btn in [self.run_all_btn, self.run_sel_btn, self.run_fail_btn]:
+            for btn in self.buttons:
                 btn.check_hover(event.pos)
 
-        for btn in [self.run_all_btn, self.run_sel_btn, self.run_fail_btn]:
+        for btn in self.buttons:
             if btn.handle_event(event):
                 return True
 
         return False
 
+    def on_exec_event(self, ev: Dict[str, Any]):
+        """Reflect a scheduler status event in the rows and the log pane"""
+        cell = ev.get("cell")
+        if not cell or cell[0] != self.ctx_id:
+            if ev["type"] == "progress":
+                self.logs.append(f"batch {ev['done']}/{ev['total']}")
+            return
+        pos = (cell[1], cell[2])
+        label = f"{cell[1]}:{cell[2]}"
+        if ev["type"] == "queued":
+            self.job_status[pos] = "queued"
+        elif ev["type"] == "start":
+            self.job_status[pos] = "running"
+            self.logs.append(f"▶ {label} {ev['lang']}")
+        elif ev["type"] in ("done", "cancelled"):
+            self.job_status.pop(pos, None)
+            if ev["type"] == "done" and ev.get("cached"):
+                self.logs.append(f"↺ {label} unchanged, reused last output")
+            elif ev["type"] == "done":
+                phases = ExecMeta(timings=ev["timings"]).breakdown()
+                self.logs.append(f"{'✓' if ev['ok'] else '✗'} {label} {int(ev['ms'])}ms"
+                                 + (f" ({phases})" if phases else ""))
+                for row in self.rows:
+                    if (row["d"], row["idx"]) == pos:
+                        row.update(last_run=ev["ts"], last_ok=ev["ok"], exec_ms=ev["ms"])
+                        if ev.get("usage"):
+                            row.update(ev["usage"])
+            else:
+                self.logs.append(f"⏹ {label} {ev.get('reason') or 'cancelled'}")
+        elif ev["type"] == "progress":
+            self.logs.append(f"batch {ev['done']}/{ev['total']}")
+
+    def _cycle_sort(self):
+        names = list(self.SORTS)
+        self.sort = names[(names.index(self.sort) + 1) % len(names)]
+        self.sort_btn.text = f"Sort: {self.sort}"
+        self.rows.sort(key=self.SORTS[self.sort])
+        return True
+
+    def _cancel(self):
+        if self.cancel_callback:
+            self.cancel_callback()
+        return True
+
     def _run_all(self):
         cells = [(self.ctx_id, r["d"], r["idx"]) for r in self.rows]
         self.run_callback(cells)
         self.build_rows()
         return True
 
+    def _run_changed(self):
+        """Run all cells, skipping those unchanged since their last successful run"""
+        cells = [(self.ctx_id, r["d"], r["idx"]) for r in self.rows]
+        self.run_callback(cells, incremental=True)
+        self.build_rows()
+        return True
+
     def _run_selected(self):
         self.run_callback(list(self.selected))
         self.build_rows()
@@ -1355,7 +1537,15 @@ class QuadtreeApp:
 
         self.code_editor = CodeEditorModal(SCREEN_WIDTH, SCREEN_HEIGHT)
         self.output_modal = OutputModal(SCREEN_WIDTH, SCREEN_HEIGHT)
-        self.explorer_modal = ExplorerModal(SCREEN_WIDTH, SCREEN_HEIGHT, self.run_cells)
+        self.scheduler = ExecutionScheduler(REG)
+        ARTIFACTS.export_env()  # before any worker starts, so they all inherit it
+        prewarm()  # start interpreters now so the first Execute doesn't wait for them
+        if PYTHON_ISOLATION == "fork":
+            FORK_SERVER.prewarm()
+        # batch id -> collected "ctx/d:idx OK|ERR" outputs and overall status
+        self._batch_results: Dict[int, Dict[str, Any]] = {}
+        self.explorer_modal = ExplorerModal(SCREEN_WIDTH, SCREEN_HEIGHT, self.run_cells,
+                                            self.scheduler.cancel_all, self.last_result)
 
 
         # State
@@ -1363,6 +1553,8 @@ class QuadtreeApp:
         self.hover_pos = None
         self.dialog_future = None
         self._dialog_handler = None
+        # What the canvas currently shows; render_quadtree skips work while it matches
+        self._render_key = None
     
     def setup_ui(self):
         # Context section
@@ -1484,7 +1676,10 @@ class QuadtreeApp:
 
         def handler(filepath):
             if filepath:
-                ctx_id = self.matrix.load_json(filepath)
+                if archive.is_workspace(filepath):
+                    ctx_id = self.matrix.load_workspace(filepath)
+                else:
+                    ctx_id = self.matrix.load_json(filepath)
                 if ctx_id:
                     self.matrix.current_ctx = ctx_id
 
@@ -1511,7 +1706,10 @@ class QuadtreeApp:
 
         def handler(filepath):
             if filepath:
-                self.matrix.save_json(self.matrix.current_ctx, filepath)
+                if Path(filepath).suffix == archive.WORKSPACE_SUFFIX:
+                    self.matrix.save_workspace(filepath)
+                else:
+                    self.matrix.save_json(self.matrix.current_ctx, filepath)
 
         self._dialog_handler = handler
         self.dialog_future = DIALOG_POOL.submit(_tk_save_json)
@@ -1549,43 +1747,206 @@ class QuadtreeApp:
             self.explorer_modal.show(ctx, matrix)
         return True
 
-    def run_cells(self, cells: List[tuple[str, int, int]]):
-        outputs: List[str] = []
-        overall_ok = True
-
-        def run_cell(ctx_id: str, d: int, idx: int):
+    def run_cells(self, cells: List[tuple[str, int, int]], incremental: bool = False):
+        """Queue code cells as one batch; results arrive through handle_exec_event
+
+        If any of the cells declares inputs or outputs, the batch runs as a
+        dataflow graph: each cell waits for the cells producing its inputs.
+        Producers that are not part of the run supply the values stored from
+        their last successful run.  With ``incremental``, cells whose
+        fingerprint matches their last successful run are not run again;
+        their stored output is reused.
+
+        Cells run, and session cells chain their fingerprints, in (depth,
+        index) order, whatever order the caller lists them in.
+        """
+        items = []
+        dataflow = False
+        for ctx_id, d, idx in sorted(cells):
             matrix = self.matrix.contexts.get(ctx_id)
-            if not matrix:
-                return ctx_id, d, idx, False, ""
-            key = f"{d}:{idx}"
-            payload = matrix.payload_pool.get(key)
+            payload = matrix.payload_pool.get(f"{d}:{idx}") if matrix else None
             if not payload or payload.get("type") != "code":
-                return ctx_id, d, idx, False, ""
-            code = payload.get("code", "")
-            language = payload.get("language", "python")
-            start = time.time()
-            success, out = self.matrix.code_executor.execute(code, language)
-            duration = (time.time() - start) * 1000
-            payload.update({
-                "last_run": time.time(),
-                "last_ok": success,
-                "exec_ms": int(duration),
-            })
-            return ctx_id, d, idx, success, out
-
-        with ThreadPoolExecutor() as pool:
-            futures = [pool.submit(run_cell, ctx_id, d, idx) for ctx_id, d, idx in cells]
-            for fut in futures:
-                ctx_id, d, idx, success, out = fut.result()
-                if out or not success:
-                    outputs.append(f"{ctx_id}/{d}:{idx} {'OK' if success else 'ERR'}\n{out}")
-                if not success:
-                    overall_ok = False
-
-        if outputs:
-            self.output_modal.show("\n".join(outputs), overall_ok)
+                continue
+            items.append((payload.get("code", ""), payload.get("language", "python"), (ctx_id, d, idx),
+                          self.exec_options(ctx_id, payload), payload))
+            dataflow = dataflow or bool(payload.get("inputs") or payload.get("outputs"))
+
+        if not items:
+            return True
+        if dataflow:
+            nodes = [GraphNode(cell, code, lang, list(p.get("inputs", [])), list(p.get("outputs", [])), opts,
+                               scope=self.run_scope(lang, opts), version=REG.version(lang),
+                               previous=stored_result(p), cache=cache_enabled(p))
+                     for code, lang, cell, opts, p in items]
+            try:
+                batch_id = GraphRun(self.scheduler, nodes, incremental,
+                                    stored=self.stored_values([n.cell for n in nodes])).start()
+            except ValueError as e:
+                self.output_modal.show(f"Cannot run as a graph: {e}", False)
+                return True
+            self._batch_results[batch_id] = {"outputs": [], "ok": True, "graph": True}
+        else:
+            batch_id = self.scheduler.open_batch(len(items))
+            self._batch_results[batch_id] = {"outputs": [], "ok": True}
+            previous: Dict[tuple[str, str], str] = {}  # last fingerprint per session
+            for code, lang, cell, opts, payload in items:
+                fp = self.cell_fingerprint(cell[0], payload, previous.get((opts["session"], lang)))
+                if not opts["stateless"]:
+                    previous[(opts["session"], lang)] = fp
+                hit = reuse(fp, stored_result(payload)) if incremental and cache_enabled(payload) else None
+                if hit is not None:
+                    self.scheduler.complete(code, lang, cell, batch_id, output=hit["output"], fingerprint=fp)
+                else:
+                    self.scheduler.submit(code, lang, cell, batch_id, fingerprint=fp, **opts)
         return True
 
+    def stored_values(self, cells: List[tuple[str, int, int]]) -> Dict[tuple[str, int, int], Dict[str, Any]]:
+        """Output values from the last successful run of every other code cell in their contexts"""
+        selected = set(cells)
+        stored = {}
+        for ctx_id in {cell[0] for cell in cells}:
+            matrix = self.matrix.contexts.get(ctx_id)
+            for key, payload in (matrix.payload_pool.items() if matrix else ()):
+                d, idx = map(int, key.split(":"))
+                prev = stored_result(payload) if payload.get("type") == "code" else None
+                if prev is not None and (ctx_id, d, idx) not in selected:
+                    stored[(ctx_id, d, idx)] = prev["values"]
+        return stored
+
+    def cell_fingerprint(self, ctx_id: Optional[str], payload: Dict[str, Any],
+                         after: Optional[str] = None) -> str:
+        """Fingerprint of a code cell run without input values
+
+        ``after`` is the fingerprint of the cell run just before it in the
+        same session, if any.
+        """
+        language = payload.get("language", "python")
+        scope = self.run_scope(language, self.exec_options(ctx_id, payload), after)
+        return fingerprint(language, payload.get("code", ""), REG.version(language), {}, scope)
+
+    def run_scope(self, language: str, opts: Dict[str, Any], after: Optional[str] = None) -> Dict[str, Any]:
+        """What a run depends on besides code and inputs (see incremental.fingerprint)"""
+        limits = opts["limits"]
+        scope = {"stateless": opts["stateless"], "isolation": opts["isolation"],
+                 "limits": limits.to_dict() if limits else None}
+        if not opts["stateless"]:
+            scope.update(session=self.scheduler.session_token(opts["session"], language), after=after)
+        return scope
+
+    def last_result(self, payload: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """The most recent stored result for a code cell, without running it.
+
+        Looks in the result cache under the fingerprint of the current code
+        (stateless cells only; session cells depend on the live session),
+        then under the fingerprint of the last run recorded in the payload,
+        then falls back to the output kept in the payload itself.  After a
+        failed run only the payload is consulted, so the failure is shown.
+        """
+        if payload.get("last_ok") is False:
+            fps = ()
+        else:
+            current = self.cell_fingerprint(None, payload) if payload.get("stateless") else None
+            fps = (current, payload.get("fingerprint"))
+        for fp in fps:
+            entry = RESULT_CACHE.lookup(fp)
+            if entry is not None:
+                return entry
+        if "last_output" in payload:
+            return {"ok": payload.get("last_ok"), "output": payload["last_output"],
+                    "ms": payload.get("exec_ms", 0)}
+        return None
+
+    @staticmethod
+    def exec_options(ctx_id: Optional[str], payload: Dict[str, Any]) -> Dict[str, Any]:
+        """Scheduler options for a code payload.
+
+        Cells share one session per (context, language); a "session" name in
+        the payload puts the cell in a separate group within its context, and
+        "stateless" cells run with no shared state, in parallel with the rest.
+        "limits" become the job's ResourcePolicy, and "isolation": "fork" runs
+        a Python cell in a fresh fork of the preloaded fork server.
+        """
+        session = ctx_id or ""
+        if payload.get("session"):
+            session = f"{session}/{payload['session']}"
+        return {"session": session, "stateless": bool(payload.get("stateless")),
+                "limits": ResourcePolicy.from_payload(payload), "isolation": payload.get("isolation")}
+
+    def cancel_cell(self, cell: tuple[str, int, int]) -> bool:
+        job = self.scheduler.job_for_cell(cell)
+        return bool(job) and self.scheduler.cancel(job)
+
+    def handle_exec_event(self, ev: Dict[str, Any]):
+        """Apply one scheduler status event on the UI thread"""
+        self.explorer_modal.on_exec_event(ev)
+
+        # Single runs stream into the Output modal; batches report when complete
+        if ev["type"] == "start" and ev["batch"] is None:
+            self.output_modal.begin(ev["job"])
+        elif ev["type"] == "output" and ev["job"] == self.output_modal.job:
+            self.output_modal.append(ev["text"])
+        elif ev["type"] == "cancelled" and ev["job"] == self.output_modal.job:
+            self.output_modal.append("\n⏹ Cancelled")
+            self.output_modal.finish("", False)
+
+        if ev["type"] == "done":
+            if ev["cell"] and not ev.get("cached"):
+                ctx_id, d, idx = ev["cell"]
+                matrix = self.matrix.contexts.get(ctx_id)
+                payload = matrix.payload_pool.get(f"{d}:{idx}") if matrix else None
+                if payload and payload.get("type") == "code":
+                    payload.update({
+                        "last_run": ev["ts"],
+                        "last_ok": ev["ok"],
+                        "exec_ms": int(ev["ms"]),
+                        "exit_code": ev["exit_code"],
+                        "timings": {k: int(v) for k, v in ev["timings"].items()},
+                    })
+                    values = parse_outputs(ev["output"])[0]
+                    if ev["ok"] and ev.get("fingerprint"):
+                        payload.update(result_fields(ev["fingerprint"], ev["output"], values))
+                    elif not ev["ok"]:
+                        # Replace the last success, so it is neither shown nor reused
+                        payload.update(result_fields(None, ev["output"], {}))
+                    if ev.get("fingerprint") and cache_enabled(payload):
+                        RESULT_CACHE.store(ev["fingerprint"], ev["lang"], ev["ok"], ev["output"],
+                                           stdout=ev["stdout"], stderr=ev["stderr"],
+                                           exit_code=ev["exit_code"], values=values, ms=ev["ms"],
+                                           usage=ev.get("usage"), timings=ev["timings"])
+                    usage = ev.get("usage")
+                    if usage:
+                        payload.update({
+                            "peak_rss_kb": usage["peak_rss_kb"],
+                            "cpu_user_ms": int(usage["cpu_user_ms"]),
+                            "cpu_sys_ms": int(usage["cpu_sys_ms"]),
+                        })
+
+            results = self._batch_results.get(ev["batch"])
+            if results is None:
+                if ev["job"] == self.output_modal.job:
+                    self.output_modal.finish(ev["output"], ev["ok"])
+                else:
+                    self.output_modal.show(ev["output"], ev["ok"])
+            else:
+                out = ev["output"]
+                if out or not ev["ok"]:
+                    ctx_id, d, idx = ev["cell"]
+                    results["outputs"].append(f"{ctx_id}/{d}:{idx} {'OK' if ev['ok'] else 'ERR'}\n{out}")
+                if not ev["ok"]:
+                    results["ok"] = False
+
+        elif ev["type"] == "progress" and ev["done"] >= ev["total"]:
+            results = self._batch_results.get(ev["batch"])
+            if results and not results.get("graph"):
+                del self._batch_results[ev["batch"]]
+                if results["outputs"]:
+                    self.output_modal.show("\n".join(results["outputs"]), results["ok"])
+
+        elif ev["type"] == "graph":
+            results = self._batch_results.pop(ev["batch"], None)
+            if results is not None:
+                self.output_modal.show("\n".join([ev["report"], *results["outputs"]]), results["ok"])
+
     
     def show_context_menu(self, position, cell):
         # Create menu options
@@ -1613,6 +1974,12 @@ class QuadtreeApp:
                 options.insert(4, ("▶️ Execute Code", lambda: self.handle_context_action("execute_code", cell)))
                 # Insert export code option
                 options.insert(5, ("💾 Export Code…", lambda: self.handle_context_action("export_code", cell)))
+                options.insert(5, ("📄 Last Output", lambda: self.handle_context_action("last_output", cell)))
+                stateless = matrix.payload_pool[key].get('stateless', False)
+                options.insert(7, ("🔓 Use Shared Session" if stateless else "🔒 Run Stateless",
+                                   lambda: self.handle_context_action("toggle_stateless", cell)))
+                if self.scheduler.job_for_cell((self.matrix.current_ctx, d, idx)):
+                    options.insert(5, ("⏹ Cancel Run", lambda: self.handle_context_action("cancel_run", cell)))
 
         
         # Create and position context menu
@@ -1641,7 +2008,7 @@ class QuadtreeApp:
                 # Convert RGB to int color
                 r, g, b = [int(c) for c in color]
                 color_int = (r << 16) | (g << 8) | b
-                matrix.layers[d].nodes[idx] = color_int
+                matrix.set_node(d, idx, color_int)
         
         elif action == "add_text":
             root = tk.Tk()
@@ -1655,11 +2022,11 @@ class QuadtreeApp:
                 
                 if color:
                     r, g, b = [int(c) for c in color]
-                    matrix.payload_pool[f"{d}:{idx}"] = {
+                    matrix.set_payload(d, idx, {
                         'type': 'text',
                         'text': text,
                         'color': [r, g, b]
-                    }
+                    })
             else:
                 root.destroy()
         
@@ -1681,18 +2048,31 @@ class QuadtreeApp:
         elif action == "execute_code":
             key = f"{d}:{idx}"
             if key in matrix.payload_pool and matrix.payload_pool[key].get('type') == 'code':
-                code = matrix.payload_pool[key].get('code', '')
-                language = matrix.payload_pool[key].get('language', 'python')
-
-                start = time.time()
-                success, output = self.matrix.code_executor.execute(code, language)
-                duration = (time.time() - start) * 1000
-                matrix.payload_pool[key].update({
-                    "last_run": time.time(),
-                    "last_ok": success,
-                    "exec_ms": int(duration),
-                })
-                self.output_modal.show(output, success)
+                payload = matrix.payload_pool[key]
+                code = payload.get('code', '')
+                language = payload.get('language', 'python')
+                self.scheduler.submit(code, language, (self.matrix.current_ctx, d, idx),
+                                      fingerprint=self.cell_fingerprint(self.matrix.current_ctx, payload),
+                                      **self.exec_options(self.matrix.current_ctx, payload))
+
+        elif action == "last_output":
+            payload = matrix.payload_pool.get(f"{d}:{idx}")
+            if payload and payload.get('type') == 'code':
+                result = self.last_result(payload)
+                if result is None:
+                    self.output_modal.show("No stored output; run the cell first.", True)
+                else:
+                    self.output_modal.show(result["output"], bool(result.get("ok")))
+
+        elif action == "toggle_stateless":
+            key = f"{d}:{idx}"
+            payload = matrix.payload_pool.get(key)
+            if payload and payload.get('type') == 'code':
+                payload['stateless'] = not payload.get('stateless', False)
+                matrix.touch(d, idx)
+
+        elif action == "cancel_run":
+            self.cancel_cell((self.matrix.current_ctx, d, idx))
 
         elif action == "export_code":
             key = f"{d}:{idx}"
@@ -1715,10 +2095,10 @@ class QuadtreeApp:
                     try:
                         img_data = Path(filepath).read_bytes()
                         b64_data = base64.b64encode(img_data).decode('utf-8')
-                        matrix.payload_pool[f"{d}:{idx}"] = {
+                        matrix.set_payload(d, idx, {
                             'type': 'image',
                             'data': b64_data
-                        }
+                        })
                     except Exception as e:
                         print(f"Error loading image: {e}")
 
@@ -1747,19 +2127,17 @@ class QuadtreeApp:
                         cy1 = base_y + dy
                         idx1 = cy1 * layer1.size + cx1
                         
-                        layer1.nodes[idx1] = color
+                        matrix.set_node(d1, idx1, color)
                         
                         if payload:
-                            matrix.payload_pool[f"{d1}:{idx1}"] = payload.copy()
+                            matrix.set_payload(d1, idx1, payload.copy())
 
                 self.current_depth = d1
                 self.depth_slider.value = d1
         
         elif action == "reset_cell":
-            matrix.layers[d].nodes[idx] = 0
-            key = f"{d}:{idx}"
-            if key in matrix.payload_pool:
-                del matrix.payload_pool[key]
+            matrix.set_node(d, idx, 0)
+            matrix.set_payload(d, idx, None)
         
         # Return True to indicate action was handled
         return True
@@ -1772,6 +2150,14 @@ class QuadtreeApp:
         matrix = self.matrix.contexts[self.matrix.current_ctx]
         d = self.current_depth
         
+        # The root hash covers every color and payload, so an unchanged key means
+        # the canvas already shows this state.
+        hover_cell = self.get_cell_at_position(self.hover_pos) if self.hover_pos else None
+        render_key = (self.matrix.current_ctx, d, matrix.root_hash, matrix.quadtree_size, hover_cell)
+        if render_key == self._render_key:
+            return
+        self._render_key = render_key
+        
         S = matrix.quadtree_size
         layer = matrix.layers[d]
         cell_size = S / layer.size
@@ -2016,16 +2402,27 @@ class QuadtreeApp:
                     REG.tick() # Tell the registry to re-scan for new plugins
             elif cell and self.matrix.current_ctx:
                 d, idx = cell
-                self.matrix.contexts[self.matrix.current_ctx].payload_pool[f"{d}:{idx}"] = {
+                matrix = self.matrix.contexts[self.matrix.current_ctx]
+                old = matrix.payload_pool.get(f"{d}:{idx}") or {}
+                # Keep the cell's execution options across edits; dataflow
+                # declarations follow the @inputs/@outputs comments, and go
+                # with them, unless they were set in the file instead
+                options = {k: old[k] for k in ('stateless', 'session', 'limits', 'cache', 'isolation') if k in old}
+                inputs, outputs = parse_declarations(code)
+                if inputs or outputs:
+                    options.update(inputs=inputs, outputs=outputs)
+                elif not any(parse_declarations(old.get('code', ''))):
+                    options.update({k: old[k] for k in ('inputs', 'outputs') if k in old})
+                matrix.set_payload(d, idx, {
                     'type': 'code',
                     'code': code,
-                    'language': language
-                }
+                    'language': language,
+                    **options
+                })
         
         elif action == 'execute':
             code, language = data
-            success, output = self.matrix.code_executor.execute(code, language)
-            self.output_modal.show(output, success)
+            self.scheduler.submit(code, language, session=self.matrix.current_ctx)
     
     def handle_events(self):
         """Handle pygame events"""
@@ -2121,6 +2518,12 @@ class QuadtreeApp:
     
     def update(self, dt):
         """Update game state"""
+        for ev in self.scheduler.poll():
+            self.handle_exec_event(ev)
+
+        if self.matrix.pending and self.matrix.poll_pending():
+            self.context_dropdown.options = self.matrix.get_context_list()
+
         if self.dialog_future and self.dialog_future.done():
             result = self.dialog_future.result()
             if self._dialog_handler:
@@ -2193,6 +2596,15 @@ class QuadtreeApp:
             running = self.handle_events()
             self.update(dt)
             self.draw()
+        self.scheduler.shutdown()
+        ASYNC_LOOP.shutdown()
+        PYTHON_WORKERS.shutdown()
+        FORK_SERVER.shutdown()
+        shutdown_pools()
+        JAVA_SERVER.shutdown()
+        RESULT_CACHE.flush()
+        ARTIFACTS.clear()
+        SCRATCH.clear()
 
 def main():
     """Main entry point for the application."""
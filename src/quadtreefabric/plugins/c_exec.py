@@ -1,19 +1,27 @@
 from __future__ import annotations
 
-from ..runtime.compile_and_run import compile_and_run, _find
+from ..runtime.compile_and_run import compile_and_run_async, prebuild, _find
+from ..runtime.execmeta import ExecMeta
 
 
-def _exec(code: str, g: dict | None = None) -> tuple[bool, str]:
+def _command(code: str) -> list[str] | None:
     cc = _find(("gcc", "clang"))
     if not cc:
+        return None
+    # The source code goes last in the command list.
+    return [cc, "-std=c11", "-O2", "-pipe", code]
+
+
+async def _exec(code: str, g: dict | None = None) -> ExecMeta | tuple[bool, str]:
+    cmd = _command(code)
+    if not cmd:
         return False, "No C compiler found"
+    return await compile_and_run_async(".c", cmd)
 
-    # 1. Append the source code to the command list.
-    cmd = [cc, "-std=c11", "-O2", "-pipe", code]
 
-    # 2. Call the helper with the corrected command list.
-    return compile_and_run(".c", cmd)
+def _prepare(code: str) -> None:
+    prebuild(".c", lambda: _command(code))
 
 
 def register(reg):
-    reg.register("c", _exec)
+    reg.register("c", _exec, prepare=_prepare)
@@ -1,19 +1,32 @@
 from __future__ import annotations
 
-from ..runtime.compile_and_run import compile_and_run, _find
+import asyncio
 
+from ..runtime.compile_and_run import compile_and_run_async, prebuild, _find
+from ..runtime.constants import CPP_PRELUDE
+from ..runtime.execmeta import ExecMeta
+from ..runtime.pch import prelude_flags
 
-def _exec(code: str, g: dict | None = None) -> tuple[bool, str]:
+
+def _command(code: str) -> list[str] | None:
     cxx = _find(("g++", "clang++"))
     if not cxx:
+        return None
+    flags = ["-std=c++20", "-O2", "-pipe"]
+    # The source code goes last in the command list.
+    return [cxx, *flags, *prelude_flags(cxx, flags, CPP_PRELUDE), code]
+
+
+async def _exec(code: str, g: dict | None = None) -> ExecMeta | tuple[bool, str]:
+    cmd = await asyncio.to_thread(_command, code)  # may build a precompiled header
+    if not cmd:
         return False, "No C++ compiler found"
+    return await compile_and_run_async(".cpp", cmd)
 
-    # 1. Append the source code to the command list.
-    cmd = [cxx, "-std=c++20", "-O2", "-pipe", code]
 
-    # 2. Call the helper with the corrected command list.
-    return compile_and_run(".cpp", cmd)
+def _prepare(code: str) -> None:
+    prebuild(".cpp", lambda: _command(code))
 
 
 def register(reg):
-    reg.register("cpp", _exec)
+    reg.register("cpp", _exec, prepare=_prepare)
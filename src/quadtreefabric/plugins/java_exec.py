@@ -4,11 +4,15 @@ from __future__ import annotations
 import re
 import shutil
 import subprocess
-import tempfile
-from pathlib import Path
 from typing import Iterable, Tuple, Dict, Optional
 
 from ..runtime.constants import TIMEOUT
+from ..runtime.execmeta import timed
+from ..runtime.java_server import JAVA_SERVER, OK, COMPILE_ERROR
+from ..runtime.scheduler import current_job
+from ..runtime.scratch import SCRATCH
+from ..runtime.limits import current_policy, stop_reason
+from ..runtime.stream import emit_output, run_streaming
 
 def _find(progs: Iterable[str]) -> Optional[str]:
     """Finds the first available program in a list of executables."""
@@ -45,8 +49,10 @@ def _exec(code: str, globals: Optional[Dict] = None) -> Tuple[bool, str]:
     Compiles and runs Java code.
 
     This function first checks for the presence of the Java compiler (javac)
-    and the Java runtime (java). It then saves the provided code to a temporary
-    .java file, compiles it, and if successful, executes the main class.
+    and the Java runtime (java). The code is then compiled and run by the
+    persistent JVM helper (see runtime/java_server.py); if the helper is
+    unavailable, it falls back to compiling a scratch .java file with javac
+    and running it in a fresh JVM.
 
     Args:
         code: The Java source code to execute.
@@ -68,21 +74,40 @@ def _exec(code: str, globals: Optional[Dict] = None) -> Tuple[bool, str]:
     if not main_class:
         return False, "Could not find a public main class. e.g., 'public class MyClass { public static void main(String[] args) { ... } }'"
 
-    with tempfile.TemporaryDirectory(prefix="java_exec_") as td:
-        td_path = Path(td)
+    job = current_job()
+    if current_policy() is not None or (job is not None and job.env):
+        # Limits and environment are per process, so such cells get a JVM of their own
+        return _exec_subprocess(javac, java, main_class, code)
+
+    reply = JAVA_SERVER.run(javac, java, main_class, code, TIMEOUT,
+                            should_stop=(lambda: job.cancelled) if job is not None else None,
+                            on_output=emit_output)
+    if reply is not None:
+        status, output = reply
+        if status == OK:
+            return True, output
+        if status == COMPILE_ERROR:
+            return False, f"Compilation Error:\n{output}"
+        return False, f"Runtime Error:\n{output}"
+    return _exec_subprocess(javac, java, main_class, code)
+
+def _exec_subprocess(javac: str, java: str, main_class: str, code: str) -> Tuple[bool, str]:
+    """Compiles and runs Java code with a separate javac and java process."""
+    with SCRATCH.lease("java") as td_path:
         src_file = td_path / f"{main_class}.java"
         src_file.write_text(code, encoding="utf-8")
 
         # --- Compilation Step ---
         compile_cmd = [javac, str(src_file)]
         try:
-            comp_proc = subprocess.run(
-                compile_cmd,
-                text=True,
-                capture_output=True,
-                timeout=TIMEOUT,
-                cwd=td_path
-            )
+            with timed("compile"):
+                comp_proc = subprocess.run(
+                    compile_cmd,
+                    text=True,
+                    capture_output=True,
+                    timeout=TIMEOUT,
+                    cwd=td_path
+                )
         except subprocess.TimeoutExpired:
             return False, f"⏱️ Java compilation exceeded {TIMEOUT}s"
 
@@ -91,19 +116,13 @@ def _exec(code: str, globals: Optional[Dict] = None) -> Tuple[bool, str]:
 
         # --- Execution Step ---
         run_cmd = [java, main_class]
-        try:
-            run_proc = subprocess.run(
-                run_cmd,
-                text=True,
-                capture_output=True,
-                timeout=TIMEOUT,
-                cwd=td_path
-            )
-        except subprocess.TimeoutExpired:
-            return False, f"⏱️ Java execution exceeded {TIMEOUT}s"
+        # Empty stdin, as in the helper: cells never read the app's terminal
+        run = run_streaming(run_cmd, TIMEOUT, cwd=str(td_path), stdin="")
+        if run.returncode is None:
+            return False, run.output + stop_reason(run.returncode, run.stopped, TIMEOUT)
 
-        ok = run_proc.returncode == 0
-        output = run_proc.stdout if ok else f"Runtime Error:\n{run_proc.stdout}{run_proc.stderr}"
+        ok = run.returncode == 0
+        output = run.stdout if ok else f"Runtime Error:\n{run.output}"
         return ok, output
 
 def register(reg):
@@ -1,26 +1,38 @@
-import io
-import contextlib
-import threading
+import uuid
 
-from ..runtime.constants import TIMEOUT, STATUS_Q
+from ..runtime.constants import PYTHON_ISOLATION, TIMEOUT, STATUS_Q
+from ..runtime.execmeta import record_timing
+from ..runtime.limits import current_policy, record_usage
+from ..runtime.scheduler import current_job
+from ..runtime.stream import emit_output
+from ..runtime.workers import FORK_SERVER, PYTHON_WORKERS
 
 
 def _exec(code: str, g: dict | None = None) -> tuple[bool, str]:
-    """Execute Python code with an optional shared globals dict."""
-    ns = g if g is not None else {}
-    ns["status_q"] = STATUS_Q
-    buf = io.StringIO()
+    """Execute Python code in a worker process.
 
-    def target() -> None:
-        with contextlib.redirect_stdout(buf):
-            exec(code, ns)
+    ``g`` identifies the session: runs sharing it share one worker and its
+    globals.  Without it the code runs in a throwaway namespace.  Session
+    cells can call ``snapshot(name)`` to keep the globals as they are when
+    the cell finishes, and start with ``restore(name)`` to run from them
+    again (see runtime/workers.py).
 
-    t = threading.Thread(target=target)
-    t.start()
-    t.join(TIMEOUT)
-    if t.is_alive():
-        return False, "⏱️ Timeout"
-    return True, buf.getvalue()
+    With ``"fork"`` isolation (the job's, else ``PYTHON_ISOLATION``) every
+    run gets a fresh fork of the fork server instead, sharing nothing.
+    """
+    job = current_job()
+    options = dict(
+        on_status=STATUS_Q.put,
+        on_output=emit_output,
+        policy=current_policy(),
+        on_usage=record_usage,
+        on_timing=record_timing,
+        should_stop=(lambda: job.cancelled) if job is not None else None,
+    )
+    if ((job.isolation if job is not None else None) or PYTHON_ISOLATION) == "fork":
+        return FORK_SERVER.run(code, TIMEOUT, **options)
+    session = g.setdefault("__worker_session__", uuid.uuid4().hex) if g is not None else None
+    return PYTHON_WORKERS.run(session, code, TIMEOUT, **options)
 
 
 def register(reg):
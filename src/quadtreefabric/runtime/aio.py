@@ -0,0 +1,180 @@
+"""Asyncio support for executors.
+
+An executor may be an ``async def`` taking the same ``(code, globals)``
+arguments as a plain one and returning an ``ExecMeta`` or ``(ok, output)``.
+The scheduler runs such executors as tasks on ``ASYNC_LOOP`` rather than
+on a worker thread each, so executors that mostly wait on pipes or
+sockets scale to hundreds of concurrent runs.  They stream with
+``emit_output`` as usual (the job is in the task's context) and can start
+processes with ``run_process``, the asyncio counterpart of
+``stream.run_streaming`` (they share its output capture, budget and stop
+rules).
+
+The loop runs on a background thread of its own, started on first use,
+so it keeps draining pipes and enforcing timeouts and cancellation while
+the UI thread is busy or blocked (e.g. in a modal file dialog); the UI
+only sees the jobs' status events, through ``ExecutionScheduler.poll``.
+
+Plain executors keep working on either side: ``to_async`` adapts one for
+async callers by running it in a thread, and the registry runs async
+executors to completion for synchronous callers.
+"""
+from __future__ import annotations
+
+import asyncio
+import concurrent.futures
+import contextlib
+import contextvars
+import functools
+import os
+import signal
+import threading
+import time
+from typing import Any, Awaitable, Callable, List, Optional
+
+from .limits import ResourcePolicy, current_policy
+from .scheduler import current_job
+from .stream import _POLL, CHUNK, RunCapture, StreamedRun, emit_output, spawn
+
+
+class AsyncLoop:
+    """One asyncio event loop, running on a thread of its own."""
+
+    def __init__(self) -> None:
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+
+    @property
+    def loop(self) -> asyncio.AbstractEventLoop:
+        with self._lock:
+            if self._loop is None:
+                self._loop = asyncio.new_event_loop()
+                self._thread = threading.Thread(target=self._loop.run_forever,
+                                                name="fabric-asyncio", daemon=True)
+                self._thread.start()
+            return self._loop
+
+    def submit(self, coro: Awaitable, context: Optional[contextvars.Context] = None
+               ) -> concurrent.futures.Future:
+        """Schedule ``coro`` from any thread, optionally in ``context``.
+
+        Cancelling the returned future cancels the task.
+        """
+        if context is not None:
+            async def in_context(inner: Awaitable) -> Any:
+                return await asyncio.get_running_loop().create_task(inner, context=context)
+            coro = in_context(coro)
+        return asyncio.run_coroutine_threadsafe(coro, self.loop)
+
+    def run_sync(self, coro: Awaitable) -> Any:
+        """Run ``coro`` on the loop, in the caller's context, and wait for its result.
+
+        Must not be called from a coroutine on the loop itself.
+        """
+        if threading.current_thread() is self._thread:
+            raise RuntimeError("run_sync would block the event loop it waits on")
+        return self.submit(coro, contextvars.copy_context()).result()
+
+    def shutdown(self) -> None:
+        """Cancel the remaining tasks (killing their processes) and close the loop."""
+        with self._lock:
+            loop, self._loop = self._loop, None
+            thread, self._thread = self._thread, None
+        if loop is None:
+            return
+
+        async def cancel_all() -> None:
+            tasks = asyncio.all_tasks() - {asyncio.current_task()}
+            for task in tasks:
+                task.cancel()
+            if tasks:
+                await asyncio.wait(tasks, timeout=1.0)
+
+        asyncio.run_coroutine_threadsafe(cancel_all(), loop).add_done_callback(
+            lambda _: loop.call_soon_threadsafe(loop.stop))
+        thread.join(2.0)
+        if not loop.is_running():
+            loop.close()
+
+
+def to_async(fn: Callable) -> Callable[..., Awaitable]:
+    """Adapt a plain executor for async callers: it runs in a thread, keeping the job context."""
+    @functools.wraps(fn)
+    async def run(code: str, g: dict | None = None):
+        return await asyncio.to_thread(fn, code, g)
+    return run
+
+
+async def _exit_status(pid: int):
+    """Wait for child ``pid`` without blocking the loop; return its ``wait4`` status and rusage."""
+    if not hasattr(os, "pidfd_open"):
+        return await asyncio.to_thread(lambda: os.wait4(pid, 0)[1:])
+    loop = asyncio.get_running_loop()
+    fd = os.pidfd_open(pid)
+    exited = loop.create_future()
+    loop.add_reader(fd, lambda: exited.done() or exited.set_result(None))
+    try:
+        await exited
+    finally:
+        loop.remove_reader(fd)
+        os.close(fd)
+    return os.wait4(pid, 0)[1:]
+
+
+async def run_process(argv: List[str], timeout: float, cwd: Optional[str] = None,
+                      policy: Optional[ResourcePolicy] = None) -> StreamedRun:
+    """Asyncio version of ``run_streaming``: stream a process's output to the current job.
+
+    Limits, environment, timeout, output budget, usage and timings work the
+    same way (see ``stream.RunCapture``), and the process is killed if the
+    job or task is cancelled.  The pipes and the child's exit are watched by
+    the event loop itself (through a pidfd on Linux), so a run costs no
+    threads.
+    """
+    job = current_job()
+    policy = policy or current_policy()
+    loop = asyncio.get_running_loop()
+    proc = spawn(argv, cwd, policy, job)
+    capture = RunCapture(policy, lambda text, name: emit_output(text, name, job))
+
+    async def pump(pipe, name: str) -> None:
+        reader = asyncio.StreamReader()
+        transport, _ = await loop.connect_read_pipe(lambda: asyncio.StreamReaderProtocol(reader), pipe)
+        try:
+            while chunk := await reader.read(CHUNK):
+                if not capture.feed(name, chunk):
+                    return
+            capture.close(name)
+        finally:
+            transport.close()
+
+    start = time.monotonic()
+    pumps = [asyncio.ensure_future(pump(proc.stdout, "stdout")),
+             asyncio.ensure_future(pump(proc.stderr, "stderr"))]
+    exited = asyncio.ensure_future(_exit_status(proc.pid))
+    stopped = ""
+    try:
+        while not exited.done():
+            await asyncio.wait({exited}, timeout=_POLL)
+            stopped = capture.stop_check(start, timeout, job)
+            if stopped:
+                break
+    except asyncio.CancelledError:
+        stopped = "cancelled"
+        raise
+    finally:
+        if stopped and not exited.done():
+            # Not Popen.kill: it polls, and could reap the child before _exit_status does
+            with contextlib.suppress(ProcessLookupError):
+                os.kill(proc.pid, signal.SIGKILL)
+        status, rusage = await exited
+        proc.returncode = os.waitstatus_to_exitcode(status)
+        ended = time.monotonic()
+        await asyncio.wait(pumps, timeout=1.0)
+        for task in pumps:
+            task.cancel()
+    return capture.result(proc.returncode, stopped, rusage, job, start, ended)
+
+
+ASYNC_LOOP = AsyncLoop()
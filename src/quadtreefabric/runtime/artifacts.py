@@ -0,0 +1,159 @@
+"""Named shared-memory buffers that cells can pass to each other.
+
+A cell publishes a buffer under a name and fills it in place; any other
+cell, in any worker process and any language, maps the same pages by name,
+so large data (arrays, images, tables) moves between cells without being
+copied, pickled or printed.
+
+Buffers are memory-mapped files in one private directory per app instance
+(see ``tempdirs``), on ``/dev/shm`` where it exists so they never touch
+the disk.  The directory is exported as ``QTF_ARTIFACTS``, which every
+process the app starts inherits:
+
+* Python cells get the store as the global ``artifacts``::
+
+      buf = artifacts.create("frame", 1 << 30)      # writable mmap
+      arr = artifacts.array("xs", shape=(n,), dtype="float64")   # needs numpy
+      xs = artifacts.array("xs")                    # in another cell
+
+* other languages open and ``mmap`` the file ``$QTF_ARTIFACTS/<name>``;
+  ``<name>.json``, if present, holds metadata such as dtype and shape.
+
+Buffers live until they are removed or the app exits; at startup the app
+also removes the directories of instances that died without cleaning up.
+"""
+from __future__ import annotations
+
+import json
+import mmap
+import os
+import re
+import shutil
+import tempfile
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+from .tempdirs import private_dir, sweep_stale
+
+ENV_VAR = "QTF_ARTIFACTS"
+
+_NAME = re.compile(r"[A-Za-z0-9_][A-Za-z0-9_.-]*")
+
+
+def _base() -> Path:
+    return Path("/dev/shm") if Path("/dev/shm").is_dir() else Path(tempfile.gettempdir())
+
+
+class ArtifactStore:
+    """Directory of memory-mapped buffers, addressed by name."""
+
+    def __init__(self, root: Optional[Path] = None) -> None:
+        self._root = Path(root) if root else None
+
+    @property
+    def root(self) -> Path:
+        """The inherited ``QTF_ARTIFACTS``, else a private directory made on first use."""
+        if self._root is None:
+            inherited = os.environ.get(ENV_VAR)
+            self._root = Path(inherited) if inherited else private_dir("artifacts", _base())
+        return self._root
+
+    def export_env(self) -> None:
+        """Make the store visible to every process started from now on.
+
+        Called once at startup, so it also sweeps away stores left by dead instances.
+        """
+        if ENV_VAR not in os.environ:
+            sweep_stale([_base()])
+        os.environ[ENV_VAR] = str(self.root)
+
+    def path(self, name: str) -> Path:
+        if not _NAME.fullmatch(name) or name.endswith(".json"):
+            raise ValueError(f"invalid artifact name {name!r}")
+        return self.root / name
+
+    def create(self, name: str, size: int, meta: Optional[Dict[str, Any]] = None) -> mmap.mmap:
+        """Create (or replace) a buffer of ``size`` bytes and map it for writing.
+
+        A replaced buffer's old pages stay valid for whoever still maps them.
+        The old metadata is removed before the buffer is swapped in and the
+        new one published after it, so a reader never sees metadata that
+        belongs to another buffer.
+        """
+        path = self.path(name)
+        self.root.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_name(f".{name}.{os.getpid()}.tmp")
+        with open(tmp, "w+b") as f:
+            f.truncate(size)
+            mm = mmap.mmap(f.fileno(), size) if size else mmap.mmap(-1, 1)
+        meta_path = path.with_name(f"{name}.json")
+        meta_path.unlink(missing_ok=True)
+        os.replace(tmp, path)
+        if meta:
+            meta_tmp = path.with_name(f".{name}.json.{os.getpid()}.tmp")
+            meta_tmp.write_text(json.dumps(meta), encoding="utf-8")
+            os.replace(meta_tmp, meta_path)
+        return mm
+
+    def publish(self, name: str, data, meta: Optional[Dict[str, Any]] = None) -> None:
+        """Copy bytes-like ``data`` into a new buffer (``create`` avoids even this copy)."""
+        view = memoryview(data).cast("B")
+        mm = self.create(name, view.nbytes, meta)
+        mm[:view.nbytes] = view
+        mm.close()
+
+    def open(self, name: str, writable: bool = False) -> mmap.mmap:
+        """Map an existing buffer; raises KeyError if there is none."""
+        try:
+            f = open(self.path(name), "r+b" if writable else "rb")
+        except FileNotFoundError:
+            raise KeyError(name) from None
+        with f:
+            size = os.fstat(f.fileno()).st_size
+            if size == 0:
+                return mmap.mmap(-1, 1)
+            return mmap.mmap(f.fileno(), size, access=mmap.ACCESS_WRITE if writable else mmap.ACCESS_READ)
+
+    def meta(self, name: str) -> Dict[str, Any]:
+        try:
+            return json.loads(self.path(name).with_name(f"{name}.json").read_text(encoding="utf-8"))
+        except FileNotFoundError:
+            return {}
+
+    def array(self, name: str, shape=None, dtype: str = "float64", writable: bool = True):
+        """A numpy array on a buffer: new if ``shape`` is given, else the published one."""
+        import numpy as np  # optional; only this helper needs it
+
+        if shape is not None:
+            shape = tuple(shape) if isinstance(shape, (list, tuple)) else (shape,)
+            dt = np.dtype(dtype)
+            size = int(np.prod(shape, dtype=np.int64)) * dt.itemsize
+            mm = self.create(name, size, {"dtype": dt.str, "shape": list(shape)})
+        else:
+            info = self.meta(name)
+            if "dtype" not in info:
+                raise KeyError(f"artifact {name!r} has no array metadata")
+            dt, shape = np.dtype(info["dtype"]), tuple(info["shape"])
+            mm = self.open(name, writable)
+        return np.ndarray(shape, dtype=dt, buffer=mm)
+
+    def names(self) -> List[str]:
+        if not self.root.is_dir():
+            return []
+        return sorted(p.name for p in self.root.iterdir()
+                      if not p.name.startswith(".") and not p.name.endswith(".json"))
+
+    def remove(self, name: str) -> None:
+        path = self.path(name)
+        for p in (path, path.with_name(f"{name}.json")):
+            try:
+                p.unlink()
+            except FileNotFoundError:
+                pass
+
+    def clear(self) -> None:
+        if self._root is not None:
+            shutil.rmtree(self._root, ignore_errors=True)
+
+
+ARTIFACTS = ArtifactStore()
@@ -0,0 +1,153 @@
+"""Coordinated compilation of C/C++ cells.
+
+Every compiler invocation takes a token from one ``TokenPool`` sized to the
+machine's cores, in the manner of a make jobserver, so a batch of cells
+never runs more compilers at once than there are cores.  Identical builds
+(same source, compiler and flags, i.e. the same ``CompileCache`` key) are
+compiled once: later requests wait for the build already in flight.
+
+When a job is submitted the scheduler calls the executor's ``prepare``
+hook, which starts its build here in the background.  By the time the cell
+runs, usually behind other cells of its session, the binary is already in
+the cache, so a batch's compiles overlap even though its runs are serial.
+
+Each source is compiled and linked by one compiler invocation, which is
+timed as ``compile`` (there is no separate link step to report as
+``link``); time spent waiting for a token counts as ``queue``, and waiting
+for someone else's build of the same source as ``compile``.
+"""
+from __future__ import annotations
+
+import contextlib
+import os
+import shutil
+import subprocess
+import tempfile
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from pathlib import Path
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+
+from .compile_cache import COMPILE_CACHE, CompileCache
+from .constants import TIMEOUT
+from .execmeta import record_timing, timed
+from .scratch import SCRATCH
+
+BuildResult = Tuple[Optional[Path], str]  # (binary, "") or (None, compiler output)
+
+
+class TokenPool:
+    """A fixed number of build tokens; each running compiler holds one."""
+
+    def __init__(self, tokens: Optional[int] = None) -> None:
+        self.tokens = tokens or os.cpu_count() or 1
+        self._sem = threading.Semaphore(self.tokens)
+
+    @contextlib.contextmanager
+    def token(self) -> Iterator[None]:
+        """Hold a token for the block; time spent waiting for it counts as ``queue``."""
+        with timed("queue"):
+            self._sem.acquire()
+        try:
+            yield
+        finally:
+            self._sem.release()
+
+
+def _compile(src_suffix: str, cmd: List[str], out_dir: Path, phases: Dict[str, float]) -> BuildResult:
+    """Compile and link into ``out_dir`` in one step, recording its ms in ``phases``."""
+    src = out_dir / f"snippet{src_suffix}"
+    exe = out_dir / ("a.exe" if os.name == "nt" else "a.out")
+    src.write_text(cmd[-1], encoding="utf-8")
+    start = time.perf_counter()
+    try:
+        comp = subprocess.run([*cmd[:-1], str(src), "-o", str(exe)],
+                              text=True, capture_output=True, timeout=TIMEOUT)
+    except subprocess.TimeoutExpired:
+        return None, f"⏱️ Compilation exceeded {TIMEOUT}s"
+    finally:
+        phases["compile"] = (time.perf_counter() - start) * 1000
+    if comp.returncode:
+        return None, comp.stdout + comp.stderr
+    return exe, ""
+
+
+class BuildScheduler:
+    """Compiles on behalf of executors, bounded by a token pool and deduplicated."""
+
+    def __init__(self, tokens: Optional[int] = None, cache: CompileCache = COMPILE_CACHE) -> None:
+        self.tokens = TokenPool(tokens)
+        self.cache = cache
+        self._lock = threading.Lock()
+        self._inflight: Dict[str, Future] = {}
+        # Waiting for a token blocks, so prebuilds get their own threads
+        self._pool = ThreadPoolExecutor(max_workers=32, thread_name_prefix="build")
+
+    def build(self, src_suffix: str, cmd: List[str]) -> BuildResult:
+        """Binary for ``cmd`` (compiler command, source text last), from the cache if possible."""
+        key = self.cache.key(cmd[-1], cmd[0], cmd[1:-1])
+        cached = self.cache.lookup(key)
+        if cached:
+            return cached, ""
+        with self._lock:
+            fut = self._inflight.get(key)
+            owner = fut is None
+            if owner:
+                fut = self._inflight[key] = Future()
+        if not owner:
+            start = time.perf_counter()
+            result = fut.result()
+            # The build ran on another thread; the wait is this job's compile time
+            record_timing("compile", (time.perf_counter() - start) * 1000)
+            return result
+        phases: Dict[str, float] = {}
+        try:
+            result = self._build(key, src_suffix, cmd, phases)
+        except Exception as e:
+            result = None, f"Build error: {e}"
+        for phase, ms in phases.items():
+            record_timing(phase, ms)
+        with self._lock:
+            del self._inflight[key]
+        fut.set_result(result)
+        return result
+
+    def _build(self, key: str, src_suffix: str, cmd: List[str], phases: Dict[str, float]) -> BuildResult:
+        with self.tokens.token(), SCRATCH.lease(src_suffix.lstrip(".")) as td:
+            exe, err = _compile(src_suffix, cmd, td, phases)
+            if exe is None:
+                return None, err
+            try:
+                return self.cache.store(key, exe), ""
+            except OSError:
+                # Unwritable cache: keep the binary outside the scratch directory
+                keep = Path(tempfile.mkdtemp(prefix="build_")) / exe.name
+                shutil.copy2(exe, keep)
+                return keep, ""
+
+    @contextlib.contextmanager
+    def uncached(self, src_suffix: str, cmd: List[str]) -> Iterator[BuildResult]:
+        """Build without the cache; the binary is deleted when the block exits."""
+        with SCRATCH.lease(src_suffix.lstrip(".")) as td:
+            phases: Dict[str, float] = {}
+            with self.tokens.token():
+                result = _compile(src_suffix, cmd, td, phases)
+            for phase, ms in phases.items():
+                record_timing(phase, ms)
+            yield result
+
+    def prebuild(self, src_suffix: str, plan: Callable[[], Optional[List[str]]]) -> None:
+        """Start building in the background; ``plan`` returns the command (None: nothing to build).
+
+        ``plan`` runs on a build thread, since working out the command may
+        itself be slow (compiler lookup, precompiled headers).
+        """
+        def run() -> None:
+            cmd = plan()
+            if cmd:
+                self.build(src_suffix, cmd)
+        self._pool.submit(run)
+
+
+BUILDS = BuildScheduler()
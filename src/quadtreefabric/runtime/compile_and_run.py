@@ -1,12 +1,16 @@
 from __future__ import annotations
-import os
+import asyncio
 import shutil
-import subprocess
-import tempfile
 from pathlib import Path
-from typing import Iterable, Tuple
+from typing import Callable, Iterable
 
+from .aio import run_process
+from .build import BUILDS
 from .constants import TIMEOUT
+from .execmeta import ExecMeta
+from .limits import stop_reason
+from .scratch import SCRATCH
+from .stream import StreamedRun, run_streaming
 
 
 def _find(progs: Iterable[str]) -> str | None:
@@ -17,25 +21,60 @@ def _find(progs: Iterable[str]) -> str | None:
     return None
 
 
-def compile_and_run(src_suffix: str, cmd: list[str], run_argv: list[str] | None = None) -> Tuple[bool, str]:
-    """Compile and run a program with TIMEOUT."""
+def _run_binary(exe: Path, run_argv: list[str], language: str) -> ExecMeta:
+    # Each run starts in an empty directory of its own, so files it writes can't leak into other runs
+    with SCRATCH.lease(language) as cwd:
+        return _result(run_streaming([str(exe), *run_argv], TIMEOUT, cwd=str(cwd)))
+
+
+def _result(run: StreamedRun) -> ExecMeta:
+    ok = run.returncode == 0
+    reason = stop_reason(run.returncode, run.stopped, TIMEOUT)
+    return ExecMeta(stdout=run.stdout, stderr=run.stderr, exit_code=run.returncode,
+                    output=run.stdout if ok else run.output + reason,
+                    peak_rss_kb=run.usage.peak_rss_kb if run.usage else None)
+
+
+def compile_and_run(src_suffix: str, cmd: list[str], run_argv: list[str] | None = None,
+                    cache: bool = True) -> ExecMeta:
+    """Compile and run a program with TIMEOUT.
+
+    ``cmd`` is the compiler command with the source text as its last item.
+    The build goes through BUILDS, which bounds concurrent compilers and
+    shares identical builds; with ``cache`` the binary is looked up in (and
+    added to) COMPILE_CACHE, so unchanged sources are not recompiled.  The
+    program runs in an empty scratch directory (see scratch.py).
+    A failed build is reported with no exit code, the compiler's output as
+    stderr.
+    """
     run_argv = run_argv or []
-    with tempfile.TemporaryDirectory(prefix="exec_") as td:
-        td_path = Path(td)
-        src = td_path / f"snippet{src_suffix}"
-        exe = td_path / ("a.exe" if os.name == "nt" else "a.out")
-        src.write_text(cmd[-1], encoding="utf-8")
-        cmd[-1] = str(src)
-        cmd.extend(["-o", str(exe)])
-        try:
-            comp = subprocess.run(cmd, text=True, capture_output=True, timeout=TIMEOUT)
-        except subprocess.TimeoutExpired:
-            return False, f"⏱️ Compilation exceeded {TIMEOUT}s"
-        if comp.returncode:
-            return False, comp.stdout + comp.stderr
-        try:
-            run = subprocess.run([str(exe), *run_argv], text=True, capture_output=True, timeout=TIMEOUT)
-        except subprocess.TimeoutExpired:
-            return False, f"⏱️ Execution exceeded {TIMEOUT}s"
-        ok = run.returncode == 0
-        return ok, run.stdout if ok else run.stderr
+    if not cache:
+        with BUILDS.uncached(src_suffix, cmd) as (exe, err):
+            if exe is None:
+                return ExecMeta(stderr=err, exit_code=None, ok=False)
+            return _run_binary(exe, run_argv, src_suffix.lstrip("."))
+    exe, err = BUILDS.build(src_suffix, cmd)
+    if exe is None:
+        return ExecMeta(stderr=err, exit_code=None, ok=False)
+    return _run_binary(exe, run_argv, src_suffix.lstrip("."))
+
+
+async def compile_and_run_async(src_suffix: str, cmd: list[str], run_argv: list[str] | None = None,
+                                cache: bool = True) -> ExecMeta:
+    """``compile_and_run`` for async executors.
+
+    Builds still run on threads (they hold build tokens); the program itself
+    runs on the event loop, so waiting for it ties up no thread.
+    """
+    if not cache:
+        return await asyncio.to_thread(compile_and_run, src_suffix, cmd, run_argv, False)
+    exe, err = await asyncio.to_thread(BUILDS.build, src_suffix, cmd)
+    if exe is None:
+        return ExecMeta(stderr=err, exit_code=None, ok=False)
+    with SCRATCH.lease(src_suffix.lstrip(".")) as cwd:
+        return _result(await run_process([str(exe), *(run_argv or [])], TIMEOUT, cwd=str(cwd)))
+
+
+def prebuild(src_suffix: str, plan: Callable[[], list[str] | None]) -> None:
+    """Start compiling ahead of the run; ``plan`` returns the ``cmd`` compile_and_run will get."""
+    BUILDS.prebuild(src_suffix, plan)
@@ -0,0 +1,123 @@
+"""Content-addressed cache of compiled cell binaries.
+
+Binaries are keyed by the source text, the compiler (path and version
+string) and the compiler flags, and stored in the user cache directory, so
+re-running an unchanged C/C++ cell skips compilation entirely.  The cache
+is capped in size; the least recently used binaries are evicted first
+(a hit refreshes the file's mtime, which serves as the LRU clock).
+"""
+from __future__ import annotations
+
+import hashlib
+import os
+import shutil
+import subprocess
+import sys
+import threading
+from pathlib import Path
+from typing import Dict, Optional, Sequence, Tuple
+
+DEFAULT_MAX_BYTES = 512 * 1024 * 1024
+
+
+def user_cache_dir() -> Path:
+    """Per-user cache root, overridable with ``QTF_CACHE_DIR``."""
+    override = os.environ.get("QTF_CACHE_DIR")
+    if override:
+        return Path(override)
+    if os.name == "nt":
+        base = Path(os.environ.get("LOCALAPPDATA", Path.home() / "AppData" / "Local"))
+    elif sys.platform == "darwin":
+        base = Path.home() / "Library" / "Caches"
+    else:
+        base = Path(os.environ.get("XDG_CACHE_HOME", Path.home() / ".cache"))
+    return base / "quadtreefabric"
+
+
+_VERSIONS: Dict[Tuple[str, int], str] = {}
+
+
+def compiler_identity(compiler: str) -> str:
+    """Path plus ``--version`` banner; memoized until the binary changes."""
+    try:
+        stamp = os.stat(compiler).st_mtime_ns
+    except OSError:
+        stamp = 0
+    key = (compiler, stamp)
+    if key not in _VERSIONS:
+        try:
+            banner = subprocess.run([compiler, "--version"], text=True,
+                                    capture_output=True, timeout=10).stdout
+        except (OSError, subprocess.SubprocessError):
+            banner = ""
+        _VERSIONS[key] = f"{compiler}\n{banner}"
+    return _VERSIONS[key]
+
+
+class CompileCache:
+    """Size-capped LRU store of executables keyed by build inputs."""
+
+    def __init__(self, root: Optional[Path] = None, max_bytes: int = DEFAULT_MAX_BYTES) -> None:
+        self.root = Path(root) if root else user_cache_dir() / "build"
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+
+    def key(self, source: str, compiler: str, flags: Sequence[str]) -> str:
+        h = hashlib.sha256()
+        for part in (compiler_identity(compiler), "\0".join(flags), source):
+            h.update(part.encode("utf-8"))
+            h.update(b"\0\0")
+        return h.hexdigest()
+
+    def _path(self, key: str) -> Path:
+        return self.root / key[:2] / (key + (".exe" if os.name == "nt" else ""))
+
+    def lookup(self, key: str) -> Optional[Path]:
+        path = self._path(key)
+        try:
+            os.utime(path)  # mark as recently used
+        except OSError:
+            return None
+        return path
+
+    def store(self, key: str, binary: Path) -> Path:
+        """Copy a freshly built binary into the cache and return its cached path."""
+        path = self._path(key)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_name(f"{path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+        shutil.copy2(binary, tmp)
+        os.replace(tmp, path)  # atomic, so concurrent readers never see a partial file
+        os.utime(path)
+        self.evict()
+        return path
+
+    def evict(self) -> int:
+        """Delete least recently used binaries until under ``max_bytes``; return bytes freed."""
+        with self._lock:
+            entries = []
+            total = 0
+            for f in self.root.glob("*/*"):
+                if f.name.endswith(".tmp"):
+                    continue
+                try:
+                    st = f.stat()
+                except OSError:
+                    continue
+                entries.append((st.st_mtime, st.st_size, f))
+                total += st.st_size
+            freed = 0
+            for _, size, f in sorted(entries):
+                if total - freed <= self.max_bytes:
+                    break
+                try:
+                    f.unlink()
+                except OSError:
+                    continue  # e.g. still running on Windows
+                freed += size
+            return freed
+
+    def clear(self) -> None:
+        shutil.rmtree(self.root, ignore_errors=True)
+
+
+COMPILE_CACHE = CompileCache()
@@ -4,3 +4,37 @@ TIMEOUT: int = 5  # seconds
 ENTRYPOINT_GROUP: str = "fabric_nodes.executors"
 STATUS_Q: Queue[str] = Queue()
 
+
+# Standard headers precompiled for C++ cells and included in every cell;
+# an empty tuple disables the precompiled prelude.
+CPP_PRELUDE: tuple[str, ...] = (
+    "algorithm", "array", "cmath", "cstdint", "cstdio", "cstdlib", "functional",
+    "iostream", "map", "memory", "numeric", "set", "sstream", "string",
+    "unordered_map", "unordered_set", "utility", "vector",
+)
+
+# Disk budget for stored cell results (see result_cache.py) and how long an
+# entry stays valid in seconds; None keeps entries until they are evicted.
+RESULT_CACHE_BYTES: int = 256 * 1024 * 1024
+RESULT_CACHE_TTL: float | None = None
+
+# Idle pre-spawned workers kept per language (see warm_pool.py); languages
+# not listed keep one.  A pool unused for WARM_IDLE_SECS is emptied until
+# it is used again.
+WARM_WORKERS: dict[str, int] = {"python": 2}
+WARM_IDLE_SECS: float = 300.0
+
+# Idle scratch directories kept per language for compiles and runs (see
+# scratch.py); more are created as needed and removed after use.
+SCRATCH_DIRS: int = 8
+
+# How Python cells run unless their payload says otherwise: "session" keeps
+# one worker per session with shared globals, "fork" runs every cell in a
+# fresh fork of a server that has already imported PYTHON_PRELOAD (see
+# workers.py).
+PYTHON_ISOLATION: str = "session"
+PYTHON_PRELOAD: tuple[str, ...] = ()
+
+# Helper JVMs for Java cells (see java_server.py): at most this many Java
+# cells run at once; each helper is started on first use.
+JAVA_HELPERS: int = 2
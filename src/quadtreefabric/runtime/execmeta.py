@@ -0,0 +1,93 @@
+"""Structured results of cell runs.
+
+Executors may return an ``ExecMeta`` instead of the legacy ``(ok, output)``
+pair; the registry converts legacy results with ``ExecMeta.from_legacy``,
+so old plugins keep working, and an ``ExecMeta`` still unpacks as
+``ok, output`` for callers written against the old contract.
+
+Time is broken down by phase, in milliseconds:
+
+* ``queue``     waiting for a worker thread and for the cell's session
+* ``compile``   compiling (zero on a compile-cache hit)
+* ``link``      linking, where it is a separate step
+* ``run``       the program itself
+* ``transfer``  moving its output back after it finished (pipes, worker IPC)
+
+Executors record phases on the current job with ``timed`` or
+``record_timing``; whatever executor time is not attributed to a phase
+counts as ``run``.
+"""
+from __future__ import annotations
+
+import contextlib
+import time
+from dataclasses import dataclass, field
+from typing import Dict, Iterator, Optional, Tuple
+
+from .scheduler import current_job
+
+PHASES = ("queue", "compile", "link", "run", "transfer")
+
+
+@dataclass(slots=True)
+class ExecMeta:
+    stdout: str = ""
+    stderr: str = ""
+    exit_code: Optional[int] = 0          # None if the process was killed or there was none
+    ok: Optional[bool] = None             # defaults to exit_code == 0
+    output: Optional[str] = None          # text to show; defaults to stdout + stderr
+    timings: Dict[str, float] = field(default_factory=dict)  # ms per phase, see PHASES
+    peak_rss_kb: Optional[int] = None
+
+    def __post_init__(self) -> None:
+        if self.ok is None:
+            self.ok = self.exit_code == 0
+        if self.output is None:
+            self.output = self.stdout + self.stderr
+
+    @classmethod
+    def from_legacy(cls, result) -> "ExecMeta":
+        """Wrap an ``(ok, output)`` pair; an ``ExecMeta`` is returned as is."""
+        if isinstance(result, ExecMeta):
+            return result
+        ok, output = result
+        job = current_job()
+        if job is not None and job.streamed:
+            # The run streamed its output, so the streams are known after all
+            stdout = "".join(job.streamed.get("stdout", ()))
+            stderr = "".join(job.streamed.get("stderr", ()))
+        else:
+            # Nothing tells the streams apart; failures usually print errors
+            stdout, stderr = (output, "") if ok else ("", output)
+        return cls(stdout=stdout, stderr=stderr, exit_code=0 if ok else 1, ok=bool(ok), output=output)
+
+    def __iter__(self) -> Iterator:
+        # Unpacks as the legacy (ok, output) pair
+        return iter((self.ok, self.output))
+
+    def legacy(self) -> Tuple[bool, str]:
+        return bool(self.ok), self.output
+
+    def breakdown(self) -> str:
+        """e.g. "queue 3 · compile 412 · run 15 ms"."""
+        parts = [f"{phase} {self.timings[phase]:.0f}" for phase in PHASES
+                 if self.timings.get(phase, 0) >= 0.5]
+        return " · ".join(parts) + " ms" if parts else ""
+
+
+def record_timing(phase: str, ms: float, job=None) -> None:
+    """Add ``ms`` to a phase of ``job`` (default: the current job; no-op outside a job)."""
+    job = job or current_job()
+    if job is not None:
+        job.timings[phase] = job.timings.get(phase, 0.0) + ms
+
+
+@contextlib.contextmanager
+def timed(phase: str, job=None):
+    """Attribute the time spent in the block to ``phase`` of ``job`` (default: the current job)."""
+    job = job or current_job()
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_timing(phase, (time.perf_counter() - start) * 1000, job)
@@ -0,0 +1,66 @@
+"""Fingerprints for incremental re-execution.
+
+A cell's fingerprint covers everything that determines its result: the
+language, the code, the executor's version, the values of its declared
+inputs and its scope: the execution options (limits, isolation) and, for
+a cell that shares a session, the identity of the live session (see
+``ExecutionScheduler.session_token``) and, outside a dataflow graph, the
+fingerprint of the session cell run before it in the same batch.  So a
+session cell is only skipped while the session that ran it is still
+alive and everything before it in the run is unchanged; a restart, a
+failed run in the session or another context all give new fingerprints.
+After a successful run the fingerprint, the output and the output
+values are stored in the payload, and every result goes to the disk-backed
+``RESULT_CACHE``; an incremental run skips any cell whose fingerprint
+matches either and reuses what was stored.
+"""
+from __future__ import annotations
+
+import hashlib
+import json
+from typing import Any, Dict, Optional
+
+from .result_cache import RESULT_CACHE
+
+# Stored output is capped so a chatty cell doesn't bloat the canvas file
+KEEP_OUTPUT = 64 * 1024
+
+
+def fingerprint(language: str, code: str, version: str, inputs: Dict[str, Any],
+                scope: Optional[Dict[str, Any]] = None) -> str:
+    doc = [language.lower(), version, code, sorted(inputs.items()), scope or {}]
+    raw = json.dumps(doc, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+def reuse(fp: str, previous: Optional[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+    """A successful result for ``fp``: ``previous`` if it matches, else from the result cache.
+
+    A session cell's fingerprint names the live session and the cells run
+    before it, so the cache never serves it a result from another session,
+    canvas or app run.
+    """
+    if previous and previous["fingerprint"] == fp:
+        return previous
+    entry = RESULT_CACHE.lookup_ok(fp)
+    if entry is None:
+        return None
+    return {"fingerprint": fp, "output": entry["output"], "values": entry["values"]}
+
+
+def stored_result(payload: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """The last successful result kept in ``payload``, if any."""
+    if not payload.get("last_ok") or "fingerprint" not in payload:
+        return None
+    return {
+        "fingerprint": payload["fingerprint"],
+        "output": payload.get("last_output", ""),
+        "values": payload.get("last_values", {}),
+    }
+
+
+def result_fields(fp: Optional[str], output: str, values: Dict[str, Any]) -> Dict[str, Any]:
+    """Payload keys recording a run; a failed one passes ``fp=None`` and no values."""
+    if len(output) > KEEP_OUTPUT:
+        output = output[:KEEP_OUTPUT] + "\n… (truncated)"
+    return {"fingerprint": fp, "last_output": output, "last_values": values}
@@ -0,0 +1,191 @@
+// Long-lived helper for Java cells; see runtime/java_server.py for the protocol.
+//
+// Requests arrive on stdin as two length-prefixed UTF-8 strings (main class
+// name, source).  Each source is compiled in memory with the system Java
+// compiler and its main method run in a fresh class loader.  The reply on
+// stdout is a status byte (0 ok, 1 compile error, 2 runtime error) followed
+// by the length-prefixed captured output.  While main runs, its output is
+// also sent as it is written, in frames with status 3.  Once the compiler is
+// found, and before the first request, an empty frame with status 4 says the
+// helper is ready; one that exits before that is broken.  main sees an empty
+// System.in; the protocol stream is only reachable through the server's own
+// reader.  A main that calls System.exit ends the helper, and the client
+// reports the exit status as the result of that run.
+
+import java.io.*;
+import java.lang.reflect.InvocationTargetException;
+import java.net.URI;
+import java.nio.charset.StandardCharsets;
+import java.util.HashMap;
+import java.util.List;
+import java.util.Map;
+import javax.tools.*;
+
+public final class FabricJavaServer {
+    private static final int OUTPUT = 3;
+    private static final int READY = 4;
+
+    /** Copies everything written into a buffer and forwards it as OUTPUT frames. */
+    private static final class FrameStream extends OutputStream {
+        private final DataOutputStream out;
+        private final ByteArrayOutputStream full;
+
+        FrameStream(DataOutputStream out, ByteArrayOutputStream full) {
+            this.out = out;
+            this.full = full;
+        }
+
+        @Override
+        public void write(int b) throws IOException {
+            write(new byte[] {(byte) b}, 0, 1);
+        }
+
+        @Override
+        public void write(byte[] b, int off, int len) throws IOException {
+            synchronized (out) {
+                full.write(b, off, len);
+                out.writeByte(OUTPUT);
+                out.writeInt(len);
+                out.write(b, off, len);
+                out.flush();
+            }
+        }
+    }
+
+    private static final class Source extends SimpleJavaFileObject {
+        private final String code;
+
+        Source(String name, String code) {
+            super(URI.create("string:///" + name.replace('.', '/') + Kind.SOURCE.extension), Kind.SOURCE);
+            this.code = code;
+        }
+
+        @Override
+        public CharSequence getCharContent(boolean ignoreEncodingErrors) {
+            return code;
+        }
+    }
+
+    private static final class ClassBytes extends SimpleJavaFileObject {
+        final ByteArrayOutputStream bytes = new ByteArrayOutputStream();
+
+        ClassBytes(String name) {
+            super(URI.create("bytes:///" + name.replace('.', '/') + Kind.CLASS.extension), Kind.CLASS);
+        }
+
+        @Override
+        public OutputStream openOutputStream() {
+            return bytes;
+        }
+    }
+
+    private static final class MemoryFileManager extends ForwardingJavaFileManager<StandardJavaFileManager> {
+        final Map<String, ClassBytes> classes = new HashMap<>();
+
+        MemoryFileManager(StandardJavaFileManager fm) {
+            super(fm);
+        }
+
+        @Override
+        public JavaFileObject getJavaFileForOutput(Location location, String name,
+                                                   JavaFileObject.Kind kind, FileObject sibling) {
+            ClassBytes c = new ClassBytes(name);
+            classes.put(name, c);
+            return c;
+        }
+    }
+
+    private static final class MemoryClassLoader extends ClassLoader {
+        private final Map<String, ClassBytes> classes;
+
+        MemoryClassLoader(Map<String, ClassBytes> classes) {
+            super(FabricJavaServer.class.getClassLoader());
+            this.classes = classes;
+        }
+
+        @Override
+        protected Class<?> findClass(String name) throws ClassNotFoundException {
+            ClassBytes c = classes.get(name);
+            if (c == null) {
+                throw new ClassNotFoundException(name);
+            }
+            byte[] b = c.bytes.toByteArray();
+            return defineClass(name, b, 0, b.length);
+        }
+    }
+
+    private static String readString(DataInputStream in) throws IOException {
+        byte[] b = new byte[in.readInt()];
+        in.readFully(b);
+        return new String(b, StandardCharsets.UTF_8);
+    }
+
+    public static void main(String[] args) throws IOException {
+        JavaCompiler javac = ToolProvider.getSystemJavaCompiler();
+        if (javac == null) {
+            System.err.println("No system Java compiler (running on a JRE?)");
+            System.exit(3);
+        }
+        StandardJavaFileManager std = javac.getStandardFileManager(null, null, StandardCharsets.UTF_8);
+        DataInputStream in = new DataInputStream(new BufferedInputStream(System.in));
+        DataOutputStream out = new DataOutputStream(new BufferedOutputStream(new FileOutputStream(FileDescriptor.out)));
+        // stdout carries the protocol; anything printed outside a run goes to stderr
+        PrintStream idle = System.err;
+        System.setOut(idle);
+        System.setIn(new ByteArrayInputStream(new byte[0]));
+        out.writeByte(READY);
+        out.writeInt(0);
+        out.flush();
+
+        while (true) {
+            String mainClass;
+            String code;
+            try {
+                mainClass = readString(in);
+                code = readString(in);
+            } catch (EOFException e) {
+                return;
+            }
+
+            ByteArrayOutputStream buf = new ByteArrayOutputStream();
+            int status;
+            MemoryFileManager fm = new MemoryFileManager(std);
+            StringWriter diagnostics = new StringWriter();
+            boolean compiled = javac.getTask(diagnostics, fm, null, List.of("-proc:none"), null,
+                                             List.of(new Source(mainClass, code))).call();
+            if (!compiled) {
+                status = 1;
+                buf.write(diagnostics.toString().getBytes(StandardCharsets.UTF_8));
+            } else {
+                PrintStream capture = new PrintStream(new FrameStream(out, buf), true, StandardCharsets.UTF_8);
+                System.setOut(capture);
+                System.setErr(capture);
+                // A fresh empty stdin per run, in case an earlier cell replaced it
+                System.setIn(new ByteArrayInputStream(new byte[0]));
+                try {
+                    Class<?> cls = new MemoryClassLoader(fm.classes).loadClass(mainClass);
+                    cls.getMethod("main", String[].class).invoke(null, (Object) new String[0]);
+                    status = 0;
+                } catch (InvocationTargetException e) {
+                    e.getCause().printStackTrace(capture);
+                    status = 2;
+                } catch (Throwable e) {
+                    e.printStackTrace(capture);
+                    status = 2;
+                } finally {
+                    capture.flush();
+                    System.setOut(idle);
+                    System.setErr(idle);
+                }
+            }
+
+            synchronized (out) {
+                byte[] result = buf.toByteArray();
+                out.writeByte(status);
+                out.writeInt(result.length);
+                out.write(result);
+                out.flush();
+            }
+        }
+    }
+}
@@ -0,0 +1,207 @@
+"""Persistent JVM helper for Java cells.
+
+Starting ``javac`` and ``java`` for every run pays JVM startup twice.  The
+helper (``java/FabricJavaServer.java``) is compiled once into the user cache
+directory and kept running; it compiles each cell in memory through the
+Java compiler API and runs its main class in a fresh class loader, so warm
+runs take milliseconds.
+
+Protocol over the helper's stdin/stdout, all integers big-endian:
+    ready:    byte READY; int 0, once at startup
+    request:  int len, main class (UTF-8); int len, source (UTF-8)
+    reply:    byte status (OK, COMPILE_ERROR, RUNTIME_ERROR); int len, output
+              preceded, while the cell runs, by any number of
+              byte OUTPUT; int len, chunk of stdout/stderr
+
+``JavaServer.run`` returns None when the helper is unavailable, so callers
+can fall back to the plain javac/java path.  A helper that exits before
+it is ready (e.g. no system compiler on a JRE) is unavailable for good.
+Once a cell has been sent it is never run again: if the helper exits
+during the run (the cell called ``System.exit``, or the JVM crashed), the
+exit status is the result.
+
+Each helper runs one cell at a time.  ``JAVA_SERVER`` keeps up to
+``JAVA_HELPERS`` of them, so that many Java cells run at once; further
+ones wait for a free helper.
+"""
+from __future__ import annotations
+
+import hashlib
+import struct
+import subprocess
+import threading
+import time
+from pathlib import Path
+from queue import Empty, Queue
+from typing import Callable, List, Optional, Tuple
+
+from .compile_cache import compiler_identity, user_cache_dir
+from .constants import JAVA_HELPERS
+
+OK, COMPILE_ERROR, RUNTIME_ERROR, OUTPUT, READY = 0, 1, 2, 3, 4
+
+SERVER_CLASS = "FabricJavaServer"
+SERVER_SOURCE = Path(__file__).parent / "java" / f"{SERVER_CLASS}.java"
+
+_POLL = 0.05
+_READY_SECS = 60.0  # JVM startup plus loading the compiler
+_BUILD_LOCK = threading.Lock()  # helpers share the compiled server class
+
+
+def _read_exact(stream, n: int) -> bytes:
+    data = stream.read(n)
+    if data is None or len(data) < n:
+        raise EOFError
+    return data
+
+
+class JavaServer:
+    """One helper JVM, started on first use and restarted after it dies."""
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._proc: Optional[subprocess.Popen] = None
+        self._replies: "Queue[Optional[Tuple[int, str]]]" = Queue()
+        self._broken = False  # helper could not be built; don't retry every run
+
+    def _classpath(self, javac: str) -> Optional[Path]:
+        source = SERVER_SOURCE.read_bytes()
+        key = hashlib.sha256(compiler_identity(javac).encode("utf-8") + source).hexdigest()[:24]
+        out = user_cache_dir() / "java" / key
+        with _BUILD_LOCK:
+            if (out / f"{SERVER_CLASS}.class").exists():
+                return out
+            out.mkdir(parents=True, exist_ok=True)
+            comp = subprocess.run([javac, "-d", str(out), str(SERVER_SOURCE)],
+                                  capture_output=True, text=True, timeout=120)
+        return out if comp.returncode == 0 else None
+
+    def _start(self, javac: str, java: str) -> bool:
+        if self._proc is not None and self._proc.poll() is None:
+            return True
+        if self._broken:
+            return False
+        try:
+            classpath = self._classpath(javac)
+            if classpath is None:
+                self._broken = True
+                return False
+            self._proc = subprocess.Popen(
+                [java, "-cp", str(classpath), SERVER_CLASS],
+                stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL,
+            )
+        except (OSError, subprocess.SubprocessError):
+            self._broken = True
+            return False
+        self._replies = Queue()
+        threading.Thread(target=self._reader, args=(self._proc, self._replies),
+                         name="java-helper-reader", daemon=True).start()
+        try:
+            ready = self._replies.get(timeout=_READY_SECS)
+        except Empty:
+            ready = None
+        if ready is None or ready[0] != READY:
+            # Exited (or hung) before taking a request: it will not work next time either
+            self._kill()
+            self._broken = True
+            return False
+        return True
+
+    @staticmethod
+    def _reader(proc: subprocess.Popen, replies: Queue) -> None:
+        try:
+            while True:
+                status = _read_exact(proc.stdout, 1)[0]
+                (n,) = struct.unpack(">i", _read_exact(proc.stdout, 4))
+                replies.put((status, _read_exact(proc.stdout, n).decode("utf-8", "replace")))
+        except (EOFError, OSError, ValueError):
+            replies.put(None)  # helper exited
+
+    def _exited(self, streamed: List[str]) -> Tuple[int, str]:
+        """Result of a run during which the helper exited; it is restarted next run."""
+        proc, self._proc = self._proc, None
+        try:
+            code = proc.wait(timeout=5)
+        except subprocess.TimeoutExpired:
+            proc.kill()
+            code = proc.wait()
+        output = "".join(streamed)
+        if code == 0:
+            return OK, output
+        return RUNTIME_ERROR, output + f"Java exited with status {code}"
+
+    def _kill(self) -> None:
+        if self._proc is not None:
+            self._proc.kill()
+            self._proc.wait()
+            self._proc = None
+
+    def run(self, javac: str, java: str, main_class: str, code: str, timeout: float,
+            should_stop: Optional[Callable[[], bool]] = None,
+            on_output: Optional[Callable[[str, str], None]] = None) -> Optional[Tuple[int, str]]:
+        """Compile and run one cell; None means the helper is unavailable.
+
+        A run cut short returns the output streamed so far with the reason appended.
+        """
+        streamed: List[str] = []
+        with self._lock:
+            if not self._start(javac, java):
+                return None
+            frame = b"".join(struct.pack(">i", len(b)) + b
+                             for b in (main_class.encode("utf-8"), code.encode("utf-8")))
+            try:
+                self._proc.stdin.write(frame)
+                self._proc.stdin.flush()
+            except OSError:
+                # The helper was already gone, so the cell never started
+                self._kill()
+                return None
+            deadline = time.monotonic() + timeout
+            while time.monotonic() < deadline:
+                if should_stop and should_stop():
+                    self._kill()
+                    return RUNTIME_ERROR, "".join(streamed) + "⏹ Cancelled"
+                try:
+                    reply = self._replies.get(timeout=_POLL)
+                except Empty:
+                    continue
+                if reply is None:
+                    return self._exited(streamed)
+                if reply[0] == OUTPUT:
+                    streamed.append(reply[1])
+                    if on_output:
+                        on_output(reply[1], "stdout")
+                    continue
+                return reply
+            # A runaway main() can't be stopped inside the JVM; restart it next run
+            self._kill()
+            return RUNTIME_ERROR, "".join(streamed) + f"⏱️ Java execution exceeded {timeout}s"
+
+    def shutdown(self) -> None:
+        with self._lock:
+            self._kill()
+
+
+class JavaServers:
+    """Up to ``size`` helpers; each run takes a free one, waiting if all are busy."""
+
+    def __init__(self, size: int = JAVA_HELPERS) -> None:
+        self._servers = [JavaServer() for _ in range(max(1, size))]
+        self._free: "Queue[JavaServer]" = Queue()
+        for server in self._servers:
+            self._free.put(server)
+
+    def run(self, *args, **kwargs) -> Optional[Tuple[int, str]]:
+        """``JavaServer.run`` on a free helper."""
+        server = self._free.get()
+        try:
+            return server.run(*args, **kwargs)
+        finally:
+            self._free.put(server)
+
+    def shutdown(self) -> None:
+        for server in self._servers:
+            server.shutdown()
+
+
+JAVA_SERVER = JavaServers()
@@ -0,0 +1,119 @@
+"""Per-cell resource policies and measured resource usage.
+
+A code payload may carry ``"limits"``, e.g.
+``{"memory_mb": 512, "cpu_seconds": 10, "output_bytes": 1000000, "nice": 5}``.
+The scheduler attaches the policy to the job; executors read it with
+``current_policy``, enforce it on the processes they start and report what
+the run used with ``record_usage``.
+
+A process is started through ``command``, which has ``/bin/sh`` set the
+rlimits and nice level and then exec the program, so no code of the cell
+runs without them.  Nothing of ours runs in the child between fork and
+exec, as a ``preexec_fn`` would: that is unsafe in a process with threads.
+Where limits cannot be enforced at all (Windows), runs say so in their
+output (``unenforced_note``).
+"""
+from __future__ import annotations
+
+import os
+import signal
+from dataclasses import asdict, dataclass
+from typing import Any, Dict, List, Optional
+
+from ..schema import LIMIT_FIELDS
+from .scheduler import current_job
+
+try:
+    import resource
+except ImportError:  # Windows: limits are not enforced, usage is wall time only
+    resource = None
+
+
+@dataclass(slots=True, frozen=True)
+class ResourcePolicy:
+    memory_mb: Optional[int] = None      # RLIMIT_AS
+    cpu_seconds: Optional[int] = None    # RLIMIT_CPU
+    output_bytes: Optional[int] = None   # run is stopped once it prints more
+    nice: int = 0
+
+    @classmethod
+    def from_payload(cls, payload: Dict[str, Any]) -> Optional["ResourcePolicy"]:
+        limits = payload.get("limits")
+        if not limits:
+            return None
+        return cls(**{k: limits[k] for k in LIMIT_FIELDS if k in limits})
+
+    def to_dict(self) -> Dict[str, Any]:
+        return asdict(self)
+
+    def unenforced(self) -> List[str]:
+        """The limits set in this policy that this platform cannot enforce."""
+        if resource is not None:
+            return []
+        return [name for name in ("memory_mb", "cpu_seconds", "nice") if getattr(self, name)]
+
+    def command(self, argv: List[str]) -> List[str]:
+        """``argv`` wrapped so the rlimits and nice level are set before it is exec'd."""
+        if resource is None or not (self.memory_mb or self.cpu_seconds or self.nice):
+            return list(argv)
+        steps = []
+        if self.memory_mb:
+            steps.append(f"ulimit -v {self.memory_mb * 1024}")
+        if self.cpu_seconds:
+            # SIGXCPU at the soft limit; the hard limit (SIGKILL) is a second later
+            steps.append(f"ulimit -S -t {self.cpu_seconds} && ulimit -H -t {self.cpu_seconds + 1}")
+        steps.append(f'exec nice -n {self.nice} "$@"' if self.nice else 'exec "$@"')
+        return ["/bin/sh", "-c", " && ".join(steps), "sh", *argv]
+
+
+@dataclass(slots=True)
+class ResourceUsage:
+    peak_rss_kb: int = 0
+    cpu_user_ms: float = 0.0
+    cpu_sys_ms: float = 0.0
+
+    @classmethod
+    def from_rusage(cls, ru) -> "ResourceUsage":
+        # ru_maxrss is KiB on Linux but bytes on macOS
+        rss = ru.ru_maxrss // 1024 if os.uname().sysname == "Darwin" else ru.ru_maxrss
+        return cls(int(rss), ru.ru_utime * 1000, ru.ru_stime * 1000)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return asdict(self)
+
+
+def stop_reason(returncode: Optional[int], stopped: str, timeout: float) -> str:
+    """Human-readable note on why a child process did not finish normally ("" if it did)."""
+    if stopped == "timeout":
+        return f"⏱️ Execution exceeded {timeout}s"
+    if stopped == "cancelled":
+        return "⏹ Cancelled"
+    if stopped == "output limit":
+        return "✂ Output limit reached; process stopped"
+    if returncode is not None and returncode < 0:
+        try:
+            name = signal.Signals(-returncode).name
+        except ValueError:
+            name = f"signal {-returncode}"
+        hint = {"SIGXCPU": " (CPU time limit)", "SIGKILL": " (killed; memory limit?)"}.get(name, "")
+        return f"💥 Terminated by {name}{hint}"
+    return ""
+
+
+def unenforced_note(policy: Optional[ResourcePolicy]) -> str:
+    """A line for a run's output naming the limits in ``policy`` that were not enforced."""
+    names = policy.unenforced() if policy is not None else []
+    return f"⚠ Limits not enforced on this platform: {', '.join(names)}\n" if names else ""
+
+
+def current_policy() -> Optional[ResourcePolicy]:
+    job = current_job()
+    return job.limits if job is not None else None
+
+
+def record_usage(usage: ResourceUsage) -> None:
+    """Attach measured usage to the current job (it is reported with "done")."""
+    job = current_job()
+    if job is not None:
+        job.usage = usage
+
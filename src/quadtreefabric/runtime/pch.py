@@ -0,0 +1,69 @@
+"""Precompiled prelude headers for C++ cells.
+
+A prelude header including ``CPP_PRELUDE`` is compiled once per compiler
+(path and version) and flag set into the user cache directory, and cells
+are compiled with it force-included, so the standard headers are not
+re-parsed for every cell.  A toolchain change yields a new key and hence a
+fresh build; if the build fails, cells simply compile without it.
+"""
+from __future__ import annotations
+
+import hashlib
+import os
+import subprocess
+import threading
+from pathlib import Path
+from typing import Dict, List, Sequence
+
+from .compile_cache import compiler_identity, user_cache_dir
+
+BUILD_TIMEOUT = 120  # seconds; a full prelude can take a while on a cold toolchain
+
+_lock = threading.Lock()   # guards the two dicts; each build holds only its key's lock
+_key_locks: Dict[str, threading.Lock] = {}
+_built: Dict[str, List[str]] = {}
+
+
+def _is_clang(compiler: str) -> bool:
+    return "clang" in compiler_identity(compiler).lower()
+
+
+def prelude_flags(compiler: str, flags: Sequence[str], headers: Sequence[str]) -> List[str]:
+    """Extra compiler flags that pull in the precompiled prelude (empty if unavailable)."""
+    if not headers:
+        return []
+    ident = "\0".join([compiler_identity(compiler), *flags, *headers])
+    key = hashlib.sha256(ident.encode("utf-8")).hexdigest()[:24]
+    with _lock:
+        if key in _built:
+            return _built[key]
+        key_lock = _key_locks.setdefault(key, threading.Lock())
+    # Other compilers and flag sets need not wait for this build
+    with key_lock:
+        if key not in _built:
+            _built[key] = _build(compiler, flags, headers, user_cache_dir() / "pch" / key)
+        return _built[key]
+
+
+def _build(compiler: str, flags: Sequence[str], headers: Sequence[str], out_dir: Path) -> List[str]:
+    header = out_dir / "prelude.hpp"
+    clang = _is_clang(compiler)
+    pch = out_dir / ("prelude.hpp.pch" if clang else "prelude.hpp.gch")
+    # clang includes the header the PCH was built from by itself; GCC picks
+    # up prelude.hpp.gch next to the header it is told to include
+    use = ["-include-pch", str(pch)] if clang else ["-include", str(header)]
+    if pch.exists():
+        return use
+    try:
+        out_dir.mkdir(parents=True, exist_ok=True)
+        header.write_text("".join(f"#include <{h}>\n" for h in headers), encoding="utf-8")
+        tmp = pch.with_name(f"{pch.name}.{os.getpid()}.tmp")
+        comp = subprocess.run([compiler, *flags, "-x", "c++-header", str(header), "-o", str(tmp)],
+                              text=True, capture_output=True, timeout=BUILD_TIMEOUT)
+        if comp.returncode:
+            tmp.unlink(missing_ok=True)
+            return []
+        os.replace(tmp, pch)
+    except (OSError, subprocess.SubprocessError):
+        return []
+    return use
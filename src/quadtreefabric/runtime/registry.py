@@ -1,10 +1,14 @@
+import hashlib
 import importlib
+import inspect
 import os
 import sys
 import time
 from pathlib import Path
-from typing import Callable, Dict, Tuple, Optional
+from typing import Awaitable, Callable, Dict, Tuple, Optional
 
+from .aio import ASYNC_LOOP, to_async
+from .execmeta import ExecMeta
 from .session import ExecutorSession
 
 # --- Helper function to determine the correct base path ---
@@ -19,7 +23,10 @@ def get_base_path():
         return Path(__file__).parent.parent.parent.parent
 
 # --- Original classes ---
-ExecutorFn = Callable[[str, dict | None], Tuple[bool, str]]
+# Returns an ExecMeta, or the legacy (ok, output) pair; may be an async def (see aio.py)
+ExecutorFn = Callable[[str, dict | None], ExecMeta | Tuple[bool, str]
+                      | Awaitable[ExecMeta | Tuple[bool, str]]]
+PrepareFn = Callable[[str], None]  # starts work ahead of a run, e.g. compiling; must not block
 _THROTTLE = 0.25  # seconds
 
 
@@ -28,15 +35,22 @@ class ExecutorRegistry:
 
     def __init__(self) -> None:
         self._exec: Dict[str, ExecutorFn] = {}
-        self._sessions: Dict[str, ExecutorSession] = {}
+        self._prepare: Dict[str, PrepareFn] = {}
+        self._sessions: Dict[Tuple[str, str], ExecutorSession] = {}
         self._last_tick = 0.0
+        self._versions: Dict[Tuple[str, int], str] = {}
         self._discover()
 
-    def register(self, lang: str, fn: ExecutorFn) -> None:
+    def register(self, lang: str, fn: ExecutorFn, prepare: Optional[PrepareFn] = None) -> None:
         self._exec[lang.lower()] = fn
+        if prepare is not None:
+            self._prepare[lang.lower()] = prepare
+        else:
+            self._prepare.pop(lang.lower(), None)
 
     def unregister(self, lang: str) -> None:
         self._exec.pop(lang.lower(), None)
+        self._prepare.pop(lang.lower(), None)
 
     def list_languages(self):
         return sorted(self._exec)
@@ -47,12 +61,86 @@ class ExecutorRegistry:
     def get(self, lang: str) -> Optional[ExecutorFn]:
         return self._exec.get(lang.lower())
 
-    def execute(self, code: str, lang: str) -> Tuple[bool, str]:
+    def is_async(self, lang: str) -> bool:
+        """Whether the language's executor is a coroutine function."""
+        return inspect.iscoroutinefunction(self.get(lang))
+
+    def version(self, lang: str) -> str:
+        """Identifies the executor's behaviour, for result fingerprints.
+
+        A plugin may declare ``EXECUTOR_VERSION``; otherwise this is a hash of
+        the plugin's source, so editing the plugin invalidates old results.
+        """
+        fn = self.get(lang)
+        if fn is None:
+            return ""
+        mod = sys.modules.get(getattr(fn, "__module__", ""))
+        declared = getattr(mod, "EXECUTOR_VERSION", None)
+        if declared is not None:
+            return str(declared)
+        path = getattr(mod, "__file__", None)
+        try:
+            stamp = os.stat(path).st_mtime_ns
+        except (OSError, TypeError):
+            return getattr(fn, "__qualname__", "")
+        key = (path, stamp)
+        if key not in self._versions:
+            self._versions[key] = hashlib.sha256(Path(path).read_bytes()).hexdigest()[:16]
+        return self._versions[key]
+
+    def prepare(self, code: str, lang: str) -> None:
+        """Let the executor start on ``code`` before it runs (no-op if it has no hook)."""
+        fn = self._prepare.get(lang.lower())
+        if fn is None:
+            return
+        try:
+            fn(code)
+        except Exception as e:
+            print(f"[exec] prepare failed for {lang}: {e}")
+
+    def _session(self, session: Optional[str], lang: str, fn: ExecutorFn) -> ExecutorSession:
+        key = (session or "", lang.lower())
+        sess = self._sessions.get(key)
+        if sess is None:
+            sess = self._sessions.setdefault(key, ExecutorSession(fn))
+        elif sess.is_async != inspect.iscoroutinefunction(fn):
+            # The plugin switched protocols when it was reloaded
+            sess = self._sessions[key] = ExecutorSession(fn)
+        return sess
+
+    def execute(self, code: str, lang: str, session: Optional[str] = None,
+                stateless: bool = False) -> ExecMeta:
+        """Run code in the ``(session, lang)`` session, or with no state at all.
+
+        Each session runs one call at a time; different sessions (and
+        stateless calls) run concurrently.  An async executor is run on the
+        event loop, this thread waiting for it.
+        """
+        fn = self.get(lang)
+        if not fn:
+            return ExecMeta.from_legacy((False, f"No executor for {lang}. Install a plugin."))
+        try:
+            if stateless:
+                if inspect.iscoroutinefunction(fn):
+                    return ExecMeta.from_legacy(ASYNC_LOOP.run_sync(fn(code, None)))
+                return ExecMeta.from_legacy(fn(code, None))
+            return self._session(session, lang, fn).exec(code)
+        except Exception as e:  # a broken plugin must not kill the calling thread
+            return ExecMeta.from_legacy((False, f"Executor error: {e}"))
+
+    async def execute_async(self, code: str, lang: str, session: Optional[str] = None,
+                            stateless: bool = False) -> ExecMeta:
+        """``execute`` for the event loop; plain executors run in a thread."""
         fn = self.get(lang)
         if not fn:
-            return False, f"No executor for {lang}. Install a plugin."
-        sess = self._sessions.setdefault(lang, ExecutorSession(fn))
-        return sess.exec(code)[:2]
+            return ExecMeta.from_legacy((False, f"No executor for {lang}. Install a plugin."))
+        try:
+            if stateless:
+                run = fn if inspect.iscoroutinefunction(fn) else to_async(fn)
+                return ExecMeta.from_legacy(await run(code, None))
+            return await self._session(session, lang, fn).exec_async(code)
+        except Exception as e:
+            return ExecMeta.from_legacy((False, f"Executor error: {e}"))
 
     # ---------- REVISED DISCOVERY MECHANISM ----------
     def _discover(self) -> None:
@@ -0,0 +1,185 @@
+"""Disk-backed cache of cell results, keyed by fingerprint.
+
+Every finished run is stored under its fingerprint (see
+``incremental.fingerprint``): the output as shown, stdout and stderr,
+whether it succeeded and its exit code, the run time with its phase
+breakdown and usage, and its artifacts (the output values it
+published).  Entries live in the user cache directory as one JSON file each,
+so they survive restarts: reopening a canvas can show a cell's last output
+without running it, and incremental runs reuse any successful entry.
+
+The cache is capped in size with least-recently-used eviction (reads
+refresh the file's mtime, as in ``CompileCache``) and entries may expire
+after a TTL.  Cells opt out with ``"cache": false`` in their payload.
+
+``store`` is called from the UI thread, so it only queues the entry;
+one writer thread puts it on disk and runs eviction.  Queued entries are
+visible to ``lookup`` straight away, and ``flush`` waits for the queue to
+drain (the app calls it on exit).
+"""
+from __future__ import annotations
+
+import json
+import os
+import shutil
+import threading
+import time
+from pathlib import Path
+from queue import Queue
+from typing import Any, Dict, Optional
+
+from .compile_cache import user_cache_dir
+from .constants import RESULT_CACHE_BYTES, RESULT_CACHE_TTL
+
+
+def cache_enabled(payload: Dict[str, Any]) -> bool:
+    return payload.get("cache", True) is not False
+
+
+class ResultCache:
+    """Size-capped LRU store of run results, with an optional TTL in seconds."""
+
+    def __init__(self, root: Optional[Path] = None, max_bytes: int = RESULT_CACHE_BYTES,
+                 ttl: Optional[float] = RESULT_CACHE_TTL) -> None:
+        self.root = Path(root) if root else user_cache_dir() / "results"
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._size: Optional[int] = None  # bytes on disk, counted on first store
+        self._pending: Dict[str, Dict[str, Any]] = {}  # queued for writing, by fingerprint
+        self._queue: "Queue[str]" = Queue()
+        self._writer: Optional[threading.Thread] = None
+
+    def _path(self, fp: str) -> Path:
+        return self.root / fp[:2] / f"{fp}.json"
+
+    def lookup(self, fp: Optional[str]) -> Optional[Dict[str, Any]]:
+        """The stored entry for ``fp``, or None if absent or expired."""
+        if not fp:
+            return None
+        with self._lock:
+            pending = self._pending.get(fp)
+        if pending is not None:
+            return dict(pending)
+        path = self._path(fp)
+        try:
+            entry = json.loads(path.read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            return None
+        if self.ttl is not None and time.time() - entry.get("created", 0) > self.ttl:
+            self._unlink(path)
+            return None
+        try:
+            os.utime(path)  # mark as recently used
+        except OSError:
+            pass
+        return entry
+
+    def lookup_ok(self, fp: Optional[str]) -> Optional[Dict[str, Any]]:
+        """Like ``lookup`` but only for successful runs, the ones safe to reuse."""
+        entry = self.lookup(fp)
+        return entry if entry is not None and entry.get("ok") else None
+
+    def store(self, fp: str, language: str, ok: bool, output: str, *,
+              stdout: str = "", stderr: str = "", exit_code: Optional[int] = None,
+              values: Optional[Dict[str, Any]] = None, ms: float = 0.0,
+              usage: Optional[Dict[str, Any]] = None,
+              timings: Optional[Dict[str, float]] = None) -> None:
+        """Queue a run's result for writing by the background writer."""
+        entry = {
+            "fingerprint": fp, "language": language, "ok": ok, "exit_code": exit_code,
+            "output": output, "stdout": stdout, "stderr": stderr,
+            "values": values or {}, "ms": ms, "usage": usage, "timings": timings or {},
+            "created": time.time(),
+        }
+        with self._lock:
+            self._pending[fp] = entry
+            if self._writer is None:
+                self._writer = threading.Thread(target=self._write_loop, name="result-cache-writer",
+                                                daemon=True)
+                self._writer.start()
+        self._queue.put(fp)
+
+    def flush(self) -> None:
+        """Wait until every queued entry is on disk."""
+        self._queue.join()
+
+    def _write_loop(self) -> None:
+        while True:
+            fp = self._queue.get()
+            try:
+                with self._lock:
+                    entry = self._pending.get(fp)
+                if entry is not None:
+                    self._write(fp, entry)
+                    with self._lock:
+                        if self._pending.get(fp) is entry:
+                            del self._pending[fp]
+            finally:
+                self._queue.task_done()
+
+    def _write(self, fp: str, entry: Dict[str, Any]) -> None:
+        data = json.dumps(entry, ensure_ascii=False, default=str).encode("utf-8")
+        path = self._path(fp)
+        try:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            old = path.stat().st_size if path.exists() else 0
+            tmp = path.with_name(f"{path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+            tmp.write_bytes(data)
+            os.replace(tmp, path)  # atomic, so readers never see a partial entry
+        except OSError:
+            return  # caching is best effort
+        with self._lock:
+            if self._size is not None:
+                self._size += len(data) - old
+        if self._size is None or self._size > self.max_bytes:
+            self.evict()
+
+    def _unlink(self, path: Path) -> int:
+        try:
+            size = path.stat().st_size
+            path.unlink()
+        except OSError:
+            return 0
+        with self._lock:
+            if self._size is not None:
+                self._size -= size
+        return size
+
+    def evict(self) -> int:
+        """Drop expired entries, then the least recently used until under ``max_bytes``."""
+        now = time.time()
+        entries = []
+        total = 0
+        for f in self.root.glob("*/*.json"):
+            try:
+                st = f.stat()
+            except OSError:
+                continue
+            entries.append((st.st_mtime, st.st_size, f))
+            total += st.st_size
+        freed = 0
+        for mtime, size, f in sorted(entries):
+            # mtime is at least the creation time, so an entry untouched for
+            # longer than the TTL has certainly expired
+            expired = self.ttl is not None and now - mtime > self.ttl
+            if not expired and total - freed <= self.max_bytes:
+                break
+            try:
+                f.unlink()
+            except OSError:
+                continue
+            freed += size
+        with self._lock:
+            self._size = total - freed
+        return freed
+
+    def clear(self) -> None:
+        with self._lock:
+            self._pending.clear()
+        shutil.rmtree(self.root, ignore_errors=True)
+        with self._lock:
+            self._size = 0
+
+
+RESULT_CACHE = ResultCache()
@@ -0,0 +1,351 @@
+"""Dataflow execution of code cells.
+
+Code payloads may declare ``"inputs"`` and ``"outputs"`` (lists of names).
+A cell that lists a name in its outputs produces that value; every cell
+that lists it in its inputs depends on the producer.  An input may also be
+a cell reference ``"depth:index"`` (in the same context): the cell depends
+on that cell and receives every value it produced.  ``GraphRun`` builds
+the DAG, submits each cell to the scheduler once its producers have
+succeeded (independent branches run in parallel), skips the descendants
+of cells that fail, and reports per-cell timings and the critical path.
+Producers left out of a run (running a selection) contribute the values
+stored from their last successful run instead.
+
+Values travel between cells as JSON, whatever the language:
+
+* a cell publishes an output by printing a line ``::output name=<json>``;
+  Python cells just assign the variable, the epilogue prints it for them;
+* inputs arrive as environment variables ``QTF_INPUT_<name>`` (the name
+  as declared, case included) holding JSON; Python cells get them as
+  ready-made variables instead.
+
+Declarations can also be written in the code itself, in a comment such as
+``# @inputs: a, b`` or ``// @outputs: total`` (see ``parse_declarations``).
+"""
+from __future__ import annotations
+
+import json
+import re
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+from .incremental import fingerprint, reuse
+from .scheduler import DONE, Cell, ExecutionScheduler, Job
+
+OUTPUT_PREFIX = "::output "
+ENV_PREFIX = "QTF_INPUT_"
+
+_DECL = re.compile(r"@(inputs|outputs)[ \t]*:?[ \t]*([\w:][\w: \t,]*)")  # one line only
+_CELL_REF = re.compile(r"\d+:\d+")
+
+# Node states
+PENDING = "pending"
+RUNNING = "running"
+SUCCEEDED = "ok"
+FAILED = "failed"
+SKIPPED = "skipped"
+
+
+def is_cell_ref(name: str) -> bool:
+    """Whether an input names a cell (``"depth:index"``) rather than a value."""
+    return _CELL_REF.fullmatch(name) is not None
+
+
+def ref_cell(cell: Cell, ref: str) -> Cell:
+    """The cell that ``ref`` points to, in the context of ``cell``."""
+    d, idx = ref.split(":")
+    return cell[0], int(d), int(idx)
+
+
+def parse_declarations(code: str) -> Tuple[List[str], List[str]]:
+    """Names declared with ``@inputs`` / ``@outputs`` annotations in ``code``."""
+    found: Dict[str, List[str]] = {"inputs": [], "outputs": []}
+    for kind, names in _DECL.findall(code):
+        for name in re.split(r"[\s,]+", names.strip()):
+            valid = name.isidentifier() or (kind == "inputs" and is_cell_ref(name))
+            if valid and name not in found[kind]:
+                found[kind].append(name)
+    return found["inputs"], found["outputs"]
+
+
+def parse_outputs(text: str) -> Tuple[Dict[str, Any], str]:
+    """Split ``::output`` lines out of a run's output; return (values, remaining text).
+
+    Lines whose name is not an identifier, or whose value is not JSON, are
+    left in the text: such a name could not be bound in a consuming cell.
+    """
+    values: Dict[str, Any] = {}
+    kept = []
+    for line in text.splitlines(keepends=True):
+        if line.startswith(OUTPUT_PREFIX):
+            name, _, raw = line[len(OUTPUT_PREFIX):].rstrip("\r\n").partition("=")
+            name = name.strip()
+            if name.isidentifier():
+                try:
+                    values[name] = json.loads(raw)
+                    continue
+                except ValueError:
+                    pass
+        kept.append(line)
+    return values, "".join(kept)
+
+
+def bind(language: str, code: str, inputs: Dict[str, Any],
+         outputs: List[str]) -> Tuple[str, Dict[str, str]]:
+    """Return the code to run and the environment carrying ``inputs``."""
+    env = {ENV_PREFIX + name: json.dumps(value) for name, value in inputs.items()}
+    if language.lower() != "python":
+        return code, env
+    prelude = "".join(f"{name} = __import__('json').loads({json.dumps(value)!r})\n"
+                      for name, value in inputs.items())
+    epilogue = "".join(
+        f"\nprint({OUTPUT_PREFIX + name + '='!r} + __import__('json').dumps({name}))"
+        for name in outputs)
+    return prelude + code + epilogue, env
+
+
+@dataclass(eq=False)
+class GraphNode:
+    cell: Cell
+    code: str
+    language: str
+    inputs: List[str] = field(default_factory=list)
+    outputs: List[str] = field(default_factory=list)
+    options: Dict[str, Any] = field(default_factory=dict)  # scheduler submit options
+    scope: Dict[str, Any] = field(default_factory=dict)    # see incremental.fingerprint
+    version: str = ""                    # executor version, for the fingerprint
+    previous: Optional[Dict[str, Any]] = None  # last successful result (incremental.stored_result)
+    cache: bool = True                   # False: never reuse a stored result
+    state: str = PENDING
+    job: Optional[Job] = None
+    error: str = ""
+    values: Dict[str, Any] = field(default_factory=dict)  # what the run produced
+
+    @property
+    def label(self) -> str:
+        ctx, d, idx = self.cell
+        return f"{d}:{idx}"
+
+    @property
+    def ms(self) -> float:
+        return self.job.ms if self.job is not None else 0.0
+
+
+def build_graph(nodes: List[GraphNode],
+                stored: Optional[Dict[Cell, Dict[str, Any]]] = None) -> Dict[Cell, Set[Cell]]:
+    """Map each cell to the cells it depends on; raise ValueError on a bad graph.
+
+    ``stored`` holds the output values of cells outside the run; inputs they
+    provide are satisfied without a dependency.
+    """
+    stored = stored or {}
+    stored_names = {name for values in stored.values() for name in values}
+    producers: Dict[str, Cell] = {}
+    for node in nodes:
+        for name in node.outputs:
+            if name in producers:
+                raise ValueError(f"{name!r} is produced by both {producers[name]} and {node.cell}")
+            producers[name] = node.cell
+    cells = {node.cell for node in nodes}
+    deps: Dict[Cell, Set[Cell]] = {}
+    for node in nodes:
+        deps[node.cell] = set()
+        for name in node.inputs:
+            if is_cell_ref(name):
+                producer = ref_cell(node.cell, name)
+                if producer not in cells and producer not in stored:
+                    raise ValueError(f"input {name!r} of {node.cell} is not in this run "
+                                     f"and has no stored result")
+            elif name in producers:
+                producer = producers[name]
+            elif name in stored_names:
+                continue
+            else:
+                raise ValueError(f"input {name!r} of {node.cell} is not produced by any cell")
+            if producer in cells and producer != node.cell:
+                deps[node.cell].add(producer)
+    topo_order(deps)  # reject cycles up front
+    return deps
+
+
+def topo_order(deps: Dict[Cell, Set[Cell]]) -> List[Cell]:
+    """Kahn's algorithm; raises ValueError naming the cells on a cycle."""
+    remaining = {cell: set(d) for cell, d in deps.items()}
+    order = []
+    ready = sorted(cell for cell, d in remaining.items() if not d)
+    while ready:
+        cell = ready.pop()
+        order.append(cell)
+        del remaining[cell]
+        for other, d in remaining.items():
+            if cell in d:
+                d.discard(cell)
+                if not d:
+                    ready.append(other)
+    if remaining:
+        raise ValueError(f"dependency cycle among {sorted(remaining)}")
+    return order
+
+
+def critical_path(deps: Dict[Cell, Set[Cell]], ms: Dict[Cell, float]) -> Tuple[float, List[Cell]]:
+    """Longest chain of dependent cells by run time: (total ms, cells in order)."""
+    best: Dict[Cell, Tuple[float, Optional[Cell]]] = {}
+    for cell in topo_order(deps):
+        prev = max(deps[cell], key=lambda c: best[c][0], default=None)
+        best[cell] = ((best[prev][0] if prev else 0.0) + ms.get(cell, 0.0), prev)
+    if not best:
+        return 0.0, []
+    end = max(best, key=lambda c: best[c][0])
+    path = []
+    cell: Optional[Cell] = end
+    while cell is not None:
+        path.append(cell)
+        cell = best[cell][1]
+    return best[end][0], path[::-1]
+
+
+class GraphRun:
+    """One execution of a run-graph on an ``ExecutionScheduler``.
+
+    Its jobs form one scheduler batch, so progress and cancellation work as
+    for any batch.  When the last cell settles a ``"graph"`` event with the
+    timing report is posted on the scheduler's event queue.
+    """
+
+    def __init__(self, scheduler: ExecutionScheduler, nodes: List[GraphNode],
+                 incremental: bool = False,
+                 stored: Optional[Dict[Cell, Dict[str, Any]]] = None) -> None:
+        self.scheduler = scheduler
+        self.incremental = incremental
+        self.nodes = {node.cell: node for node in nodes}
+        self.stored = stored or {}   # output values of producers outside the run
+        self.deps = build_graph(nodes, self.stored)
+        self.dependents: Dict[Cell, Set[Cell]] = {cell: set() for cell in self.deps}
+        for cell, d in self.deps.items():
+            for dep in d:
+                self.dependents[dep].add(cell)
+        # Stored values first, so values produced by this run replace them
+        self.values: Dict[str, Any] = {name: value for values in self.stored.values()
+                                       for name, value in values.items()}
+        self.batch: Optional[int] = None
+        self.started = 0.0
+        self.wall_ms = 0.0
+        self._lock = threading.Lock()
+
+    def start(self) -> int:
+        self.started = time.perf_counter()
+        self.batch = self.scheduler.open_batch(len(self.nodes))
+        with self._lock:
+            ready = [n for n in self.nodes.values() if not self.deps[n.cell]]
+        self._launch(ready)
+        return self.batch
+
+    def _launch(self, ready: List[GraphNode]) -> None:
+        """Submit ``ready`` and, in turn, whatever reused results make ready.
+
+        A loop rather than recursion, so a long chain of cached cells
+        settles in constant stack depth.
+        """
+        queue = deque(ready)
+        while queue:
+            queue.extend(self._submit(queue.popleft()))
+
+    def _submit(self, node: GraphNode) -> List[GraphNode]:
+        """Run ``node``, or settle it from a stored result; return the nodes that became ready."""
+        with self._lock:
+            if node.state != PENDING:
+                return []
+            node.state = RUNNING
+            inputs = self._inputs(node)
+        fp = fingerprint(node.language, node.code, node.version, inputs, node.scope)
+        prev = reuse(fp, node.previous) if self.incremental and node.cache else None
+        if prev is not None:
+            # Unchanged code and inputs: reuse the stored result
+            node.job = self.scheduler.complete(node.code, node.language, node.cell, self.batch,
+                                               output=prev["output"], fingerprint=fp)
+            return self._settle(node, True, dict(prev["values"]))
+        code, env = bind(node.language, node.code, inputs, node.outputs)
+        node.job = self.scheduler.submit(code, node.language, node.cell, self.batch,
+                                         env=env, fingerprint=fp, **node.options)
+        node.job.future.add_done_callback(lambda _f, node=node: self._settled(node))
+        return []
+
+    def _inputs(self, node: GraphNode) -> Dict[str, Any]:
+        inputs: Dict[str, Any] = {}
+        for name in node.inputs:
+            if is_cell_ref(name):
+                producer = ref_cell(node.cell, name)
+                if producer in self.nodes:
+                    inputs.update(self.nodes[producer].values)
+                else:
+                    inputs.update(self.stored[producer])
+            else:
+                inputs[name] = self.values[name]
+        return inputs
+
+    def _settled(self, node: GraphNode) -> None:
+        job = node.job
+        ok = job.state == DONE and bool(job.ok)
+        self._launch(self._settle(node, ok, parse_outputs(job.output)[0] if ok else {}))
+
+    def _settle(self, node: GraphNode, ok: bool, values: Dict[str, Any]) -> List[GraphNode]:
+        """Record ``node``'s result; return the dependents it made ready to run."""
+        missing = [name for name in node.outputs if name not in values]
+        ready = []
+        with self._lock:
+            if ok and missing:
+                ok = False
+                node.error = f"missing output(s) {', '.join(missing)}"
+            node.state = SUCCEEDED if ok else FAILED
+            if ok:
+                node.values = values
+                self.values.update(values)
+                for cell in self.dependents[node.cell]:
+                    if all(self.nodes[dep].state == SUCCEEDED for dep in self.deps[cell]):
+                        ready.append(self.nodes[cell])
+            else:
+                skipped = self._skip_descendants(node.cell)
+        if not ok:
+            for other in skipped:
+                other.job = self.scheduler.skip(other.code, other.language, other.cell, self.batch,
+                                                reason=f"upstream {node.label} failed")
+        self._maybe_finish()
+        return ready
+
+    def _skip_descendants(self, cell: Cell) -> List[GraphNode]:
+        skipped, stack = [], list(self.dependents[cell])
+        while stack:
+            node = self.nodes[stack.pop()]
+            if node.state == PENDING:
+                node.state = SKIPPED
+                skipped.append(node)
+                stack.extend(self.dependents[node.cell])
+        return skipped
+
+    def _maybe_finish(self) -> None:
+        with self._lock:
+            if any(n.state in (PENDING, RUNNING) for n in self.nodes.values()) or self.wall_ms:
+                return
+            self.wall_ms = (time.perf_counter() - self.started) * 1000
+        self.scheduler.notify("graph", batch=self.batch, report=self.report())
+
+    def report(self) -> str:
+        ran = {cell: n.ms for cell, n in self.nodes.items() if n.state in (SUCCEEDED, FAILED)}
+        total, path = critical_path(self.deps, ran)
+        busy = sum(ran.values())
+        lines = [
+            f"Run graph: {len(self.nodes)} cell(s) in {self.wall_ms:.0f} ms wall, "
+            f"{busy:.0f} ms cell time ({busy / max(self.wall_ms, 1e-9):.1f}x parallel)",
+            f"Critical path {total:.0f} ms: "
+            + " → ".join(f"{self.nodes[c].label} ({ran.get(c, 0):.0f})" for c in path),
+        ]
+        marks = {SUCCEEDED: "✓", FAILED: "✗", SKIPPED: "↷"}
+        for cell in topo_order(self.deps):
+            node = self.nodes[cell]
+            note = "cached" if node.job is not None and node.job.cached else node.error
+            lines.append(f"  {marks.get(node.state, '?')} {node.label:<8} {node.language:<7} "
+                         f"{node.ms:8.0f} ms {note}".rstrip())
+        return "\n".join(lines)
@@ -0,0 +1,324 @@
+"""Non-blocking execution of code cells.
+
+The UI submits jobs and gets a handle back immediately; jobs run on a
+thread pool, or as tasks on the event loop for async executors (see
+runtime/aio.py), and report their lifecycle as status events (see the
+README's "Status event" contract) on ``ExecutionScheduler.events``, which
+the UI drains once per frame with ``poll``.
+"""
+from __future__ import annotations
+
+import asyncio
+import itertools
+import os
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from queue import Empty, Queue
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+Cell = Tuple[str, int, int]  # (context id, depth, index)
+
+# Job states
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+CANCELLED = "cancelled"
+
+_CURRENT_JOB: ContextVar[Optional["Job"]] = ContextVar("current_job", default=None)
+
+
+def current_job() -> Optional["Job"]:
+    """The job being executed on this thread, if any.
+
+    Executors use it to notice cancellation without changing their signature.
+    """
+    return _CURRENT_JOB.get()
+
+
+@dataclass(eq=False)
+class Job:
+    """Handle for one submitted run."""
+    id: int
+    code: str
+    language: str
+    cell: Optional[Cell] = None
+    batch: Optional[int] = None
+    session: Optional[str] = None   # executor session; jobs in one session run in turn
+    stateless: bool = False         # run without session state, concurrently with anything
+    limits: Optional[Any] = None    # ResourcePolicy for the processes the run starts
+    usage: Optional[Any] = None     # ResourceUsage reported by the executor
+    env: Optional[Dict[str, str]] = None  # extra environment for processes the run starts
+    isolation: Optional[str] = None       # "session" or "fork", for executors that offer both
+    fingerprint: Optional[str] = None     # see runtime/incremental.py
+    cached: bool = False                  # result reused from an earlier run
+    streamed: Dict[str, List[str]] = field(default_factory=dict)  # chunks per stream, as emitted
+    timings: Dict[str, float] = field(default_factory=dict)  # ms per phase, see runtime/execmeta.py
+    meta: Optional[Any] = None      # the executor's ExecMeta
+    state: str = QUEUED
+    ok: Optional[bool] = None
+    output: str = ""
+    ms: float = 0.0
+    submitted: float = field(default_factory=time.perf_counter)
+    cancel_event: threading.Event = field(default_factory=threading.Event)
+    future: Optional[Future] = None
+    # Receives (text, stream) chunks while the job runs; see runtime/stream.py
+    sink: Optional[Callable[[str, str], None]] = field(default=None, repr=False)
+
+    @property
+    def cancelled(self) -> bool:
+        return self.cancel_event.is_set()
+
+    @property
+    def label(self) -> str:
+        if self.cell:
+            ctx, d, idx = self.cell
+            return f"{ctx}/{d}:{idx}"
+        return f"job{self.id}"
+
+
+@dataclass
+class _Batch:
+    total: int
+    done: int = 0
+
+
+class ExecutionScheduler:
+    """Runs jobs off the UI thread and streams their status events."""
+
+    def __init__(self, registry, max_workers: Optional[int] = None) -> None:
+        self.registry = registry
+        self.events: "Queue[Dict[str, Any]]" = Queue()
+        self._pool = ThreadPoolExecutor(
+            max_workers or min(32, (os.cpu_count() or 1) + 4),
+            thread_name_prefix="exec",
+        )
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+        self._jobs: Dict[int, Job] = {}
+        self._batches: Dict[int, _Batch] = {}
+        self._instance = os.urandom(8).hex()  # session tokens never repeat across app runs
+        self._generations: Dict[Tuple[str, str], int] = {}
+
+    # --- submission ---------------------------------------------------------
+    def submit(self, code: str, language: str, cell: Optional[Cell] = None,
+               batch: Optional[int] = None, session: Optional[str] = None,
+               stateless: bool = False, limits: Optional[Any] = None,
+               env: Optional[Dict[str, str]] = None, fingerprint: Optional[str] = None,
+               isolation: Optional[str] = None) -> Job:
+        job = Job(id=next(self._ids), code=code, language=language, cell=cell, batch=batch,
+                  session=session, stateless=stateless, limits=limits, env=env or None,
+                  fingerprint=fingerprint, isolation=isolation)
+        with self._lock:
+            self._jobs[job.id] = job
+        self._emit("queued", job)
+        # e.g. compiled languages start building now, while the job may still wait
+        self.registry.prepare(code, language)
+        if self.registry.is_async(language):
+            from .aio import ASYNC_LOOP  # imports this module
+            job.future = ASYNC_LOOP.submit(self._run_async(job))
+        else:
+            job.future = self._pool.submit(self._run, job)
+        return job
+
+    def submit_batch(self, items: List[Tuple]) -> Tuple[int, List[Job]]:
+        """Submit items as one batch; return its id and jobs.
+
+        Items are ``(code, language, cell)``, optionally followed by a dict of
+        ``submit`` keyword options (``session``, ``stateless``, ``limits``,
+        ``isolation``).
+        """
+        batch_id = self.open_batch(len(items))
+        jobs = [self.submit(code, lang, cell, batch_id, **(opts[0] if opts else {}))
+                for code, lang, cell, *opts in items]
+        return batch_id, jobs
+
+    def open_batch(self, total: int) -> int:
+        """Start a batch of ``total`` jobs that will be submitted (or skipped) later."""
+        batch_id = next(self._ids)
+        with self._lock:
+            self._batches[batch_id] = _Batch(total=total)
+        return batch_id
+
+    def skip(self, code: str, language: str, cell: Optional[Cell] = None,
+             batch: Optional[int] = None, reason: str = "") -> Job:
+        """Record a job that will not run (it counts towards its batch as cancelled)."""
+        job = Job(id=next(self._ids), code=code, language=language, cell=cell, batch=batch)
+        job.cancel_event.set()
+        with self._lock:
+            self._jobs[job.id] = job
+        self._finish(job, CANCELLED, reason=reason)
+        return job
+
+    def complete(self, code: str, language: str, cell: Optional[Cell] = None,
+                 batch: Optional[int] = None, output: str = "",
+                 fingerprint: Optional[str] = None) -> Job:
+        """Record a successful job without running it, reusing an earlier result."""
+        job = Job(id=next(self._ids), code=code, language=language, cell=cell, batch=batch,
+                  ok=True, output=output, fingerprint=fingerprint, cached=True)
+        with self._lock:
+            self._jobs[job.id] = job
+        self._finish(job, DONE)
+        return job
+
+    def notify(self, kind: str, batch: Optional[int] = None, **extra: Any) -> None:
+        """Post an event that is not about a single job, e.g. a batch report."""
+        event = {"type": kind, "job": None, "cell": None, "lang": None, "batch": batch,
+                 "ts": time.time()}
+        event.update(extra)
+        self.events.put(event)
+
+    # --- cancellation -------------------------------------------------------
+    def cancel(self, job: Job) -> bool:
+        """Cancel a queued or running job; return False if it already finished.
+
+        A running job sees ``cancelled``, stops its process and reports
+        itself.  The future is only cancelled while the job is queued: an
+        event-loop future stays pending while its coroutine runs, so
+        cancelling it then would report the job before its process is gone.
+        """
+        if job.state in (DONE, CANCELLED):
+            return False
+        job.cancel_event.set()
+        if job.state != RUNNING and job.future is not None and job.future.cancel():
+            # Never started: report it here since _run will not
+            self._finish(job, CANCELLED)
+        return True
+
+    def cancel_batch(self, batch_id: int) -> int:
+        return sum(self.cancel(j) for j in self.jobs() if j.batch == batch_id)
+
+    def cancel_all(self) -> int:
+        return sum(self.cancel(j) for j in self.jobs())
+
+    # --- queries ------------------------------------------------------------
+    def jobs(self) -> List[Job]:
+        with self._lock:
+            return list(self._jobs.values())
+
+    def job_for_cell(self, cell: Cell) -> Optional[Job]:
+        for job in self.jobs():
+            if job.cell == cell:
+                return job
+        return None
+
+    def session_token(self, session: Optional[str], language: str) -> str:
+        """Identity of the live executor session ``session`` for ``language``.
+
+        It changes whenever the session may have lost or half-applied state,
+        i.e. after a run in it failed or was cancelled, and between app runs.
+        """
+        key = (session or "", language.lower())
+        with self._lock:
+            return f"{self._instance}:{key[1]}:{key[0]}:{self._generations.get(key, 0)}"
+
+    def busy(self) -> bool:
+        with self._lock:
+            return bool(self._jobs)
+
+    def poll(self, limit: int = 1000) -> List[Dict[str, Any]]:
+        """Drain pending status events without blocking."""
+        out = []
+        for _ in range(limit):
+            try:
+                out.append(self.events.get_nowait())
+            except Empty:
+                break
+        return out
+
+    def shutdown(self) -> None:
+        self.cancel_all()
+        self._pool.shutdown(wait=False, cancel_futures=True)
+
+    # --- internals ----------------------------------------------------------
+    def _emit(self, kind: str, job: Job, **extra: Any) -> None:
+        event = {"type": kind, "job": job.id, "cell": job.cell, "lang": job.language,
+                 "batch": job.batch, "ts": time.time()}
+        event.update(extra)
+        self.events.put(event)
+
+    def _stream(self, job: Job, text: str, stream: str) -> None:
+        job.streamed.setdefault(stream, []).append(text)
+        self._emit("output", job, text=text, stream=stream)
+
+    def _start(self, job: Job) -> Optional[float]:
+        """Mark ``job`` running; return its start time, or None if it was cancelled."""
+        if job.cancelled:
+            self._finish(job, CANCELLED)
+            return None
+        job.state = RUNNING
+        job.sink = lambda text, stream: self._stream(job, text, stream)
+        self._emit("start", job)
+        start = time.perf_counter()
+        job.timings["queue"] = (start - job.submitted) * 1000
+        return start
+
+    def _run(self, job: Job) -> None:
+        start = self._start(job)
+        if start is None:
+            return
+        token = _CURRENT_JOB.set(job)
+        try:
+            meta = self.registry.execute(job.code, job.language, job.session, job.stateless)
+        finally:
+            _CURRENT_JOB.reset(token)
+        self._done(job, meta, start)
+
+    async def _run_async(self, job: Job) -> None:
+        start = self._start(job)
+        if start is None:
+            return
+        _CURRENT_JOB.set(job)  # tasks run in a context of their own
+        try:
+            meta = await self.registry.execute_async(job.code, job.language, job.session,
+                                                     job.stateless)
+        except asyncio.CancelledError:
+            self._finish(job, CANCELLED)
+            raise
+        self._done(job, meta, start)
+
+    def _done(self, job: Job, meta, start: float) -> None:
+        job.ms = (time.perf_counter() - start) * 1000
+        if job.cancelled:
+            self._finish(job, CANCELLED)
+            return
+        queued = (start - job.submitted) * 1000
+        timings = {**job.timings, **meta.timings}
+        if "run" not in timings:
+            # Executor time not attributed to any other phase was spent running
+            other = sum(v for k, v in timings.items() if k != "queue") + timings["queue"] - queued
+            timings["run"] = max(0.0, job.ms - other)
+        meta.timings = timings
+        if meta.peak_rss_kb is None and job.usage is not None:
+            meta.peak_rss_kb = job.usage.peak_rss_kb
+        job.meta, job.ok, job.output = meta, meta.ok, meta.output
+        self._finish(job, DONE)
+
+    def _finish(self, job: Job, state: str, **extra: Any) -> None:
+        # Emit under the lock so a batch's final "progress" event is always
+        # queued after every job's own "done"/"cancelled" event.
+        with self._lock:
+            if self._jobs.pop(job.id, None) is None:
+                return  # already finished
+            if job.state == RUNNING and not job.stateless and not (state == DONE and job.ok):
+                key = (job.session or "", job.language.lower())
+                self._generations[key] = self._generations.get(key, 0) + 1
+            job.state = state
+            if state == DONE:
+                self._emit("done", job, ok=job.ok, ms=job.ms, output=job.output,
+                           usage=job.usage.to_dict() if job.usage else None,
+                           fingerprint=job.fingerprint, cached=job.cached,
+                           stdout=job.meta.stdout if job.meta else "",
+                           stderr=job.meta.stderr if job.meta else "",
+                           exit_code=job.meta.exit_code if job.meta else None,
+                           timings=job.meta.timings if job.meta else {})
+            else:
+                self._emit("cancelled", job, **extra)
+            batch = self._batches.get(job.batch) if job.batch is not None else None
+            if batch is not None:
+                batch.done += 1
+                if batch.done >= batch.total:
+                    del self._batches[job.batch]
+                self._emit("progress", job, done=batch.done, total=batch.total)
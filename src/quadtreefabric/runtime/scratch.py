@@ -0,0 +1,111 @@
+"""Reusable scratch directories for compiles and runs.
+
+Creating and removing a temporary directory per run is slow on
+network-backed home directories and under on-access scanners, so
+executors lease a directory from ``SCRATCH`` instead.  Directories are
+kept per language and handed to one run at a time; when a lease ends the
+directory is emptied (never removed) and goes back to the pool, so the
+next run starts from an empty directory without creating one.
+
+The pool lives on ``/dev/shm`` when it is a tmpfs that allows executing
+binaries, else in the system temporary directory, in one private
+directory per app instance (see ``tempdirs``), made on first use and
+removed when the app exits.  Making it also sweeps away the pools of
+instances that died without cleaning up.
+"""
+from __future__ import annotations
+
+import contextlib
+import itertools
+import os
+import shutil
+import tempfile
+import threading
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional
+
+from .constants import SCRATCH_DIRS
+from .tempdirs import private_dir, sweep_stale
+
+
+def _default_base() -> Path:
+    shm = Path("/dev/shm")
+    try:
+        if shm.is_dir() and not os.statvfs(shm).f_flag & getattr(os, "ST_NOEXEC", 0):
+            return shm
+    except OSError:
+        pass
+    return Path(tempfile.gettempdir())
+
+
+def _empty(path: Path) -> bool:
+    """Remove everything inside ``path``; False if something could not be removed."""
+    try:
+        with os.scandir(path) as entries:
+            for entry in entries:
+                if entry.is_dir(follow_symlinks=False):
+                    shutil.rmtree(entry.path)
+                else:
+                    os.unlink(entry.path)
+    except OSError:
+        return False
+    return True
+
+
+class ScratchPool:
+    """Per-language pools of empty directories, each leased to one run at a time."""
+
+    def __init__(self, root: Optional[Path] = None, keep: int = SCRATCH_DIRS) -> None:
+        self._root = Path(root) if root else None
+        self.keep = keep  # idle directories kept per language
+        self._lock = threading.Lock()
+        self._idle: Dict[str, List[Path]] = {}
+        self._ids = itertools.count()
+
+    @property
+    def root(self) -> Path:
+        with self._lock:
+            if self._root is None:
+                base = _default_base()
+                sweep_stale([base])
+                self._root = private_dir("scratch", base)
+            return self._root
+
+    @contextlib.contextmanager
+    def lease(self, language: str) -> Iterator[Path]:
+        """An empty directory for the block's exclusive use."""
+        path = self._take(language)
+        try:
+            yield path
+        finally:
+            self._give_back(language, path)
+
+    def _take(self, language: str) -> Path:
+        root = self.root
+        with self._lock:
+            idle = self._idle.get(language)
+            if idle:
+                return idle.pop()
+            path = root / language / str(next(self._ids))
+        path.mkdir(mode=0o700, parents=True)
+        return path
+
+    def _give_back(self, language: str, path: Path) -> None:
+        if _empty(path):
+            with self._lock:
+                idle = self._idle.setdefault(language, [])
+                if len(idle) < self.keep:
+                    idle.append(path)
+                    return
+        # Over the limit, or something the run left behind could not be removed
+        shutil.rmtree(path, ignore_errors=True)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._idle.clear()
+            root, self._root = self._root, None
+        if root is not None:
+            shutil.rmtree(root, ignore_errors=True)
+
+
+SCRATCH = ScratchPool()
@@ -1,21 +1,46 @@
 from __future__ import annotations
 
+import asyncio
+import inspect
 import threading
-import time
-from typing import Callable, Tuple
+from typing import Awaitable, Callable, Optional, Tuple
+
+from .aio import ASYNC_LOOP
+from .execmeta import ExecMeta, timed
 
 
 class ExecutorSession:
     """Stateful wrapper around a stateless executor function."""
 
-    def __init__(self, fn: Callable[[str, dict | None], Tuple[bool, str]]):
+    def __init__(self, fn: Callable[[str, dict | None], ExecMeta | Tuple[bool, str]
+                                    | Awaitable[ExecMeta | Tuple[bool, str]]]):
         self.fn = fn
         self.globals: dict = {}
+        self.is_async = inspect.iscoroutinefunction(fn)
         self._lock = threading.RLock()
+        self._async_lock: Optional[asyncio.Lock] = None  # created on the event loop
+
+    def exec(self, code: str) -> ExecMeta:
+        """Run ``code`` with the session's globals, one call at a time."""
+        if self.is_async:
+            return ASYNC_LOOP.run_sync(self.exec_async(code))
+        with timed("queue"):  # waiting for the session's previous run
+            self._lock.acquire()
+        try:
+            return ExecMeta.from_legacy(self.fn(code, self.globals))
+        finally:
+            self._lock.release()
 
-    def exec(self, code: str) -> Tuple[bool, str, float]:
-        start = time.perf_counter()
-        with self._lock:
-            ok, out = self.fn(code, self.globals)
-        return ok, out, time.perf_counter() - start
 
+    async def exec_async(self, code: str) -> ExecMeta:
+        """``exec`` for the event loop; a plain executor runs in a thread."""
+        if not self.is_async:
+            return await asyncio.to_thread(self.exec, code)
+        if self._async_lock is None:
+            self._async_lock = asyncio.Lock()
+        with timed("queue"):
+            await self._async_lock.acquire()
+        try:
+            return ExecMeta.from_legacy(await self.fn(code, self.globals))
+        finally:
+            self._async_lock.release()
@@ -0,0 +1,254 @@
+"""Live output from running cells.
+
+Executors call ``emit_output`` with chunks of stdout/stderr as they arrive;
+the scheduler turns them into "output" status events for the job running
+on the calling thread, and the UI appends them to an ``OutputBuffer``.
+
+An executor that streams still returns the full text from its run: the
+streamed output, optionally followed by a trailer such as an error or
+timeout note.  The UI uses that to show whatever was not streamed.
+"""
+from __future__ import annotations
+
+import codecs
+import os
+import subprocess
+import threading
+import time
+from collections import deque
+from typing import Callable, Deque, List, NamedTuple, Optional
+
+from .execmeta import record_timing
+from .limits import ResourcePolicy, ResourceUsage, current_policy, record_usage, unenforced_note
+from .scheduler import current_job
+
+CHUNK = 4096          # bytes read per pipe read
+_POLL = 0.05
+
+
+def emit_output(text: str, stream: str = "stdout", job=None) -> None:
+    """Forward a chunk of output from ``job`` (default: the current job) to the UI.
+
+    A no-op outside a job.  Threads other than the one running the job must
+    pass it explicitly, since ``current_job`` does not carry over to them.
+    """
+    job = job or current_job()
+    if text and job is not None and job.sink is not None:
+        job.sink(text, stream)
+
+
+class StreamedRun(NamedTuple):
+    returncode: Optional[int]   # None if the process was killed (see ``stopped``)
+    stdout: str
+    stderr: str
+    output: str                 # stdout and stderr interleaved as they arrived
+    stopped: str = ""           # why it was killed: "timeout", "cancelled" or "output limit"
+    usage: Optional[ResourceUsage] = None
+
+
+class RunCapture:
+    """Output of one process run, shared by ``run_streaming`` and ``aio.run_process``.
+
+    Each stream has its own incremental UTF-8 decoder, so a character split
+    across two reads is not mangled.  Chunks count against the policy's
+    ``output_bytes``; the chunk that crosses it is cut short and the run is
+    then stopped with ``stop_check``.  Limits the platform cannot enforce
+    are noted on stderr up front.
+    """
+
+    def __init__(self, policy: Optional[ResourcePolicy], on_output: Callable[[str, str], None]) -> None:
+        self.captured = {"stdout": [], "stderr": []}
+        self.combined: List[str] = []
+        self.budget = policy.output_bytes if policy and policy.output_bytes else None
+        self.over_limit = False
+        self._decoders = {name: codecs.getincrementaldecoder("utf-8")(errors="replace")
+                          for name in self.captured}
+        self._on_output = on_output
+        self._lock = threading.Lock()  # the pumps of both streams feed concurrently
+        self._emit("stderr", unenforced_note(policy))
+
+    def feed(self, name: str, chunk: bytes) -> bool:
+        """Take a chunk read from stream ``name``; False once the output budget is spent."""
+        with self._lock:
+            if self.over_limit:
+                return False
+            if self.budget is not None:
+                if len(chunk) > self.budget:
+                    chunk = chunk[:self.budget]
+                    self.over_limit = True
+                self.budget -= len(chunk)
+            self._emit(name, self._decoders[name].decode(chunk, final=self.over_limit))
+            return not self.over_limit
+
+    def close(self, name: str) -> None:
+        """Stream ``name`` reached EOF: flush what its decoder holds."""
+        with self._lock:
+            self._emit(name, self._decoders[name].decode(b"", final=True))
+
+    def _emit(self, name: str, text: str) -> None:
+        if text:
+            self.captured[name].append(text)
+            self.combined.append(text)
+            self._on_output(text, name)
+
+    def stop_check(self, start: float, timeout: float, job) -> str:
+        """Why the run must be stopped now ("" to let it continue)."""
+        if self.over_limit:
+            return "output limit"
+        if time.monotonic() - start >= timeout:
+            return "timeout"
+        if job is not None and job.cancelled:
+            return "cancelled"
+        return ""
+
+    def result(self, returncode: Optional[int], stopped: str, rusage, job,
+               start: float, ended: float) -> StreamedRun:
+        """Record the run's timings and usage on ``job`` and build its ``StreamedRun``.
+
+        ``ended`` is when the process exited; the time since is ``transfer``.
+        """
+        if job is not None:
+            record_timing("run", (ended - start) * 1000, job)
+            record_timing("transfer", (time.monotonic() - ended) * 1000, job)
+        usage = ResourceUsage.from_rusage(rusage) if rusage is not None else None
+        if usage is not None and job is not None:
+            record_usage(usage)
+        return StreamedRun(None if stopped else returncode, "".join(self.captured["stdout"]),
+                           "".join(self.captured["stderr"]), "".join(self.combined), stopped, usage)
+
+
+def spawn(argv: List[str], cwd: Optional[str], policy: Optional[ResourcePolicy], job,
+          stdin: bool = False) -> subprocess.Popen:
+    """Start ``argv`` with piped output, the job's ``env`` added and ``policy`` applied.
+
+    The limits are in place before the program starts (``ResourcePolicy.command``).
+    """
+    env = {**os.environ, **job.env} if job is not None and job.env else None
+    if policy is not None:
+        argv = policy.command(argv)
+    return subprocess.Popen(argv, cwd=cwd, env=env, stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                            stdin=subprocess.PIPE if stdin else None)
+
+
+def run_streaming(argv: List[str], timeout: float, cwd: Optional[str] = None,
+                  on_output: Optional[Callable[[str, str], None]] = None,
+                  policy: Optional[ResourcePolicy] = None, stdin: Optional[str] = None) -> StreamedRun:
+    """Run a process, streaming its stdout/stderr as it is produced.
+
+    Output goes to ``on_output`` (default: the current job's output events).
+    ``policy`` (default: the current job's) is in place before the program
+    starts (see ``spawn``), and the job's ``env`` is added to its
+    environment.  ``stdin``, if given, is written to the process and its
+    stdin closed.  The process is killed if it exceeds ``timeout``, prints
+    more than the policy's ``output_bytes`` or its job is cancelled.  On
+    POSIX the child's own rusage is collected with ``wait4`` and recorded on
+    the job, as are the ``run`` and ``transfer`` (draining the pipes after
+    exit) timings.
+    """
+    job = current_job()
+    if on_output is None:
+        on_output = lambda text, name: emit_output(text, name, job)
+    policy = policy or current_policy()
+    proc = spawn(argv, cwd, policy, job, stdin=stdin is not None)
+    if stdin is not None:
+        def feed() -> None:
+            try:
+                proc.stdin.write(stdin.encode("utf-8"))
+                proc.stdin.close()
+            except OSError:
+                pass  # the process exited without reading it all
+        threading.Thread(target=feed, daemon=True).start()
+    capture = RunCapture(policy, on_output)
+
+    def pump(pipe, name: str) -> None:
+        # read1 returns as soon as some bytes are available
+        for chunk in iter(lambda: pipe.read1(CHUNK), b""):
+            if not capture.feed(name, chunk):
+                return
+        capture.close(name)
+
+    exited = threading.Event()
+    rusage: List = []
+
+    def reap() -> None:
+        # wait4 reaps the child and returns its rusage, which Popen.wait would discard
+        try:
+            _, status, ru = os.wait4(proc.pid, 0)
+        except ChildProcessError:
+            proc.wait()  # already reaped by Popen (kill() polls first); no rusage then
+        else:
+            proc.returncode = os.waitstatus_to_exitcode(status)
+            rusage.append(ru)
+        finally:
+            exited.set()
+
+    threads = [threading.Thread(target=pump, args=(proc.stdout, "stdout"), daemon=True),
+               threading.Thread(target=pump, args=(proc.stderr, "stderr"), daemon=True)]
+    if hasattr(os, "wait4"):
+        threads.append(threading.Thread(target=reap, daemon=True))
+    else:
+        threads.append(threading.Thread(target=lambda: (proc.wait(), exited.set()), daemon=True))
+    start = time.monotonic()
+    for t in threads:
+        t.start()
+
+    stopped = ""
+    while not exited.wait(_POLL):
+        stopped = capture.stop_check(start, timeout, job)
+        if stopped:
+            proc.kill()
+            exited.wait(5.0)
+            break
+    ended = time.monotonic()
+    for t in threads:
+        t.join(1.0)
+    return capture.result(proc.returncode, stopped, rusage[0] if rusage else None, job, start, ended)
+
+
+class OutputBuffer:
+    """Bounded ring buffer of output lines with O(chunk) appends.
+
+    Only the chunk being appended is scanned for line breaks; once more than
+    ``max_lines`` complete lines are held, the oldest are dropped.
+    """
+
+    def __init__(self, max_lines: int = 5000) -> None:
+        self.max_lines = max_lines
+        self._lines: Deque[str] = deque(maxlen=max_lines)
+        self._partial = ""
+        self.received = 0   # characters appended in total, including dropped ones
+        self.dropped = 0    # complete lines that fell out of the buffer
+
+    def clear(self) -> None:
+        self._lines.clear()
+        self._partial = ""
+        self.received = 0
+        self.dropped = 0
+
+    def append(self, text: str) -> None:
+        if not text:
+            return
+        self.received += len(text)
+        parts = text.split("\n")
+        if len(parts) == 1:
+            self._partial += text
+            return
+        overflow = len(self._lines) + len(parts) - 1 - self.max_lines
+        if overflow > 0:
+            self.dropped += overflow
+        self._lines.append(self._partial + parts[0])
+        self._lines.extend(parts[1:-1])
+        self._partial = parts[-1]
+
+    def __len__(self) -> int:
+        return len(self._lines) + 1
+
+    def line(self, i: int) -> str:
+        return self._partial if i == len(self._lines) else self._lines[i]
+
+    def lines(self, start: int, stop: int) -> List[str]:
+        return [self.line(i) for i in range(max(0, start), min(stop, len(self)))]
+
+    @property
+    def text(self) -> str:
+        return "\n".join([*self._lines, self._partial])
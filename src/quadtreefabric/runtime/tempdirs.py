@@ -0,0 +1,74 @@
+"""Private per-instance directories in shared temporary locations.
+
+Whatever the app keeps under ``/tmp`` or ``/dev/shm`` (artifact buffers,
+scratch directories, snapshot and fork-server sockets) lives in a directory
+made by ``private_dir``: created by ``tempfile.mkdtemp`` under an
+unpredictable name with mode 0700, and checked to be ours, so another
+local user can neither pre-create it nor look inside.  Names start with
+``quadtreefabric-<kind>-<pid>-`` so ``sweep_stale`` can remove the ones left
+behind by instances that did not exit cleanly.
+"""
+from __future__ import annotations
+
+import os
+import re
+import shutil
+import stat
+import tempfile
+from pathlib import Path
+from typing import Iterable, Optional
+
+# Also matches the pre-mkdtemp names, quadtreefabric-<pid> and quadtreefabric-<kind>-<pid>
+_NAME = re.compile(r"quadtreefabric-(?:[a-z]+-)?(\d+)(?:-\w+)?")
+
+
+def private_dir(kind: str, base: Optional[Path] = None) -> Path:
+    """A new empty directory only this user can access, in ``base`` (default: the temp dir)."""
+    path = Path(tempfile.mkdtemp(prefix=f"quadtreefabric-{kind}-{os.getpid()}-", dir=base))
+    check_private(path)
+    return path
+
+
+def check_private(path: Path) -> None:
+    """Raise PermissionError unless ``path`` is a real directory of ours that others can't use."""
+    st = os.lstat(path)
+    if not stat.S_ISDIR(st.st_mode):
+        raise PermissionError(f"{path} is not a directory")
+    if hasattr(os, "getuid") and (st.st_uid != os.getuid() or st.st_mode & 0o077):
+        raise PermissionError(f"{path} is not private to this user")
+
+
+def _alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True  # someone else's process
+    return True
+
+
+def sweep_stale(bases: Iterable[Path] = ()) -> int:
+    """Remove our directories in ``bases`` whose instance is no longer running; return how many.
+
+    ``bases`` defaults to ``/dev/shm`` and the system temporary directory.
+    """
+    removed = 0
+    for base in bases or (Path("/dev/shm"), Path(tempfile.gettempdir())):
+        try:
+            entries = list(os.scandir(base))
+        except OSError:
+            continue
+        for entry in entries:
+            match = _NAME.fullmatch(entry.name)
+            if match is None or int(match[1]) == os.getpid() or _alive(int(match[1])):
+                continue
+            try:
+                st = os.lstat(entry.path)
+            except OSError:
+                continue
+            if not stat.S_ISDIR(st.st_mode) or (hasattr(os, "getuid") and st.st_uid != os.getuid()):
+                continue  # not ours to remove
+            shutil.rmtree(entry.path, ignore_errors=True)
+            removed += 1
+    return removed
@@ -0,0 +1,161 @@
+"""Pre-spawned workers, kept warm per language.
+
+Starting an interpreter (and importing what it needs) dominates the time
+to first output of a short cell.  A ``WarmPool`` keeps a few idle workers
+started ahead of time and hands one out per run, topping the pool up again
+on a background thread.  A pool left unused for ``WARM_IDLE_SECS`` closes
+its idle workers and stays empty until the next run.
+
+Pools are per language (``warm_pool``); how many idle workers each keeps is
+set in ``constants.WARM_WORKERS``.  The Python executor keeps its
+``PythonWorker`` processes in one (see ``workers.WorkerPool``); an
+executor for another interpreted language gets the same by taking its
+workers from ``warm_pool``.
+"""
+from __future__ import annotations
+
+import threading
+import time
+from typing import Callable, Dict, Generic, List, Optional, Protocol, TypeVar
+
+from .constants import WARM_IDLE_SECS, WARM_WORKERS
+
+
+class Worker(Protocol):
+    def alive(self) -> bool: ...
+    def close(self) -> None: ...
+
+
+W = TypeVar("W", bound=Worker)
+
+
+class WarmPool(Generic[W]):
+    """Idle workers made by ``factory``, ``size`` of them when in use."""
+
+    def __init__(self, language: str, factory: Callable[[], W], size: Optional[int] = None,
+                 idle_secs: float = WARM_IDLE_SECS) -> None:
+        self.language = language
+        self.factory = factory
+        self.size = WARM_WORKERS.get(language, 1) if size is None else size
+        self.idle_secs = idle_secs
+        self._lock = threading.Lock()
+        self._idle: List[W] = []
+        self._refilling = False
+        self._watching = False
+        self._dormant = False  # scaled down after sitting unused
+        self._closed = False
+        self._last_used = time.monotonic()
+
+    def take(self) -> W:
+        """An idle worker if one is ready, otherwise a freshly started one."""
+        worker = None
+        with self._lock:
+            self._last_used = time.monotonic()
+            self._dormant = False
+            while self._idle and worker is None:
+                candidate = self._idle.pop()
+                if candidate.alive():
+                    worker = candidate
+                else:
+                    candidate.close()
+        self.replenish()
+        return worker if worker is not None else self.factory()
+
+    def idle(self) -> int:
+        with self._lock:
+            return len(self._idle)
+
+    def replenish(self) -> None:
+        """Start workers in the background until ``size`` are idle."""
+        with self._lock:
+            if self._closed or self._dormant:
+                return
+            refill, self._refilling = not self._refilling, True
+            watch, self._watching = not self._watching and self.idle_secs > 0, True
+        if refill:
+            threading.Thread(target=self._refill, name=f"warm-{self.language}-refill",
+                             daemon=True).start()
+        if watch:
+            threading.Thread(target=self._watch, name=f"warm-{self.language}-watch",
+                             daemon=True).start()
+
+    def _refill(self) -> None:
+        try:
+            while True:
+                with self._lock:
+                    if self._closed or self._dormant or len(self._idle) >= self.size:
+                        return
+                try:
+                    worker = self.factory()
+                except Exception:
+                    return  # e.g. the interpreter is gone; runs will report it
+                with self._lock:
+                    if not (self._closed or self._dormant):
+                        self._idle.append(worker)
+                        continue
+                worker.close()
+                return
+        finally:
+            with self._lock:
+                self._refilling = False
+
+    def _watch(self) -> None:
+        """Scale down to no idle workers once the pool has gone unused for ``idle_secs``."""
+        while True:
+            time.sleep(min(self.idle_secs, 5.0))
+            with self._lock:
+                if self._closed:
+                    self._watching = False
+                    return
+                if time.monotonic() - self._last_used < self.idle_secs:
+                    continue
+                self._dormant = True
+                self._watching = False
+                idle, self._idle = self._idle, []
+            for worker in idle:
+                worker.close()
+            return
+
+    def resize(self, size: int) -> None:
+        with self._lock:
+            self.size = size
+            extra = self._idle[size:]
+            del self._idle[size:]
+        for worker in extra:
+            worker.close()
+        self.replenish()
+
+    def shutdown(self) -> None:
+        with self._lock:
+            self._closed = True
+            idle, self._idle = self._idle, []
+        for worker in idle:
+            worker.close()
+
+
+_POOLS: Dict[str, WarmPool] = {}
+_POOLS_LOCK = threading.Lock()
+
+
+def warm_pool(language: str, factory: Callable[[], W], size: Optional[int] = None) -> WarmPool[W]:
+    """The pool for ``language``, created on first use."""
+    with _POOLS_LOCK:
+        pool = _POOLS.get(language)
+        if pool is None:
+            pool = _POOLS[language] = WarmPool(language, factory, size)
+        return pool
+
+
+def prewarm() -> None:
+    """Start filling every pool, e.g. when the app starts."""
+    with _POOLS_LOCK:
+        pools = list(_POOLS.values())
+    for pool in pools:
+        pool.replenish()
+
+
+def shutdown_pools() -> None:
+    with _POOLS_LOCK:
+        pools = list(_POOLS.values())
+    for pool in pools:
+        pool.shutdown()
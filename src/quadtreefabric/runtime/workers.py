@@ -0,0 +1,759 @@
+"""Long-lived Python worker processes.
+
+Python cells run in separate interpreter processes instead of threads of
+the GUI process, so CPU-heavy cells don't compete with the render loop for
+the GIL and a crashing cell can't take the app down.  Each session gets its
+own worker, which keeps the session's globals between runs; workers are
+spawned once and reused, so interpreter startup is paid once per session.
+
+A run that times out or is cancelled kills its worker outright; the session
+then continues on a pre-spawned spare from the warm pool (see
+``warm_pool.py``) and starts over with empty globals.
+
+Per-run memory and CPU limits are applied inside the worker as rlimits for
+the duration of the run; an output limit is enforced by the parent, which
+kills the worker once a run prints too much.
+
+Session snapshots (POSIX only): a cell that calls ``snapshot("name")`` has
+the session forked when it finishes.  The fork is kept as a frozen copy of
+the globals, sharing memory with the worker copy-on-write, and listens on
+a Unix socket in the session's snapshot directory.  A cell that starts
+with ``restore("name")`` asks the snapshot for a fork of its own, hands it
+the pipe to the parent and exits; the fork runs the cell again (this time
+``restore`` returns at once) and carries on as the session's worker.  So
+an expensive setup cell runs once, and every later restore costs a fork
+instead of repeating it.  Snapshots survive their session's worker being
+killed and are dropped when the app exits.  Their sockets live in a
+directory made with ``tempdirs.private_dir``, and the worker checks a
+session's directory is private to this user before binding, connecting
+or reading pids there.
+
+Fork-server isolation: ``FORK_SERVER`` is a zygote process that imports
+``PYTHON_PRELOAD`` once and then forks a child per cell.  The child runs
+the cell in a fresh namespace over a socket of its own, exactly as a
+worker would, and exits afterwards; it shares the zygote's memory
+copy-on-write, so cells are isolated and can be killed, yet start in
+milliseconds with their heavy imports already done.
+
+Protocol over a duplex pipe (parent -> worker):
+    ("exec", seq, code, limits, snapdir)
+                          run code in the session namespace; limits is a
+                          ResourcePolicy or None, snapdir the session's
+                          snapshot directory (None for stateless runs)
+    ("stop",)             exit
+worker -> parent:
+    ("status", msg)       a cell called ``status_q.put(msg)``
+    ("out", seq, stream, text)   a chunk of stdout/stderr, sent while running
+    ("pid", pid)          the session continues in process pid (a restore)
+    ("done", seq, ok, output, usage, ms, sent)
+                          output is everything the run printed; usage a
+                          ResourceUsage or None; ms the run's wall time in
+                          the worker; sent the time.time() it was sent at
+"""
+from __future__ import annotations
+
+import contextlib
+import hashlib
+import importlib
+import io
+import multiprocessing
+import os
+import shutil
+import signal
+import socket
+import tempfile
+import threading
+import time
+import traceback
+from abc import ABC, abstractmethod
+from multiprocessing.connection import Client, Connection
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Tuple
+
+from .artifacts import ARTIFACTS
+from .constants import PYTHON_PRELOAD
+from .limits import ResourcePolicy, ResourceUsage, resource, stop_reason, unenforced_note
+from .tempdirs import check_private, private_dir, sweep_stale
+from .warm_pool import WarmPool, warm_pool
+
+_POLL = 0.05  # seconds between checks for timeout/cancellation while waiting
+_FLUSH_BYTES = 4096
+_FLUSH_SECS = 0.05
+
+
+# --- worker side --------------------------------------------------------------
+class _StatusProxy:
+    """Stands in for ``STATUS_Q`` inside the worker and forwards to the GUI."""
+
+    def __init__(self, conn: Connection, send_lock: threading.Lock) -> None:
+        self._conn, self._send_lock = conn, send_lock
+
+    def put(self, msg) -> None:
+        with self._send_lock:
+            self._conn.send(("status", str(msg)))
+
+
+class _StreamWriter(io.TextIOBase):
+    """stdout/stderr replacement that forwards output in small batches.
+
+    Writes are sent once ``_FLUSH_BYTES`` accumulate; a ``_Flusher`` sends the
+    rest every ``_FLUSH_SECS`` so a cell that prints and then sleeps is
+    still seen promptly.
+    """
+
+    def __init__(self, conn: Connection, send_lock: threading.Lock, seq: int,
+                 name: str, full: io.StringIO) -> None:
+        self._conn, self._send_lock = conn, send_lock
+        self._seq, self._name, self._full = seq, name, full
+        self._pending: List[str] = []
+        self._size = 0
+        self._lock = threading.Lock()
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, s: str) -> int:
+        with self._lock:
+            self._full.write(s)
+            self._pending.append(s)
+            self._size += len(s)
+            full = self._size >= _FLUSH_BYTES
+        if full:
+            self.flush()
+        return len(s)
+
+    def flush(self) -> None:
+        with self._lock:
+            if not self._pending:
+                return
+            text = "".join(self._pending)
+            self._pending.clear()
+            self._size = 0
+            with self._send_lock:
+                self._conn.send(("out", self._seq, self._name, text))
+
+
+class _Flusher:
+    """Background thread that flushes ``writers`` every ``_FLUSH_SECS``.
+
+    It is the worker's only thread of its own, and ``_fork`` stops it while
+    forking, so forks start single-threaded with none of its locks held.
+    """
+
+    def __init__(self) -> None:
+        self.writers: List[_StreamWriter] = []
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> None:
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._loop, daemon=True, name="fabric-flusher")
+        self._thread.start()
+
+    def stop(self) -> None:
+        if self._thread is not None:
+            self._stop.set()
+            self._thread.join()
+            self._thread = None
+
+    def _loop(self) -> None:
+        while not self._stop.wait(_FLUSH_SECS):
+            for w in list(self.writers):
+                w.flush()
+
+
+def _apply_limits(policy: Optional[ResourcePolicy]) -> Callable[[], None]:
+    """Lower the soft rlimits for one run; return a function that restores them."""
+    if resource is None or policy is None:
+        return lambda: None
+    saved = []
+    if policy.memory_mb:
+        saved.append((resource.RLIMIT_AS, resource.getrlimit(resource.RLIMIT_AS)))
+        hard = saved[-1][1][1]
+        size = policy.memory_mb * 1024 * 1024
+        resource.setrlimit(resource.RLIMIT_AS, (size if hard < 0 else min(size, hard), hard))
+    if policy.cpu_seconds:
+        # RLIMIT_CPU counts the process's whole lifetime, so allow this run on top of it
+        saved.append((resource.RLIMIT_CPU, resource.getrlimit(resource.RLIMIT_CPU)))
+        hard = saved[-1][1][1]
+        ru = resource.getrusage(resource.RUSAGE_SELF)
+        soft = int(ru.ru_utime + ru.ru_stime) + 1 + policy.cpu_seconds
+        resource.setrlimit(resource.RLIMIT_CPU, (soft if hard < 0 else min(soft, hard), hard))
+
+    def restore() -> None:
+        for which, limits in saved:
+            resource.setrlimit(which, limits)
+    return restore
+
+
+_APP_PID = 0                   # the app's process; snapshots exit when it is gone
+_SNAPSHOTS: List[int] = []     # snapshot processes forked here, reaped once they exit
+_FLUSHER: Optional[_Flusher] = None  # this process's flusher, if it serves cells
+
+
+class _Restore(BaseException):
+    """Raised by ``restore()`` to continue the run in a fork of a snapshot."""
+
+    def __init__(self, name: str) -> None:
+        self.name = name
+
+
+def _snapshot_path(snapdir: str, name: str) -> Path:
+    # Hashed, since Unix socket paths are short and names are free text
+    return Path(snapdir) / f"{hashlib.sha1(name.encode()).hexdigest()[:12]}.sock"
+
+
+def _drop_snapshot(path: Path) -> None:
+    try:
+        os.kill(int(path.with_suffix(".pid").read_text()), signal.SIGKILL)
+    except (OSError, ValueError):
+        pass
+    for p in (path, path.with_suffix(".pid")):
+        p.unlink(missing_ok=True)
+
+
+def _alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def _fork() -> int:
+    """``os.fork`` with the flusher stopped, so the child is single-threaded."""
+    global _FLUSHER
+    flusher = _FLUSHER
+    if flusher is not None:
+        flusher.stop()
+    pid = os.fork()
+    if pid == 0:
+        _FLUSHER = None  # a child that serves cells starts its own
+    elif flusher is not None:
+        flusher.start()
+    return pid
+
+
+def _take_snapshot(conn: Connection, ns: dict, path: Path) -> None:
+    """Fork a process that keeps ``ns`` as it is now and serves restores from ``path``."""
+    path.parent.mkdir(mode=0o700, exist_ok=True)
+    check_private(path.parent)
+    _drop_snapshot(path)
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    sock.bind(str(path))
+    sock.listen()
+    pid = _fork()
+    if pid == 0:
+        try:
+            conn.close()  # only the session's worker talks to the parent
+            _hold(sock, ns, path)
+        finally:
+            os._exit(0)
+    sock.close()
+    path.with_suffix(".pid").write_text(str(pid))
+    _SNAPSHOTS.append(pid)
+
+
+def _hold(sock: socket.socket, ns: dict, path: Path) -> None:
+    """Snapshot process: fork a new session worker per restore request."""
+    signal.signal(signal.SIGCHLD, signal.SIG_IGN)  # forks are reaped automatically
+    sock.settimeout(1.0)
+    while path.exists() and _alive(_APP_PID):  # else dropped, or the app is gone
+        try:
+            client, _ = sock.accept()
+        except socket.timeout:
+            continue
+        try:
+            client.settimeout(5.0)
+            _, fds, _, _ = socket.recv_fds(client, 1, 1)
+            client.settimeout(None)
+            link = Connection(client.detach())
+            msg = link.recv()
+        except (OSError, EOFError):
+            client.close()
+            continue
+        if not fds:
+            link.close()
+            continue
+        pid = _fork()
+        if pid == 0:
+            try:
+                signal.signal(signal.SIGCHLD, signal.SIG_DFL)
+                sock.close()
+                link.close()
+                _serve(Connection(fds[0]), ns, msg)
+            finally:
+                os._exit(0)
+        os.close(fds[0])
+        try:
+            link.send("ok")
+        except OSError:
+            pass
+        link.close()
+
+
+def _hand_off(conn: Connection, path: Path, msg: tuple) -> str:
+    """Have the snapshot at ``path`` rerun ``msg`` in a fork and exit; return why not if it can't."""
+    try:
+        check_private(path.parent)  # never hand the pipe to a socket someone else made
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.settimeout(5.0)
+        sock.connect(str(path))
+        socket.send_fds(sock, [b"\0"], [conn.fileno()])
+        sock.settimeout(None)
+        link = Connection(sock.detach())
+        link.send(msg)
+        if link.poll(5.0) and link.recv() == "ok":
+            os._exit(0)  # the fork has the pipe now
+        return "the snapshot did not respond"
+    except (FileNotFoundError, ConnectionRefusedError):
+        return "no such snapshot"
+    except (OSError, EOFError) as e:
+        return str(e) or type(e).__name__
+
+
+def _reap() -> None:
+    for pid in list(_SNAPSHOTS):
+        try:
+            done = os.waitpid(pid, os.WNOHANG)[0]
+        except ChildProcessError:
+            done = True  # not ours: inherited through a fork
+        if done:
+            _SNAPSHOTS.remove(pid)
+
+
+def _worker_main(conn: Connection) -> None:
+    global _APP_PID
+    _APP_PID = os.getppid()
+    _serve(conn, {})
+
+
+def _serve(conn: Connection, ns: dict, resume: Optional[tuple] = None) -> None:
+    """Run cells from ``conn`` in ``ns``, starting with ``resume`` in a restored fork."""
+    global _FLUSHER
+    send_lock = threading.Lock()
+    status = _StatusProxy(conn, send_lock)
+    _FLUSHER = _Flusher()
+    _FLUSHER.start()
+    writers = _FLUSHER.writers
+    if resume is not None:
+        with send_lock:
+            conn.send(("pid", os.getpid()))
+    while True:
+        _reap()
+        restored = resume is not None
+        if restored:
+            msg, resume = resume, None
+        else:
+            try:
+                msg = conn.recv()
+            except EOFError:
+                return
+        if msg[0] == "stop":
+            return
+        _, seq, code, policy, snapdir = msg
+        pending: List[str] = []
+
+        def check_snapshots() -> None:
+            if snapdir is None:
+                raise RuntimeError("snapshots need a shared session, which this cell does not run in")
+            if not hasattr(os, "fork"):
+                raise RuntimeError("snapshots need os.fork, which this platform lacks")
+
+        def snapshot(name: str = "default") -> None:
+            """Snapshot the session as it is when this cell finishes."""
+            check_snapshots()
+            pending.append(name)
+
+        def restore(name: str = "default") -> None:
+            """Rerun this cell, and continue the session, from snapshot ``name``; call it first."""
+            check_snapshots()
+            if not restored:
+                raise _Restore(name)
+
+        ns.update(status_q=status, artifacts=ARTIFACTS, snapshot=snapshot, restore=restore)
+        before = resource.getrusage(resource.RUSAGE_SELF) if resource else None
+        unlimit = _apply_limits(policy)
+        buf = io.StringIO()
+        out = _StreamWriter(conn, send_lock, seq, "stdout", buf)
+        err = _StreamWriter(conn, send_lock, seq, "stderr", buf)
+        writers[:] = [out, err]
+        err.write(unenforced_note(policy))
+        ok = True
+        handoff = None
+        start = time.perf_counter()
+        with contextlib.redirect_stdout(out), contextlib.redirect_stderr(err):
+            try:
+                exec(code, ns)
+            except _Restore as r:
+                handoff = r.name
+            except BaseException:
+                ok = False
+                traceback.print_exc()
+        ms = (time.perf_counter() - start) * 1000
+        unlimit()
+        writers.clear()
+        out.flush()
+        err.flush()
+        if handoff is not None:
+            ok = False
+            err.write(f"Cannot restore snapshot {handoff!r}: "
+                      f"{_hand_off(conn, _snapshot_path(snapdir, handoff), msg)}\n")
+        elif ok:
+            for name in dict.fromkeys(pending):
+                try:
+                    _take_snapshot(conn, ns, _snapshot_path(snapdir, name))
+                    out.write(f"📸 Snapshot {name!r} taken\n")
+                except OSError as e:
+                    ok = False
+                    err.write(f"Cannot snapshot {name!r}: {e}\n")
+        out.flush()
+        err.flush()
+        usage = None
+        if before is not None:
+            after = resource.getrusage(resource.RUSAGE_SELF)
+            # Peak RSS is the worker's high-water mark; CPU time is this run's alone
+            usage = ResourceUsage.from_rusage(after)
+            usage.cpu_user_ms -= before.ru_utime * 1000
+            usage.cpu_sys_ms -= before.ru_stime * 1000
+        with send_lock:
+            conn.send(("done", seq, ok, buf.getvalue(), usage, ms, time.time()))
+
+
+def _zygote_main(path: str, preload: Tuple[str, ...], ready: Connection) -> None:
+    global _APP_PID
+    _APP_PID = os.getppid()
+    failed = []
+    for name in preload:
+        try:
+            importlib.import_module(name)
+        except Exception as e:
+            failed.append(f"{name}: {e}")
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    sock.bind(path)
+    sock.listen()
+    ready.send(failed)
+    ready.close()
+    signal.signal(signal.SIGCHLD, signal.SIG_IGN)  # children are reaped automatically
+    sock.settimeout(1.0)
+    while _alive(_APP_PID) and os.path.exists(path):
+        try:
+            client, _ = sock.accept()
+        except socket.timeout:
+            continue
+        pid = _fork()
+        if pid == 0:
+            try:
+                signal.signal(signal.SIGCHLD, signal.SIG_DFL)
+                sock.close()
+                client.settimeout(None)
+                conn = Connection(client.detach())
+                conn.send(("pid", os.getpid()))
+                _serve(conn, {})
+            finally:
+                os._exit(0)
+        client.close()
+
+
+# --- parent side --------------------------------------------------------------
+class _WorkerHandle(ABC):
+    """Parent side of the protocol with a process running ``_serve`` over ``conn``.
+
+    Subclasses say how the process is checked on and killed.
+    """
+
+    def __init__(self, conn: Connection, pid: int) -> None:
+        self.conn, self.pid = conn, pid
+        self._seq = 0
+        self._lock = threading.Lock()
+
+    @abstractmethod
+    def alive(self) -> bool: ...
+
+    @abstractmethod
+    def _exit_code(self) -> Optional[int]:
+        """The process's exit code once it has gone, if it can be known."""
+
+    @abstractmethod
+    def kill(self) -> None: ...
+
+    def _wait(self, timeout: float) -> bool:
+        # Not process.join: snapshots forked from the worker inherit the pipe
+        # join waits on, so it would only return at the timeout
+        deadline = time.monotonic() + timeout
+        while self.alive() and time.monotonic() < deadline:
+            time.sleep(0.01)
+        return not self.alive()
+
+    def run(self, code: str, timeout: float, snapdir: Optional[str] = None,
+            on_status: Optional[Callable[[str], None]] = None,
+            should_stop: Optional[Callable[[], bool]] = None,
+            on_output: Optional[Callable[[str, str], None]] = None,
+            policy: Optional[ResourcePolicy] = None,
+            on_usage: Optional[Callable[[ResourceUsage], None]] = None,
+            on_timing: Optional[Callable[[str, float], None]] = None) -> Tuple[bool, str]:
+        """Run ``code`` and wait for its result, up to ``timeout`` seconds.
+
+        If the run is cut short, the output streamed so far is returned with
+        the reason appended.  ``on_timing`` gets the ``run`` time measured in
+        the worker, the ``transfer`` time of its result and, as ``queue``,
+        the rest of the round trip (mostly a new worker still starting up).
+        """
+        streamed: List[str] = []
+        budget = policy.output_bytes if policy and policy.output_bytes else None
+        with self._lock:
+            self._seq += 1
+            seq = self._seq
+            sent = time.perf_counter()
+            self.conn.send(("exec", seq, code, policy, snapdir))
+            deadline = time.monotonic() + timeout
+            while time.monotonic() < deadline:
+                if should_stop and should_stop():
+                    self.kill()
+                    return False, "".join(streamed) + "⏹ Cancelled"
+                if not self.conn.poll(_POLL):
+                    continue
+                try:
+                    msg = self.conn.recv()
+                except EOFError:
+                    code = self._exit_code()
+                    reason = stop_reason(code, "", timeout) or f"Python worker exited (code {code})"
+                    return False, "".join(streamed) + reason
+                if msg[0] == "out":
+                    if msg[1] != seq:
+                        continue
+                    text = msg[3]
+                    if budget is not None:
+                        text = text[:budget]
+                        budget -= len(text)
+                    streamed.append(text)
+                    if on_output:
+                        on_output(text, msg[2])
+                    if len(text) < len(msg[3]):
+                        self.kill()
+                        return False, "".join(streamed) + stop_reason(None, "output limit", timeout)
+                elif msg[0] == "status":
+                    if on_status:
+                        on_status(msg[1])
+                elif msg[0] == "pid":
+                    self.pid = msg[1]  # the previous worker exits after the hand-off
+                elif msg[0] == "done" and msg[1] == seq:
+                    if on_usage and msg[4] is not None:
+                        on_usage(msg[4])
+                    if on_timing:
+                        transfer = max(0.0, (time.time() - msg[6]) * 1000)
+                        on_timing("run", msg[5])
+                        on_timing("transfer", transfer)
+                        on_timing("queue", max(0.0, (time.perf_counter() - sent) * 1000 - msg[5] - transfer))
+                    return msg[2], msg[3]
+            self.kill()
+            return False, "".join(streamed) + "⏱️ Timeout"
+
+    def close(self) -> None:
+        if self.conn.closed:
+            return
+        try:
+            self.conn.send(("stop",))
+        except (OSError, ValueError):
+            pass
+        if not self._wait(0.5):
+            self.kill()
+        self.conn.close()
+
+
+class PythonWorker(_WorkerHandle):
+    """Parent-side handle for one worker process."""
+
+    def __init__(self, ctx=None) -> None:
+        ctx = ctx or multiprocessing.get_context("spawn")
+        conn, child = ctx.Pipe(duplex=True)
+        self.process = ctx.Process(target=_worker_main, args=(child,), daemon=True,
+                                   name="fabric-python-worker")
+        self.process.start()
+        child.close()
+        # pid changes when the session is restored from a snapshot
+        super().__init__(conn, self.process.pid)
+
+    def alive(self) -> bool:
+        spawned = self.process.is_alive()  # also reaps it once it has exited
+        return spawned if self.pid == self.process.pid else _alive(self.pid)
+
+    def _exit_code(self) -> Optional[int]:
+        if self.pid != self.process.pid:
+            return None  # a fork; its parent reaps it
+        self._wait(1.0)
+        return self.process.exitcode
+
+    def kill(self) -> None:
+        if self.pid != self.process.pid:
+            with contextlib.suppress(OSError):
+                os.kill(self.pid, signal.SIGKILL)
+        self.process.kill()
+        self._wait(1.0)
+        self.conn.close()
+
+
+class WorkerPool:
+    """Maps session ids to their workers, drawing new ones from a warm pool.
+
+    Fresh workers come from the "python" ``WarmPool`` so neither a new
+    session nor a session whose worker was just killed waits for
+    interpreter startup; the pool is topped up again in the background.
+    """
+
+    def __init__(self, spares: Optional[int] = None) -> None:
+        self.warm: WarmPool[PythonWorker] = warm_pool("python", PythonWorker, spares)
+        self._lock = threading.Lock()
+        self._sessions: Dict[str, PythonWorker] = {}
+        self._snapshots: Optional[Path] = None
+
+    @property
+    def snapshots(self) -> Path:
+        """Private directory holding each session's snapshot sockets, made on first use."""
+        with self._lock:
+            if self._snapshots is None:
+                sweep_stale([Path(tempfile.gettempdir())])
+                self._snapshots = private_dir("snapshots")
+            return self._snapshots
+
+    def session_worker(self, session: str) -> PythonWorker:
+        with self._lock:
+            worker = self._sessions.get(session)
+            if worker is not None and worker.alive():
+                return worker
+        worker = self.warm.take()
+        with self._lock:
+            self._sessions[session] = worker
+        return worker
+
+    def run(self, session: Optional[str], code: str, timeout: float, **kw) -> Tuple[bool, str]:
+        if session is None:
+            # Stateless run: borrow a worker for one run and discard it afterwards,
+            # since its namespace now holds the cell's globals.
+            worker = self.warm.take()
+            try:
+                return worker.run(code, timeout, **kw)
+            finally:
+                worker.close()
+
+        worker = self.session_worker(session)
+        ok, out = worker.run(code, timeout, str(self.snapshots / session), **kw)
+        if not worker.alive():
+            # Killed (timeout/cancel) or crashed: its globals are gone with it
+            self.reset(session)
+            out += "\n↺ Python session reset; globals cleared"
+        return ok, out
+
+    def reset(self, session: str) -> None:
+        """Drop a session's worker (and with it the session globals, but not its snapshots)."""
+        with self._lock:
+            worker = self._sessions.pop(session, None)
+        if worker is not None:
+            worker.close()
+        self.warm.replenish()
+
+    def shutdown(self) -> None:
+        self.warm.shutdown()
+        with self._lock:
+            workers = list(self._sessions.values())
+            self._sessions.clear()
+        for worker in workers:
+            worker.close()
+        with self._lock:
+            root, self._snapshots = self._snapshots, None
+        if root is None:
+            return
+        for path in root.glob("*/*.sock"):
+            _drop_snapshot(path)
+        shutil.rmtree(root, ignore_errors=True)
+
+
+class ForkedWorker(_WorkerHandle):
+    """Handle for one child of the fork server; it runs a single cell."""
+
+    def alive(self) -> bool:
+        return _alive(self.pid)  # the zygote reaps its children
+
+    def _exit_code(self) -> Optional[int]:
+        return None
+
+    def kill(self) -> None:
+        with contextlib.suppress(OSError):
+            os.kill(self.pid, signal.SIGKILL)
+        self._wait(1.0)
+        self.conn.close()
+
+
+class ForkServer:
+    """Zygote that preloads modules and forks a fresh worker for every cell."""
+
+    def __init__(self, preload: Tuple[str, ...] = PYTHON_PRELOAD) -> None:
+        self.preload = preload
+        self.path: Optional[Path] = None  # the zygote's socket, in a private directory
+        self.process: Optional[multiprocessing.Process] = None
+        self._lock = threading.Lock()
+
+    def _ensure(self) -> Path:
+        """Start the zygote if it is not running, wait for its imports and return its socket."""
+        with self._lock:
+            if self.process is not None and self.process.is_alive():
+                return self.path
+            if self.path is None:
+                sweep_stale([Path(tempfile.gettempdir())])
+                self.path = private_dir("zygote") / "zygote.sock"
+            self.path.unlink(missing_ok=True)
+            ctx = multiprocessing.get_context("spawn")
+            ready, child = ctx.Pipe(duplex=False)
+            self.process = ctx.Process(target=_zygote_main, args=(str(self.path), self.preload, child),
+                                       daemon=True, name="fabric-python-zygote")
+            self.process.start()
+            child.close()
+            try:
+                failed = ready.recv()
+            except EOFError:
+                raise RuntimeError("Python fork server failed to start") from None
+            finally:
+                ready.close()
+            for failure in failed:
+                print(f"[exec] fork server could not preload {failure}")
+            return self.path
+
+    def prewarm(self) -> None:
+        """Start the zygote in the background so the first cell doesn't wait for its imports."""
+        threading.Thread(target=self._ensure, daemon=True).start()
+
+    def fork(self) -> ForkedWorker:
+        """A new worker forked from the zygote."""
+        conn = Client(str(self._ensure()), family="AF_UNIX")
+        if not conn.poll(5.0):
+            conn.close()
+            raise RuntimeError("Python fork server did not respond")
+        _, pid = conn.recv()
+        return ForkedWorker(conn, pid)
+
+    def run(self, code: str, timeout: float, **kw) -> Tuple[bool, str]:
+        """Run ``code`` in a fresh fork with empty globals; the fork exits afterwards."""
+        try:
+            worker = self.fork()
+        except (OSError, RuntimeError) as e:
+            return False, f"Python fork server unavailable: {e}"
+        try:
+            return worker.run(code, timeout, **kw)
+        finally:
+            worker.close()
+
+    def shutdown(self) -> None:
+        with self._lock:
+            process, self.process = self.process, None
+            path, self.path = self.path, None
+        if path is not None:
+            shutil.rmtree(path.parent, ignore_errors=True)  # the zygote exits once its socket is gone
+        if process is not None:
+            process.kill()
+            process.join(1.0)
+
+
+PYTHON_WORKERS = WorkerPool()
+FORK_SERVER = ForkServer()
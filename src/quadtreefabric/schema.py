@@ -0,0 +1,188 @@
+"""Context document validation and schema migrations.
+
+Validation runs piecewise (header, then one layer at a time, then the
+payload pool) so archives can be checked without holding every decoded
+layer, and errors are reported as readable strings instead of surfacing
+later as render-time exceptions.
+"""
+from __future__ import annotations
+
+import re
+from itertools import islice
+from typing import TYPE_CHECKING, Any, Callable, Dict, Iterable, Iterator, List
+
+if TYPE_CHECKING:
+    from .model import Matrix
+
+SCHEMA_VERSION = 2
+MAX_DEPTH = 12          # 4**12 nodes in the deepest layer is already ~16M
+MAX_COLOR = 0xFFFFFF
+
+PAYLOAD_FIELDS: Dict[str, Dict[str, type]] = {
+    # type -> required field -> expected type
+    "text": {"text": str},
+    "code": {"code": str},
+    "image": {},            # "data" (base64) in JSON, "blob" in archives
+}
+
+# Keys of a code payload's optional "limits" object (see runtime/limits.py)
+LIMIT_FIELDS = ("memory_mb", "cpu_seconds", "output_bytes", "nice")
+
+# Values of a code payload's optional "isolation" (see runtime/workers.py)
+ISOLATION_MODES = ("session", "fork")
+
+# A code payload's "inputs" may name a cell, 'depth:index', besides values
+_CELL_REF = re.compile(r"\d+:\d+")
+
+
+# --- validation -------------------------------------------------------------
+def _is_int(v: Any) -> bool:
+    return type(v) is int
+
+
+def header_errors(doc: Dict[str, Any]) -> Iterator[str]:
+    for key in ("quadtree_size", "max_depth", "layers"):
+        if key not in doc:
+            yield f"missing key {key!r}"
+    if "max_depth" in doc and not (_is_int(doc["max_depth"]) and 0 <= doc["max_depth"] <= MAX_DEPTH):
+        yield f"max_depth must be an int in 0..{MAX_DEPTH}"
+    if "quadtree_size" in doc and not (_is_int(doc["quadtree_size"]) and doc["quadtree_size"] > 0):
+        yield "quadtree_size must be a positive int"
+    version = doc.get("version", 1)
+    if not (_is_int(version) and 1 <= version <= SCHEMA_VERSION):
+        yield f"unsupported version {version!r} (this build reads 1..{SCHEMA_VERSION})"
+    layers = doc.get("layers")
+    if "layers" in doc and not isinstance(layers, list):
+        yield "layers must be a list"
+    elif isinstance(layers, list) and _is_int(doc.get("max_depth")) and len(layers) != doc["max_depth"] + 1:
+        yield f"expected {doc['max_depth'] + 1} layers for max_depth {doc['max_depth']}, got {len(layers)}"
+
+
+def layer_errors(d: int, size: Any, nodes: Any) -> Iterator[str]:
+    if size != 1 << d:
+        yield f"layer {d}: size {size!r} should be {1 << d}"
+        return
+    if not isinstance(nodes, list):
+        yield f"layer {d}: nodes must be a list"
+        return
+    if len(nodes) != size * size:
+        yield f"layer {d}: {len(nodes)} nodes, expected {size * size}"
+    for idx, v in enumerate(nodes):
+        if not (_is_int(v) and 0 <= v <= MAX_COLOR):
+            yield f"layer {d}: node {idx} is not a 24-bit color: {v!r}"
+            return
+
+
+def payload_errors(pool: Any, max_depth: int) -> Iterator[str]:
+    if not isinstance(pool, dict):
+        yield "payload_pool must be an object"
+        return
+    for key, payload in pool.items():
+        try:
+            d, idx = (int(part) for part in key.split(":"))
+        except ValueError:
+            yield f"payload {key!r}: key must be 'depth:index'"
+            continue
+        if not (0 <= d <= max_depth and 0 <= idx < 4 ** d):
+            yield f"payload {key!r}: no such cell"
+        if not isinstance(payload, dict):
+            yield f"payload {key!r}: must be an object"
+            continue
+        ptype = payload.get("type")
+        if ptype not in PAYLOAD_FIELDS:
+            yield f"payload {key!r}: unknown type {ptype!r}"
+            continue
+        for name, expected in PAYLOAD_FIELDS[ptype].items():
+            if not isinstance(payload.get(name), expected):
+                yield f"payload {key!r}: {ptype} payload needs {expected.__name__} {name!r}"
+        if ptype == "code":
+            if not isinstance(payload.get("stateless", False), bool):
+                yield f"payload {key!r}: 'stateless' must be a bool"
+            if not isinstance(payload.get("cache", True), bool):
+                yield f"payload {key!r}: 'cache' must be a bool"
+            if not isinstance(payload.get("session", ""), str):
+                yield f"payload {key!r}: 'session' must be a string"
+            if payload.get("isolation", "session") not in ISOLATION_MODES:
+                yield f"payload {key!r}: 'isolation' must be one of {', '.join(ISOLATION_MODES)}"
+            inputs, outputs = payload.get("inputs", []), payload.get("outputs", [])
+            if not (isinstance(inputs, list) and all(
+                    isinstance(n, str) and (n.isidentifier() or _CELL_REF.fullmatch(n)) for n in inputs)):
+                yield f"payload {key!r}: 'inputs' must be a list of identifiers or 'depth:index' cells"
+            if not (isinstance(outputs, list) and all(isinstance(n, str) and n.isidentifier() for n in outputs)):
+                yield f"payload {key!r}: 'outputs' must be a list of identifiers"
+            limits = payload.get("limits", {})
+            if not isinstance(limits, dict):
+                yield f"payload {key!r}: 'limits' must be an object"
+            else:
+                for name, value in limits.items():
+                    if name not in LIMIT_FIELDS:
+                        yield f"payload {key!r}: unknown limit {name!r}"
+                    elif value is not None and not (_is_int(value) and value >= 0):
+                        yield f"payload {key!r}: limit {name!r} must be a non-negative int"
+        if ptype == "image" and not isinstance(payload.get("data", payload.get("blob")), str):
+            yield f"payload {key!r}: image payload needs 'data' or 'blob'"
+        color = payload.get("color")
+        if color is not None and not (
+                isinstance(color, list) and len(color) == 3
+                and all(_is_int(c) and 0 <= c <= 255 for c in color)):
+            yield f"payload {key!r}: color must be [r, g, b]"
+
+
+def document_errors(doc: Any) -> Iterator[str]:
+    """Yield every problem in a plain JSON context document, layer by layer."""
+    if not isinstance(doc, dict):
+        yield "document must be a JSON object"
+        return
+    header = list(header_errors(doc))
+    yield from header
+    if header:
+        return
+    for d, layer in enumerate(doc["layers"]):
+        if not isinstance(layer, dict):
+            yield f"layer {d}: must be an object"
+            continue
+        yield from layer_errors(d, layer.get("size"), layer.get("nodes"))
+    yield from payload_errors(doc.get("payload_pool", {}), doc["max_depth"])
+
+
+def first_errors(errors: Iterable[str], limit: int = 10) -> List[str]:
+    return list(islice(errors, limit))
+
+
+def validate_document(doc: Any, limit: int = 10) -> List[str]:
+    """Return up to ``limit`` validation errors (empty if the document is valid)."""
+    return first_errors(document_errors(doc), limit)
+
+
+def raise_invalid(errors: Iterable[str]) -> None:
+    """Raise ValueError listing the first few errors, if there are any."""
+    errors = first_errors(errors)
+    if errors:
+        raise ValueError("Invalid matrix format: " + "; ".join(errors))
+
+
+# --- migrations -------------------------------------------------------------
+def _v1_to_v2(matrix: "Matrix") -> None:
+    """v2 makes payload defaults explicit: code carries its language, text its color."""
+    for key, payload in list(matrix.payload_pool.items()):
+        d, idx = (int(part) for part in key.split(":"))
+        if payload.get("type") == "code" and "language" not in payload:
+            matrix.set_payload(d, idx, {**payload, "language": "python"})
+        elif payload.get("type") == "text" and "color" not in payload:
+            matrix.set_payload(d, idx, {**payload, "color": [0, 0, 0]})
+
+
+MIGRATIONS: Dict[int, Callable[["Matrix"], None]] = {
+    # from version -> upgrade to version + 1, in place
+    1: _v1_to_v2,
+}
+
+
+def upgrade(matrix: "Matrix") -> bool:
+    """Bring ``matrix`` up to ``SCHEMA_VERSION`` in place; return True if it changed."""
+    changed = False
+    while matrix.version < SCHEMA_VERSION:
+        MIGRATIONS[matrix.version](matrix)
+        matrix.version += 1
+        changed = True
+    return changed